@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: trigram NameIndex vs the str.contains cascade used by search_text.
+
+Synthetic product names are generated from a fixed vocabulary (seeded, so
+runs are comparable). For each catalog size we time the index build and
+three lookups through the full search_text cascade (phrase, first three
+words, first word), asking for the first match only, as search_text does:
+- hit:     the phrase occurs in the catalog
+- partial: a word fragment ("headph") that only matches inside words
+- miss:    nothing matches, so every step of the cascade runs
+
+Usage:
+    python3 bench_name_index.py [--sizes 10000 100000 1000000] [--repeat 20]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from catalog_index import NameIndex
+
+
+BRANDS = ["Sony", "Amazon Basics", "VEVOR", "Mendini by Cecilio", "Logitech", "Anker",
+          "Samsung", "Philips", "Bosch", "Xiaomi", "Panasonic", "Ugreen"]
+WORDS = ["Wireless", "Headphones", "Noise", "Cancelling", "Bluetooth", "Speaker", "Portable",
+         "Charger", "USB-C", "Cable", "Stainless", "Steel", "Kitchen", "Blender", "Camera",
+         "Tripod", "Baritone", "Horn", "Gaming", "Mouse", "Keyboard", "Mechanical", "LED",
+         "Desk", "Lamp", "Water", "Bottle", "Insulated", "Bánh", "Xèo", "Nồi", "Chiên", "Không", "Dầu"]
+
+QUERIES = {
+    "hit": "Sony Wireless Headphones",
+    "partial": "headph",
+    "miss": "Zyxwv Qqq Nonexistent",
+}
+
+
+def make_names(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(BRANDS)} {' '.join(rng.choices(WORDS, k=rng.randint(2, 6)))} {rng.randint(1, 9999)}"
+        for _ in range(size)
+    ]
+
+
+def cascade_terms(query):
+    words = query.split()
+    terms = [query, " ".join(words[:3])]
+    if words and len(words[0]) > 2:
+        terms.append(words[0])
+    return terms
+
+
+def contains_cascade(names, query):
+    for term in cascade_terms(query):
+        mask = names.str.contains(term, case=False, na=False, regex=False)
+        if mask.any():
+            return mask.to_numpy().nonzero()[0]
+    return []
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'names':>9} {'build':>9} {'query':>8} {'str.contains':>14} {'index':>10} {'speed-up':>9}")
+    for size in args.sizes:
+        names = make_names(size)
+        series = pd.Series(names)
+        start = time.perf_counter()
+        index = NameIndex(names)
+        build = time.perf_counter() - start
+
+        for label, query in QUERIES.items():
+            expected = list(contains_cascade(series, query))
+            assert list(index.first_match(cascade_terms(query))[1]) == expected
+            assert list(index.first_match(cascade_terms(query), limit=1)[1]) == expected[:1]
+            # The pandas baseline is slow on big catalogs; fewer repeats keep runs short
+            scan_ms = timed(lambda: contains_cascade(series, query), max(3, args.repeat // 5))
+            index_ms = timed(lambda: index.first_match(cascade_terms(query), limit=1), args.repeat)
+            print(f"{size:>9,} {build:>8.2f}s {label:>8} {scan_ms:>11.2f} ms {index_ms:>7.3f} ms "
+                  f"{scan_ms / index_ms:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
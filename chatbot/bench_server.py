@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serial HTTPServer vs PooledHTTPServer for /chat.
+
+The agent is replaced by a stub LLM that sleeps for a fixed latency (an
+idle network wait, like a Groq round-trip), so the numbers only measure
+the serving model. No GROQ_API_KEY, CSV or Milvus is needed.
+
+Usage:
+    python3 bench_server.py [--clients 16] [--requests 4] [--latency 0.2]
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from serving import make_server
+
+
+class StubLLM:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, message):
+        time.sleep(self.latency)
+        return f"stub answer for: {message}"
+
+
+def make_handler(llm):
+    class BenchHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            message = json.loads(self.rfile.read(length))['message']
+            body = json.dumps({'response': llm.invoke(message)}).encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return BenchHandler
+
+
+def run_clients(port, clients, requests_per_client):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client(i):
+        nonlocal errors
+        for j in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection('localhost', port, timeout=120)
+                conn.request('POST', '/chat', json.dumps({'message': f'q{i}-{j}'}),
+                             {'Content-Type': 'application/json'})
+                ok = conn.getresponse().status == 200
+                conn.close()
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return latencies, errors, wall
+
+
+def bench(label, serial, args):
+    server = make_server(('localhost', 0), make_handler(StubLLM(args.latency)),
+                         workers=args.workers, queue_size=args.queue_size, serial=serial)
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        latencies, errors, wall = run_clients(port, args.clients, args.requests)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float('nan')
+    print(f"{label:<28} {len(latencies) / wall:>8.1f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:>8.0f} ms   "
+          f"p95 {p95 * 1000:>8.0f} ms   failed {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4, help='requests per client')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub LLM latency in seconds')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--queue-size', type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.requests} requests, stub LLM latency {args.latency * 1000:.0f} ms")
+    bench('serial HTTPServer', True, args)
+    bench(f'pooled ({args.workers} workers)', False, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Call Chatbot Server - Django calls this script
+Call Chatbot Server - command-line helper for the running chatbot server
+(Django talks to the server directly through shop/chatbot_client.py)
 """
 
 import sys
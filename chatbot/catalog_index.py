@@ -0,0 +1,249 @@
+"""
+In-memory indexes over the product DataFrame used by the agent tools.
+
+They are built once per loaded DataFrame (see process_data.get_catalog_index)
+so that a tool call costs a lookup instead of a scan over the whole catalog.
+Everything here works on row positions (``df.iloc``); callers translate to
+index labels when they need them.
+"""
+
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+class PriceIndex:
+    """Numeric prices of one column, sorted ascending, with their row positions.
+
+    Rows whose price does not parse are kept apart in ``missing`` so they can
+    still be offered last, the way ``sort_values`` puts NaN at the end.
+    """
+
+    def __init__(self, prices: pd.Series):
+        numeric = pd.to_numeric(prices, errors="coerce").to_numpy(dtype=float)
+        valid = ~np.isnan(numeric)
+        valid_positions = np.flatnonzero(valid)
+        # Stable sort keeps DataFrame order among equal prices
+        order = np.argsort(numeric[valid], kind="stable")
+        self.values = numeric[valid][order]
+        self.positions = valid_positions[order]
+        self.missing = np.flatnonzero(~valid)
+
+    def __len__(self):
+        return len(self.values)
+
+    def min_position(self) -> int:
+        """Row of the first (in DataFrame order) lowest price"""
+        return int(self.positions[0])
+
+    def max_position(self) -> int:
+        """Row of the first (in DataFrame order) highest price"""
+        first_max = np.searchsorted(self.values, self.values[-1], side="left")
+        return int(self.positions[first_max])
+
+    def range_positions(self, min_price: float, max_price: float) -> np.ndarray:
+        """Rows with min_price <= price <= max_price, cheapest first"""
+        lo = np.searchsorted(self.values, min_price, side="left")
+        hi = np.searchsorted(self.values, max_price, side="right")
+        return self.positions[lo:hi]
+
+    def nearest_positions(self, ref_price: float):
+        """Yield rows by increasing distance to ref_price, DataFrame order on ties.
+
+        Two pointers walk out from the insertion point one run of equal
+        prices at a time; the rows at the same distance (one run, or a run on
+        each side) are yielded in row order.
+        """
+        values, positions = self.values, self.positions
+        left = right = int(np.searchsorted(values, ref_price, side="left"))
+        while left > 0 or right < len(values):
+            left_gap = ref_price - values[left - 1] if left > 0 else np.inf
+            right_gap = values[right] - ref_price if right < len(values) else np.inf
+            gap = min(left_gap, right_gap)
+            tied = []
+            if left_gap == gap:
+                start = int(np.searchsorted(values, values[left - 1], side="left"))
+                tied.append(positions[start:left])
+                left = start
+            if right_gap == gap:
+                end = int(np.searchsorted(values, values[right], side="right"))
+                tied.append(positions[right:end])
+                right = end
+            for pos in np.sort(np.concatenate(tied)):
+                yield int(pos)
+        for pos in self.missing:
+            yield int(pos)
+
+
+def unique_by_name(positions, names: np.ndarray, n: int) -> list:
+    """First n positions whose product name has not been seen yet"""
+    seen_names = set()
+    unique_positions = []
+    for pos in positions:
+        name = names[pos]
+        if name and name not in seen_names:
+            seen_names.add(name)
+            unique_positions.append(int(pos))
+            if len(unique_positions) >= n:
+                break
+    return unique_positions
+
+
+def normalize_brand(brand) -> str:
+    """Case-folded brand with collapsed whitespace, the key of BrandIndex"""
+    return " ".join(str(brand).casefold().split())
+
+
+class BrandIndex:
+    """Normalized brand -> row positions, most expensive first, one row per name.
+
+    Substring lookups scan the brand vocabulary (a few hundred entries), not
+    the catalog, and match literally, so names like "A&B (US)" are safe.
+    """
+
+    def __init__(self, brands: pd.Series, prices: np.ndarray, names: np.ndarray):
+        # Highest price first, unparseable prices last, DataFrame order on ties
+        self._rank = np.where(np.isnan(prices), -np.inf, prices)
+        order = np.argsort(-self._rank, kind="stable")
+        raw_brands = brands.to_numpy(dtype=object)
+
+        postings = {}
+        seen_names = {}
+        self.counts = {}
+        for pos in order:
+            brand = raw_brands[pos]
+            if not isinstance(brand, str) or not brand.strip():
+                continue
+            key = normalize_brand(brand)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            names_seen = seen_names.setdefault(key, set())
+            name = names[pos]
+            if name and name not in names_seen:
+                names_seen.add(name)
+                postings.setdefault(key, []).append(int(pos))
+
+        self.postings = {key: np.array(rows, dtype=np.int64) for key, rows in postings.items()}
+        self.vocabulary = sorted(self.counts)
+
+    def match(self, query: str) -> list:
+        """Every brand key containing query, like the str.contains filter it replaces"""
+        key = normalize_brand(query)
+        return [brand for brand in self.vocabulary if key in brand]
+
+    def count(self, keys) -> int:
+        """Number of catalog rows (duplicates included) under keys"""
+        return sum(self.counts[key] for key in keys)
+
+    def positions(self, keys):
+        """Rows of all keys merged by descending price"""
+        lists = [self.postings.get(key, ()) for key in keys]
+        if len(lists) == 1:
+            return lists[0]
+        rank = self._rank
+        return heapq.merge(*lists, key=lambda pos: -rank[pos])
+
+
+def _trigram_codes(text: str) -> np.ndarray:
+    """Distinct trigrams of text, each packed into one int64 (21 bits per code point)"""
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    return np.unique((cp[:-2] << 42) | (cp[1:-1] << 21) | cp[2:])
+
+
+class NameIndex:
+    """Trigram inverted index over case-folded product names.
+
+    Postings are stored CSR-style in numpy arrays: ``grams`` (sorted codes),
+    ``offsets`` into ``positions`` (row numbers, ascending per gram). A term
+    lookup intersects the postings of its trigrams, shortest first, and only
+    the surviving candidates are checked with a real substring test.
+    """
+
+    BUILD_CHUNK_ROWS = 20000
+
+    def __init__(self, names):
+        self.folded = [str(name).casefold() for name in names]
+        code_chunks, row_chunks = [], []
+        for start in range(0, len(self.folded), self.BUILD_CHUNK_ROWS):
+            block = np.array(self.folded[start:start + self.BUILD_CHUNK_ROWS], dtype=str)
+            width = block.dtype.itemsize // 4
+            cp = block.view(np.uint32).reshape(len(block), width).astype(np.int64)
+            codes = (cp[:, :-2] << 42) | (cp[:, 1:-1] << 21) | cp[:, 2:]
+            rows = np.broadcast_to(np.arange(start, start + len(block), dtype=np.int32)[:, None], codes.shape)
+            # Fixed-width strings are padded with NUL; a trigram is real if its last char is
+            valid = cp[:, 2:] != 0
+            codes, rows = codes[valid], rows[valid]
+            order = np.lexsort((rows, codes))
+            codes, rows = codes[order], rows[order]
+            distinct = np.ones(len(codes), dtype=bool)
+            distinct[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+            code_chunks.append(codes[distinct])
+            row_chunks.append(rows[distinct])
+
+        codes = np.concatenate(code_chunks) if code_chunks else np.empty(0, dtype=np.int64)
+        rows = np.concatenate(row_chunks) if row_chunks else np.empty(0, dtype=np.int32)
+        # Chunks are in row order, so a stable sort keeps each postings list ascending
+        order = np.argsort(codes, kind="stable")
+        codes, self.positions = codes[order], rows[order]
+        self.grams, starts = np.unique(codes, return_index=True)
+        self.offsets = np.append(starts, len(codes))
+
+    def _postings(self, code) -> np.ndarray:
+        i = np.searchsorted(self.grams, code)
+        if i == len(self.grams) or self.grams[i] != code:
+            return self.positions[:0]
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def find(self, term: str, limit: int = None) -> np.ndarray:
+        """Rows whose name contains term (case-insensitive), in DataFrame order.
+
+        With limit, stop after that many verified rows.
+        """
+        term = term.casefold()
+        folded = self.folded
+        if len(term) < 3:
+            rows = (pos for pos, name in enumerate(folded) if term in name)
+            return np.fromiter(itertools.islice(rows, limit), dtype=np.int32)
+        postings = sorted((self._postings(code) for code in _trigram_codes(term)), key=len)
+        candidates = postings[0]
+        for other in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        rows = (pos for pos in candidates if term in folded[pos])
+        return np.fromiter(itertools.islice(rows, limit), dtype=np.int32)
+
+    def first_match(self, terms, limit: int = None):
+        """(term, rows) for the first term that matches anything, else (None, empty)
+
+        terms are tried in priority order (e.g. full phrase, first words, single
+        words), so the tier of the returned term is the rank of the match.
+        """
+        for term in terms:
+            if not term:
+                continue
+            rows = self.find(term, limit)
+            if len(rows):
+                return term, rows
+        return None, np.empty(0, dtype=np.int32)
+
+
+class CatalogIndex:
+    """All indexes for one DataFrame; rebuild it when the DataFrame changes"""
+
+    PRICE_FIELDS = ("salePrice", "listedPrice")
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.names = df["name"].fillna("").to_numpy(dtype=object)
+        self.prices = {
+            field: PriceIndex(df[field]) for field in self.PRICE_FIELDS if field in df.columns
+        }
+        sale_prices = pd.to_numeric(df["salePrice"], errors="coerce").to_numpy(dtype=float)
+        self.brands = BrandIndex(df["brandName"], sale_prices, self.names)
+        self.name_index = NameIndex(self.names)
+
+    def price(self, field: str):
+        """PriceIndex for field, or None when the column is not loaded"""
+        return self.prices.get(field)
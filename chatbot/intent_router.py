@@ -0,0 +1,239 @@
+"""
+Rule-based intent router placed in front of the LLM agent.
+
+Most chat traffic follows the handful of patterns listed in the system
+prompt of simple_chatbot_server.py ("đắt nhất", "từ X đến Y", "gần giá X",
+"sản phẩm <brand>", "<field> của sản phẩm X"). For those the tool and its
+arguments can be read straight off the message, which saves the Groq
+round-trip the agent would spend choosing the tool. Anything the rules are
+not sure about returns None and goes to the agent as before.
+
+Matching runs on a folded copy of the message: lower case, Vietnamese
+diacritics removed (đ -> d), whitespace collapsed, so "đắt nhất",
+"dat nhat" and "ĐẮT NHẤT" are the same thing.
+"""
+
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+
+def fold(text: str) -> str:
+    """Lower-case text without diacritics and with single spaces"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return " ".join(stripped.lower().split())
+
+
+NUMBER = r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:(k|nghin|ngan|trieu|tr)\b)?"
+MULTIPLIERS = {"k": 1000, "nghin": 1000, "ngan": 1000, "trieu": 1000000, "tr": 1000000}
+
+
+def parse_number(digits: str, unit: str = None) -> float:
+    """'1,299.5' -> 1299.5, ('100', 'k') -> 100000.0, ('2', 'trieu') -> 2000000.0"""
+    value = float(digits.replace(",", ""))
+    return value * MULTIPLIERS[unit] if unit else value
+
+
+# Superlatives answered by tools that only report name, brand and price
+HIGHEST = re.compile(r"\b(dat nhat|cao nhat|mac nhat|most expensive|highest price|highest)\b")
+LOWEST = re.compile(r"\b(re nhat|thap nhat|cheapest|lowest price|lowest)\b")
+SUPERLATIVE_FIELDS = {"brand", "thuong hieu", "gia", "price", "ten", "name"}
+# Words a superlative or price question may contain besides the superlative or
+# the price itself. Anything else ("của hãng sony", "tai nghe", "áo") narrows
+# the question to a brand or category, which the price tools cannot do.
+QUESTION_FILLER = set(
+    "cai nao la gi san pham mon do hang cua shop ban co khong the nhi vay a ha oi "
+    "cho toi minh xem tim show me hien thi liet ke goi y top giup voi di hay "
+    "gia price ten name brand thuong hieu bao nhieu hien nay bay gio tren trong "
+    "what which is the one product products item items in store how much of "
+    "muon mua can khoang tam gan quanh tu den d do dong vnd usd dollar dollars".split()
+)
+
+PRICE_RANGE = re.compile(
+    rf"(?:\btu|\bfrom|\bbetween|\bkhoang|\bgia)\s*{NUMBER}\s*(?:den|toi|to|and|-|–|—)\s*{NUMBER}"
+)
+# "từ X đến Y" is only a price range with a currency or a price word around it
+CURRENCY_AFTER = re.compile(r"\s*(?:\$|(?:d|dong|vnd|usd|dollars?|do)\b)")
+PRICE_WORD = re.compile(r"(?:\$|\b(?:gia|price|prices|budget|ngan sach|tien|cost)\b)")
+# ... and not with another unit after the numbers: "từ 2 đến 3 tuổi"
+OTHER_UNIT_AFTER = re.compile(
+    r"\s*(?:tuoi|nam|thang|tuan|ngay|gio|phut|giay|kg|g|gram|lbs?|cm|mm|m|inch|in|lit|l|ml|oz|"
+    r"nguoi|cai|chiec|mon|san pham|sao|stars?|gb|tb|mah|w|%|years?|months?|days?|hours?|size)\b"
+)
+NEAR_PRICE = re.compile(
+    rf"\b(?:gan gia|gan|xap xi|quanh|tam|khoang gia|around|near|close to|closest to)\s*(?:gia|muc gia|price)?\s*{NUMBER}"
+)
+THIS_ITEM = re.compile(r"\b(mon nay|san pham nay)\b")
+COUNT = re.compile(r"\b(?:goi y|top|cho toi|tim|show)?\s*(\d{1,2})\s*(?:san pham|mon|products?|items?)\b")
+
+SAME_BRAND = re.compile(r"\b(?:cung (?:brand|thuong hieu|hang)|same brand|giong brand)(?: voi| nhu| as)?\s+(.+)$")
+FIELD_OF_PRODUCT = re.compile(
+    r"\b(brand|thuong hieu|gia|price|rating|danh gia|features?|dac diem|mo ta|description|"
+    r"size|kich thuoc|material|chat lieu)\s+(?:cua|of)\s+(?:san pham|product)\s+(.+)$"
+)
+PRODUCT_INFO = re.compile(r"\bthong tin (?:ve |cua )?(?:san pham|product)\s+(.+)$")
+BRAND_QUERY = re.compile(
+    r"\b(?:san pham|products?|do|hang)\s+(?:cua |tu |from |of |by )?(?:brand |thuong hieu |hang )?(.+)$"
+)
+
+
+@dataclass
+class Route:
+    tool: str
+    args: dict
+    rule: str
+
+
+@dataclass
+class RouterStats:
+    """Hit rate of the router and the latency it saves compared with the agent"""
+
+    hits: int = 0
+    misses: int = 0
+    routed_seconds: float = 0.0
+    agent_seconds: float = 0.0
+    agent_calls: int = 0
+    by_rule: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_hit(self, rule: str, seconds: float):
+        with self._lock:
+            self.hits += 1
+            self.routed_seconds += seconds
+            self.by_rule[rule] = self.by_rule.get(rule, 0) + 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_agent(self, seconds: float):
+        with self._lock:
+            self.agent_calls += 1
+            self.agent_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            avg_routed = self.routed_seconds / self.hits if self.hits else None
+            avg_agent = self.agent_seconds / self.agent_calls if self.agent_calls else None
+            saved = avg_agent - avg_routed if avg_agent is not None and avg_routed is not None else None
+            return {
+                "requests": total,
+                "router_hits": self.hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "avg_routed_ms": avg_routed * 1000 if avg_routed is not None else None,
+                "avg_agent_ms": avg_agent * 1000 if avg_agent is not None else None,
+                "saved_ms_per_routed_request": saved * 1000 if saved is not None else None,
+                "by_rule": dict(self.by_rule),
+            }
+
+
+class IntentRouter:
+    """Map a chat message to (tool, args) when a rule matches with certainty"""
+
+    def __init__(self, brand_vocabulary=()):
+        # folded brand -> key understood by BrandIndex.match
+        self.brands = {fold(brand): brand for brand in brand_vocabulary}
+        self.stats = RouterStats()
+
+    def route(self, message: str):
+        text = fold(message)
+        if not text:
+            return None
+        n = self._count(text)
+
+        match = PRICE_RANGE.search(text)
+        if match and self._is_price(text, match, match.group(2), match.group(4)):
+            # "áo từ 100k đến 200k": the tool ranges over the whole catalog
+            if self._qualified(text, match):
+                return None
+            # "từ 1 đến 2 triệu": a unit after the second number applies to both
+            low = parse_number(match.group(1), match.group(2) or match.group(4))
+            high = parse_number(match.group(3), match.group(4))
+            low, high = min(low, high), max(low, high)
+            return Route("recommend_product_by_range",
+                         {"q": message, "field": "salePrice", "n": n or 3,
+                          "min_price": low, "max_price": high},
+                         "price_range")
+
+        match = NEAR_PRICE.search(text)
+        if match and self._is_price(text, match, match.group(2)):
+            if self._qualified(text, match):
+                return None
+            return Route("suggest_by_price",
+                         {"q": message, "field": "salePrice", "n": n or 3,
+                          "ref_price": parse_number(match.group(1), match.group(2))},
+                         "near_price")
+        if THIS_ITEM.search(text) and re.search(r"\b(gan|tuong tu|quanh|similar|near)\b", text):
+            # The tool resolves "món này" from the conversation's last product
+            return Route("suggest_by_price",
+                         {"q": message, "field": "salePrice", "n": n or 3},
+                         "near_this_item")
+
+        field_match = FIELD_OF_PRODUCT.search(text)
+        highest, lowest = HIGHEST.search(text), LOWEST.search(text)
+        if highest or lowest:
+            # "rating của sản phẩm đắt nhất" needs a field these tools don't return
+            if field_match and field_match.group(1) not in SUPERLATIVE_FIELDS:
+                return None
+            # Both, or "top 5 ... rẻ nhất": these tools return a single product
+            if (highest and lowest) or (n or 1) > 1:
+                return None
+            # "rẻ nhất của hãng sony": the tools only know the whole catalog
+            if self._qualified(text, highest or lowest):
+                return None
+            tool = "get_highest_price" if highest else "get_lowest_price"
+            return Route(tool, {"field": "salePrice"}, "highest" if highest else "lowest")
+
+        match = SAME_BRAND.search(text)
+        if match:
+            product = self._original_tail(message, match.group(1))
+            if product:
+                return Route("product_same_brand", {"product_name": product, "n": n or 3}, "same_brand")
+            return None
+
+        if field_match or PRODUCT_INFO.search(text):
+            return Route("search_text", {"q": message}, "product_field")
+
+        match = BRAND_QUERY.search(text)
+        if match:
+            brand = self.brands.get(match.group(1).strip(" ?.!"))
+            if brand:
+                return Route("product_from_brand", {"brand_name": brand, "n": n or 3}, "brand")
+        return None
+
+    @staticmethod
+    def _is_price(text: str, match, *units) -> bool:
+        """Whether the numbers of match are prices: "tầm 2 kg", "sữa tắm 500ml" are not"""
+        after = text[match.end():]
+        if OTHER_UNIT_AFTER.match(after):
+            return False
+        return bool(any(units) or "$" in match.group(0)
+                    or CURRENCY_AFTER.match(after) or PRICE_WORD.search(text))
+
+    @staticmethod
+    def _qualified(text: str, match) -> bool:
+        """Whether the question also names a brand, category or other condition
+        besides match (the superlative or the price)"""
+        rest = text[:match.start()] + " " + text[match.end():]
+        return any(not word.isdigit() and word not in QUESTION_FILLER
+                   for word in re.findall(r"[a-z0-9]+", rest))
+
+    @staticmethod
+    def _count(text: str):
+        match = COUNT.search(text)
+        if match:
+            count = int(match.group(1))
+            if 0 < count <= 20:
+                return count
+        return None
+
+    @staticmethod
+    def _original_tail(message: str, folded_tail: str) -> str:
+        """The end of the original message matching folded_tail (keeps case and accents)"""
+        words = message.split()
+        wanted = len(folded_tail.split())
+        return " ".join(words[-wanted:]).strip(" ?.!\"'") if wanted else ""
@@ -1,6 +1,9 @@
 
+import contextvars
 import os
 import re
+import threading
+from contextlib import contextmanager
 import duckdb
 import pandas as pd
 
@@ -20,6 +23,9 @@ from pymilvus import connections
 from langchain_core.messages import SystemMessage
 from langchain.prompts import ChatPromptTemplate
 
+from catalog_index import CatalogIndex, unique_by_name
+from session_store import make_session_store
+
 load_dotenv()
 os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
 
@@ -114,30 +120,65 @@ def ingest(folder: str):
 
 df_global = None
 
-session_state = {
-    "last_product_idx": None,
-    "last_field": None,
-}
+# Conversation state ("món này") lives in a session store keyed by the
+# conversation id of the current request, not in a module-level dict.
+DEFAULT_CONVERSATION = "default"
+session_store = make_session_store()
+_conversation_id = contextvars.ContextVar("conversation_id", default=DEFAULT_CONVERSATION)
 
 
-def _clean_price(series):
-    return pd.to_numeric(series, errors="coerce").dropna()
+@contextmanager
+def conversation(conversation_id):
+    """Run the tools called inside the block on behalf of conversation_id."""
+    token = _conversation_id.set(str(conversation_id)[:128] if conversation_id else DEFAULT_CONVERSATION)
+    try:
+        yield
+    finally:
+        _conversation_id.reset(token)
 
 
-def _get_unique_products(df_global, idxs, field, n):
-    """Get N unique products by name, removing duplicates."""
-    seen_names = set()
-    unique_idxs = []
-    
-    for idx in idxs:
-        name = df_global.loc[idx].get('name', '')
-        if name and name not in seen_names:
-            seen_names.add(name)
-            unique_idxs.append(idx)
-            if len(unique_idxs) >= n:
-                break
-    
-    return unique_idxs
+def _remember_product(idx, field):
+    """Record the product that "món này" refers to in follow-up questions."""
+    # numpy scalars -> plain Python so every backend can serialize them
+    idx = idx.item() if hasattr(idx, "item") else idx
+    session_store.update(_conversation_id.get(), last_product_idx=idx, last_field=field)
+
+
+def _last_product():
+    session = session_store.get(_conversation_id.get())
+    return session.get("last_product_idx"), session.get("last_field")
+
+
+_catalog_index = None
+_catalog_index_lock = threading.Lock()
+
+
+def set_dataframe(df: pd.DataFrame) -> None:
+    """Install df as df_global and build its indexes right away."""
+    global df_global
+    df_global = df
+    get_catalog_index()
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Indexes over df_global, rebuilt whenever df_global is replaced."""
+    global _catalog_index
+    index = _catalog_index
+    if index is None or index.df is not df_global:
+        with _catalog_index_lock:
+            if _catalog_index is None or _catalog_index.df is not df_global:
+                _catalog_index = CatalogIndex(df_global)
+            index = _catalog_index
+    return index
+
+
+def _format_price_lines(positions, field):
+    lines = []
+    for pos in positions:
+        r = df_global.iloc[pos]
+        currency = r.get('currency', 'USD')
+        lines.append(f"- {r.get('name','')} ({r.get(field)} {currency})")
+    return lines
 
 
 @tool
@@ -146,15 +187,13 @@ def get_highest_price(field: Literal["listedPrice", "salePrice"] = "salePrice")
     Use this when user asks about the most expensive product, highest price, or đắt nhất.
     This tool returns complete product info including brand name.
     field: 'salePrice' for final price, 'listedPrice' for original price."""
-    global df_global
-    prices = _clean_price(df_global[field])
-    if prices.empty:
+    prices = get_catalog_index().price(field)
+    if prices is None or len(prices) == 0:
         return f"❌ Không tìm thấy dữ liệu trong {field}."
 
-    idx = prices.idxmax()
-    row = df_global.loc[idx]
-    session_state["last_product_idx"] = idx
-    session_state["last_field"] = field
+    pos = prices.max_position()
+    row = df_global.iloc[pos]
+    _remember_product(df_global.index[pos], field)
 
     currency = row.get('currency', 'USD')
     brand = row.get('brandName', 'N/A')
@@ -170,15 +209,13 @@ def get_lowest_price(field: Literal["listedPrice", "salePrice"] = "salePrice") -
     Use this when user asks about the cheapest product, lowest price, or rẻ nhất.
     This tool returns complete product info including brand name.
     field: 'salePrice' for final price, 'listedPrice' for original price."""
-    global df_global
-    prices = _clean_price(df_global[field])
-    if prices.empty:
+    prices = get_catalog_index().price(field)
+    if prices is None or len(prices) == 0:
         return f"❌ Không tìm thấy dữ liệu trong {field}."
 
-    idx = prices.idxmin()
-    row = df_global.loc[idx]
-    session_state["last_product_idx"] = idx
-    session_state["last_field"] = field
+    pos = prices.min_position()
+    row = df_global.iloc[pos]
+    _remember_product(df_global.index[pos], field)
 
     currency = row.get('currency', 'USD')
     brand = row.get('brandName', 'N/A')
@@ -207,13 +244,14 @@ def suggest_by_price(q: str, field: Literal["listedPrice", "salePrice"] = "saleP
     """
 
     global df_global
+    last_idx, last_field = _last_product()
     if (
         ref_price is None 
         and ("món này" in q or "mon nay" in q) 
-        and session_state.get("last_product_idx") is not None
+        and last_idx is not None
     ):
-        ref_idx = session_state["last_product_idx"]
-        ref_field = session_state.get("last_field") or field
+        ref_idx = last_idx
+        ref_field = last_field or field
         try:
             ref_price = float(df_global.loc[ref_idx, ref_field])
             field = ref_field
@@ -221,26 +259,20 @@ def suggest_by_price(q: str, field: Literal["listedPrice", "salePrice"] = "saleP
             ref_price = None
     if ref_price is None:
         return "❌ Chưa có giá tham chiếu. Hãy nêu rõ một mức giá hoặc hỏi dựa trên 'món này'."
-    prices = pd.to_numeric(df_global[field], errors='coerce')
-    diffs = (prices - ref_price).abs()
-    order = diffs.sort_values().index
-
-    all_idxs = list(order)
-    unique_idxs = _get_unique_products(df_global, all_idxs, field, n)
+    index = get_catalog_index()
+    prices = index.price(field)
+    if prices is None:
+        return f"❌ Không tìm thấy dữ liệu trong {field}."
+    unique_positions = unique_by_name(prices.nearest_positions(ref_price), index.names, n)
     
-    if not unique_idxs:
+    if not unique_positions:
         return "❌ Không tìm thấy sản phẩm phù hợp."
 
-    lines = []
-    for idx in unique_idxs:
-        r = df_global.loc[idx]
-        currency = r.get('currency', 'USD')
-        lines.append(f"- {r.get('name','')} ({r.get(field)} {currency})")
+    lines = _format_price_lines(unique_positions, field)
 
-    session_state["last_product_idx"] = unique_idxs[0]
-    session_state["last_field"] = field
+    _remember_product(df_global.index[unique_positions[0]], field)
 
-    return f"Gợi ý {len(unique_idxs)} sản phẩm gần {ref_price} ({field}):\n" + "\n".join(lines)
+    return f"Gợi ý {len(unique_positions)} sản phẩm gần {ref_price} ({field}):\n" + "\n".join(lines)
 
 @tool
 def recommend_product_by_range(q: str, field: Literal["listedPrice", "salePrice"] = "salePrice", n: int = 3, min_price: float = 0, max_price: float = None) -> str:
@@ -266,25 +298,22 @@ def recommend_product_by_range(q: str, field: Literal["listedPrice", "salePrice"
     global df_global
     if max_price is None:
         return "❌ Chưa có giá tham chiếu. Hãy nêu rõ một mức giá hoặc hỏi dựa trên 'món này'."
-    prices = pd.to_numeric(df_global[field], errors='coerce')
-    filtered = prices[(prices >= min_price) & (prices <= max_price)]
-    if filtered.empty:
+    index = get_catalog_index()
+    prices = index.price(field)
+    if prices is None:
+        return f"❌ Không tìm thấy dữ liệu trong {field}."
+    in_range = prices.range_positions(min_price, max_price)
+    if len(in_range) == 0:
         return "❌ Không tìm thấy sản phẩm phù hợp."
-    order = filtered.sort_values().index
     
-    all_idxs = list(order)
-    unique_idxs = _get_unique_products(df_global, all_idxs, field, n)
+    unique_positions = unique_by_name(in_range, index.names, n)
     
-    if not unique_idxs:
+    if not unique_positions:
         return "❌ Không tìm thấy sản phẩm phù hợp."
     
-    lines = []
-    for idx in unique_idxs:
-        r = df_global.loc[idx]
-        currency = r.get('currency', 'USD')
-        lines.append(f"- {r.get('name','')} ({r.get(field)} {currency})")
+    lines = _format_price_lines(unique_positions, field)
     
-    return f"Gợi ý {len(unique_idxs)} sản phẩm trong khoảng {min_price} - {max_price} ({field}):\n" + "\n".join(lines)
+    return f"Gợi ý {len(unique_positions)} sản phẩm trong khoảng {min_price} - {max_price} ({field}):\n" + "\n".join(lines)
 
 
 @tool
@@ -299,34 +328,25 @@ def product_from_brand(brand_name: str, n: int = 3) -> str:
     Returns:
         List of products from that brand
     """
-    global df_global
-    
     try:
-        mask = df_global["brandName"].str.contains(brand_name, case=False, na=False)
-        df_brand = df_global[mask]
+        index = get_catalog_index()
+        brand_keys = index.brands.match(brand_name)
         
-        if df_brand.empty:
+        if not brand_keys:
             return f"❌ Không tìm thấy sản phẩm nào từ thương hiệu '{brand_name}'."
         
-        df_brand_sorted = df_brand.sort_values(by="salePrice", ascending=False)
-        
+        total = index.brands.count(brand_keys)
         if n == -1:
-            n = len(df_brand_sorted)
+            n = total
         
-        order = df_brand_sorted.index
-        unique_idxs = _get_unique_products(df_global, list(order), "salePrice", n)
+        unique_positions = unique_by_name(index.brands.positions(brand_keys), index.names, n)
         
-        if not unique_idxs:
-            return f"❌ Không tìm thấy sản phẩm phù hợp sau khi loại bỏ trùng lặp. Tổng sản phẩm {brand_name}: {len(df_brand_sorted)}"
+        if not unique_positions:
+            return f"❌ Không tìm thấy sản phẩm phù hợp sau khi loại bỏ trùng lặp. Tổng sản phẩm {brand_name}: {total}"
         
-        lines = []
-        for idx in unique_idxs:
-            r = df_global.loc[idx]
-            currency = r.get('currency', 'USD')
-            price = r.get('salePrice', 'N/A')
-            lines.append(f"- {r.get('name','')} ({price} {currency})")
+        lines = _format_price_lines(unique_positions, "salePrice")
         
-        return f"Gợi ý {len(unique_idxs)} sản phẩm từ thương hiệu '{brand_name}':\n\n" + "\n".join(lines)
+        return f"Gợi ý {len(unique_positions)} sản phẩm từ thương hiệu '{brand_name}':\n\n" + "\n".join(lines)
         
     except Exception as e:
         return f"❌ Lỗi khi tìm kiếm: {str(e)}"
@@ -347,42 +367,31 @@ def product_same_brand(product_name: str, n: int = 3) -> str:
     global df_global
     
     try:
-        mask = df_global["name"].str.contains(product_name, case=False, na=False)
-        matching_products = df_global[mask]
+        index = get_catalog_index()
+        rows = index.name_index.find(product_name, limit=1)
         
-        if matching_products.empty:
+        if len(rows) == 0:
             return f"❌ Không tìm thấy sản phẩm '{product_name}' trong cơ sở dữ liệu."
         
-        brand_name = matching_products.iloc[0]["brandName"]
+        matching_product = df_global.iloc[rows[0]]
+        brand_name = matching_product["brandName"]
         
         if pd.isna(brand_name) or brand_name == "":
             return f"❌ Sản phẩm '{product_name}' không có thông tin thương hiệu."
         
-        brand_mask = df_global["brandName"].str.contains(brand_name, case=False, na=False)
-        df_brand = df_global[brand_mask]
+        brand_keys = index.brands.match(brand_name)
+        original_product_name = matching_product["name"]
+        others = (pos for pos in index.brands.positions(brand_keys)
+                  if index.names[pos] != original_product_name)
         
-        original_product_name = matching_products.iloc[0]["name"]
-        df_brand = df_brand[df_brand["name"] != original_product_name]
+        unique_positions = unique_by_name(others, index.names, n)
         
-        if df_brand.empty:
+        if not unique_positions:
             return f"❌ Không tìm thấy sản phẩm nào khác từ thương hiệu '{brand_name}'."
         
-        df_brand_sorted = df_brand.sort_values(by="salePrice", ascending=False)
-        order = df_brand_sorted.index
-        
-        unique_idxs = _get_unique_products(df_global, list(order), "salePrice", n)
-        
-        if not unique_idxs:
-            return "❌ Không tìm thấy sản phẩm phù hợp sau khi loại bỏ trùng lặp."
-        
-        lines = []
-        for idx in unique_idxs:
-            r = df_global.loc[idx]
-            currency = r.get('currency', 'USD')
-            price = r.get('salePrice', 'N/A')
-            lines.append(f"- {r.get('name','')} ({price} {currency})")
+        lines = _format_price_lines(unique_positions, "salePrice")
         
-        return f"Gợi ý {len(unique_idxs)} sản phẩm khác từ thương hiệu '{brand_name}':\n" + "\n".join(lines)
+        return f"Gợi ý {len(unique_positions)} sản phẩm khác từ thương hiệu '{brand_name}':\n" + "\n".join(lines)
     
     except Exception as e:
         return f"❌ Lỗi khi tìm kiếm: {str(e)}"
@@ -407,7 +416,7 @@ def chat():
     if not os.path.exists(csv_path):
         csv_path = "amazon_data.csv"
     
-    df_global = load_and_clean_data(str(csv_path))
+    set_dataframe(load_and_clean_data(str(csv_path)))
     
 
     def search_text(q: str) -> str:
@@ -450,49 +459,27 @@ def chat():
                             product_name = parts[0].strip()
                         break
 
-                matching_products = None
-                
-                # Strategy 1: Exact substring match
+                # Strategies, best first: exact phrase, first 3 words, first word
+                # (often the brand), then any single word. Each one is a
+                # trigram-index lookup, not a scan over every product name.
+                words = product_name.split()
+                terms = []
                 if product_name and len(product_name) > 3:
-                    mask = df_global["name"].str.contains(product_name, case=False, na=False, regex=False)
-                    matching_products = df_global[mask]
-                    if not matching_products.empty:
-                        print(f"🔍 Found {len(matching_products)} products with exact match: '{product_name}'")
-                
-                # Strategy 2: If no exact match, try with first few words
-                if matching_products is None or matching_products.empty:
-                    words = product_name.split()[:3]  # Take first 3 words
-                    if words:
-                        search_term = ' '.join(words)
-                        mask = df_global["name"].str.contains(search_term, case=False, na=False, regex=False)
-                        matching_products = df_global[mask]
-                        if not matching_products.empty:
-                            print(f"🔍 Found {len(matching_products)} products with partial match: '{search_term}'")
-                
-                # Strategy 3: If still no match, try with brand name (first word)
-                if matching_products is None or matching_products.empty:
-                    first_word = product_name.split()[0] if product_name.split() else ""
-                    if first_word and len(first_word) > 2:
-                        mask = df_global["name"].str.contains(first_word, case=False, na=False, regex=False)
-                        matching_products = df_global[mask]
-                        if not matching_products.empty:
-                            print(f"🔍 Found {len(matching_products)} products with brand match: '{first_word}'")
+                    terms.append(product_name)
+                if words:
+                    terms.append(' '.join(words[:3]))
+                if words and len(words[0]) > 2:
+                    terms.append(words[0])
+                terms.extend(word for word in words if len(word) > 2)
                 
-                # If still no match, try to find similar products
-                if matching_products is None or matching_products.empty:
+                matched_term, rows = get_catalog_index().name_index.first_match(terms, limit=1)
+                if len(rows):
+                    print(f"🔍 Found product matching: '{matched_term}'")
+                else:
                     print(f"⚠️ No direct match found for: '{product_name}'")
-                    # Try to find any product that contains any word from the query
-                    query_words = [word for word in product_name.split() if len(word) > 2]
-                    for word in query_words:
-                        mask = df_global["name"].str.contains(word, case=False, na=False, regex=False)
-                        temp_matches = df_global[mask]
-                        if not temp_matches.empty:
-                            matching_products = temp_matches
-                            print(f"🔍 Found {len(matching_products)} products with word match: '{word}'")
-                            break
 
-                if not matching_products.empty:
-                    product = matching_products.iloc[0]
+                if len(rows):
+                    product = df_global.iloc[rows[0]]
                     
                     # Check what specific field user is asking for
                     requested_field = None
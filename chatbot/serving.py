@@ -0,0 +1,138 @@
+"""
+HTTP server with a fixed worker pool for the chatbot.
+
+http.server.HTTPServer handles one request at a time, so one slow Groq call
+blocks every other user. PooledHTTPServer hands each accepted connection to
+a ThreadPoolExecutor and caps the number of queued connections; when the
+queue is full the client gets an immediate 503 instead of waiting forever.
+
+Handlers speak HTTP/1.1 (JSONRequestHandler): every JSON reply carries a
+Content-Length, so the Django client reuses its pooled connections instead
+of reconnecting for each message. An idle connection holds its worker for
+at most KEEPALIVE_TIMEOUT seconds.
+
+Everything loaded at startup (DataFrame, indexes, LLM client, agent graph)
+is shared by the workers. The agent graph keeps no per-call state and the
+DataFrame is only read, so no extra locking is needed for them.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+DEFAULT_WORKERS = int(os.getenv("CHATBOT_WORKERS", "8"))
+DEFAULT_QUEUE_SIZE = int(os.getenv("CHATBOT_QUEUE_SIZE", "32"))
+# Seconds an idle keep-alive connection may hold a worker. Longer than the
+# keep-alive expiry of the Django client (httpx: 5 s), so the client is the
+# one that drops idle connections.
+KEEPALIVE_TIMEOUT = float(os.getenv("CHATBOT_KEEPALIVE_TIMEOUT", "15"))
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that serves connections on `workers` threads.
+
+    At most `workers + queue_size` connections are accepted at once; the rest
+    are answered with 503 Service Unavailable and closed.
+    """
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        # Let the kernel hold pending connections while the pool is busy
+        self.request_queue_size = max(workers + queue_size, 5)
+        super().__init__(server_address, handler_class)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot-worker")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject(request)
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._process_in_worker, request, client_address)
+
+    def _process_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _reject(self, request):
+        body = json.dumps({"error": "Server busy, try again later"}).encode()
+        head = (
+            "HTTP/1.0 503 Service Unavailable\r\n"
+            "Content-Type: application/json\r\n"
+            "Retry-After: 1\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        ).encode()
+        try:
+            request.sendall(head + body)
+        except OSError:
+            pass
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+class JSONRequestHandler(BaseHTTPRequestHandler):
+    """Request handler for a JSON API over keep-alive HTTP/1.1 connections.
+
+    Every reply must have a length; an event stream has none, so it closes
+    the connection when it ends.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_found(self):
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        # The request body, if any, was not read
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+
+    def _read_request(self):
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        return json.loads(post_data.decode('utf-8'))
+
+    def _start_event_stream(self):
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+
+    def _send_event(self, event, payload):
+        frame = f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        self.wfile.write(frame.encode('utf-8'))
+        self.wfile.flush()
+
+
+def make_server(server_address, handler_class, workers=DEFAULT_WORKERS,
+                queue_size=DEFAULT_QUEUE_SIZE, serial=False):
+    """Build the chatbot HTTP server; `serial=True` gives the old single-threaded one"""
+    if serial:
+        return HTTPServer(server_address, handler_class)
+    return PooledHTTPServer(server_address, handler_class, workers=workers, queue_size=queue_size)
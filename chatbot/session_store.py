@@ -0,0 +1,209 @@
+"""
+Per-conversation session state for the agent tools.
+
+Tools such as get_highest_price remember the product the user just saw so
+that a follow-up "món này" can refer to it. That state belongs to one
+conversation, identified by the ``conversation_id`` sent to /chat.
+
+Two backends share the same small interface (get / update / stats):
+- MemorySessionStore: in-process LRU with TTL, a cap on the number of
+  sessions and a cap on their total size. Enough for one server process.
+- SQLiteSessionStore: one SQLite file (WAL mode) that several chatbot
+  worker processes on the same host can share.
+
+make_session_store() picks the backend from the environment:
+    CHATBOT_SESSION_BACKEND   memory (default) | sqlite
+    CHATBOT_SESSION_DB        SQLite path (default chatbot_sessions.db)
+    CHATBOT_SESSION_TTL       seconds of inactivity before a session expires (1800)
+    CHATBOT_SESSION_MAX       maximum number of sessions kept (10000)
+    CHATBOT_SESSION_MAX_BYTES maximum total size of in-memory sessions (8 MiB)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+DEFAULT_TTL = float(os.getenv("CHATBOT_SESSION_TTL", "1800"))
+DEFAULT_MAX_SESSIONS = int(os.getenv("CHATBOT_SESSION_MAX", "10000"))
+DEFAULT_MAX_BYTES = int(os.getenv("CHATBOT_SESSION_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+class SessionStore(ABC):
+    """Interface: a JSON-serializable dict per conversation id"""
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> dict:
+        """Session of conversation_id ({} when unknown or expired)"""
+
+    @abstractmethod
+    def update(self, conversation_id: str, **values) -> None:
+        """Merge values into the session of conversation_id"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Counters reported by the chatbot server's /stats"""
+
+
+class MemorySessionStore(SessionStore):
+    """LRU + TTL store kept in this process.
+
+    Sessions are evicted least recently used first whenever the count goes
+    over max_sessions or the encoded size goes over max_bytes, so memory use
+    stays bounded no matter how many conversation ids clients invent.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # conversation_id -> (last_used, values, size)
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._expired = 0
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(conversation_id)
+            if entry is None:
+                return {}
+            last_used, values, size = entry
+            if now - last_used > self.ttl:
+                self._drop(conversation_id)
+                self._expired += 1
+                return {}
+            self._sessions[conversation_id] = (now, values, size)
+            self._sessions.move_to_end(conversation_id)
+            return dict(values)
+
+    def update(self, conversation_id, **values):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(conversation_id)
+            merged = dict(entry[1]) if entry and now - entry[0] <= self.ttl else {}
+            merged.update(values)
+            size = len(conversation_id) + len(json.dumps(merged, default=str))
+            if entry:
+                self._drop(conversation_id)
+            self._sessions[conversation_id] = (now, merged, size)
+            self._bytes += size
+            self._evict(now)
+
+    def _drop(self, conversation_id):
+        _, _, size = self._sessions.pop(conversation_id)
+        self._bytes -= size
+
+    def _evict(self, now):
+        # Expired sessions sit at the front (least recently used) of the OrderedDict
+        while self._sessions:
+            oldest_id, (last_used, _, _) = next(iter(self._sessions.items()))
+            if now - last_used > self.ttl:
+                self._drop(oldest_id)
+                self._expired += 1
+            elif len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+                self._drop(oldest_id)
+                self._evicted += 1
+            else:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evicted": self._evicted,
+                "expired": self._expired,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store shared by every process that opens the same SQLite file.
+
+    Each thread keeps its own connection. Eviction keeps at most
+    max_sessions rows, dropping the least recently used; expired rows are
+    removed on write.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " conversation_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, conversation_id):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE conversation_id = ? AND last_used >= ?",
+                (conversation_id, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return {}
+            conn.execute(
+                "UPDATE sessions SET last_used = ? WHERE conversation_id = ?",
+                (now, conversation_id),
+            )
+        return json.loads(row[0])
+
+    def update(self, conversation_id, **values):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE so the read-merge-write is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE conversation_id = ? AND last_used >= ?",
+                (conversation_id, now - self.ttl),
+            ).fetchone()
+            merged = json.loads(row[0]) if row else {}
+            merged.update(values)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (conversation_id, data, last_used) VALUES (?, ?, ?)",
+                (conversation_id, json.dumps(merged, default=str), now),
+            )
+            conn.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM sessions WHERE conversation_id IN ("
+                " SELECT conversation_id FROM sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def stats(self):
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {"backend": "sqlite", "path": self.path, "sessions": count}
+
+
+def make_session_store() -> SessionStore:
+    """Build the store selected by CHATBOT_SESSION_BACKEND"""
+    backend = os.getenv("CHATBOT_SESSION_BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("CHATBOT_SESSION_DB", "chatbot_sessions.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown CHATBOT_SESSION_BACKEND: {backend}")
+    return MemorySessionStore()
@@ -4,10 +4,9 @@ Simple Chatbot Server - Keeps models loaded in memory
 Run this server once, then Django can call it via HTTP
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import json
 import sys
 import os
+import time
 from pathlib import Path
 
 
@@ -23,6 +22,8 @@ from process_data import (
     HumanMessage, EMBEDDING_MODEL
 )
 import process_data
+from intent_router import IntentRouter
+from serving import make_server, JSONRequestHandler, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE
 import pandas as pd
 from langchain.tools import tool
 
@@ -31,7 +32,7 @@ if process_data.df_global is None:
     csv_path = "amazon_data.csv"
     if not os.path.exists(csv_path):
         raise FileNotFoundError("amazon_data.csv not found")
-    process_data.df_global = load_and_clean_data(csv_path)
+    process_data.set_dataframe(load_and_clean_data(csv_path))
     print("✅ Data loaded")
 
 connect_milvus_lite()
@@ -111,26 +112,18 @@ def search_text(q: str) -> str:
         if not product_name or len(product_name) < 3:
             return "❌ Tên sản phẩm quá ngắn. Vui lòng cung cấp tên sản phẩm rõ ràng hơn."
         
-        mask = process_data.df_global["name"].str.contains(product_name, case=False, na=False, regex=False)
-        matching_products = process_data.df_global[mask]
+        # Same cascade as before (phrase, first three words, first word), but each
+        # step is a trigram-index lookup instead of a scan over every name
+        words = product_name.split()
+        terms = [product_name, ' '.join(words[:3])]
+        if words and len(words[0]) > 2:
+            terms.append(words[0])
+        _, rows = process_data.get_catalog_index().name_index.first_match(terms, limit=1)
         
-        if matching_products.empty:
-            words = product_name.split()[:3]
-            if words:
-                search_term = ' '.join(words)
-                mask = process_data.df_global["name"].str.contains(search_term, case=False, na=False, regex=False)
-                matching_products = process_data.df_global[mask]
-        
-        if matching_products.empty:
-            first_word = product_name.split()[0] if product_name.split() else ""
-            if first_word and len(first_word) > 2:
-                mask = process_data.df_global["name"].str.contains(first_word, case=False, na=False, regex=False)
-                matching_products = process_data.df_global[mask]
-        
-        if matching_products.empty:
+        if len(rows) == 0:
             return f"❌ Không tìm thấy sản phẩm '{product_name}' trong cơ sở dữ liệu."
         
-        product = matching_products.iloc[0]
+        product = process_data.df_global.iloc[rows[0]]
         print(f"✅ Found product: {product.get('name', 'N/A')[:50]}...")
         
         if requested_field and requested_field in product and pd.notna(product[requested_field]):
@@ -230,68 +223,207 @@ IMPORTANT:
 
 agent_executor = create_react_agent(llm, tools, prompt=system_prompt)
 print("✅ Agent ready")
+
+TOOLS_BY_NAME = {t.name: t for t in tools}
+USE_INTENT_ROUTER = os.getenv("CHATBOT_INTENT_ROUTER", "1") != "0"
+router = IntentRouter(process_data.get_catalog_index().brands.vocabulary)
+print(f"✅ Intent router {'enabled' if USE_INTENT_ROUTER else 'disabled'}")
 print("\n🎉 Chatbot server is ready! Listening on port 8001...")
 
-class ChatbotHandler(BaseHTTPRequestHandler):
+NO_ANSWER = "Xin lỗi, tôi không thể xử lý câu hỏi này."
+
+
+def route_message(message: str):
+    """Call the tool directly when the intent router is confident.
+
+    Returns (tool_name, result), or None when the agent has to decide.
+    """
+    if not USE_INTENT_ROUTER:
+        return None
+    route = router.route(message)
+    if route is None:
+        router.stats.record_miss()
+        return None
+    start = time.perf_counter()
+    result = TOOLS_BY_NAME[route.tool].invoke(route.args)
+    router.stats.record_hit(route.rule, time.perf_counter() - start)
+    print(f"⚡ Routed to {route.tool} ({route.rule}) without the LLM")
+    return route.tool, result
+
+
+# single_hop: answer with the first tool result and stop the graph right there,
+#             skipping the LLM call that would only rephrase it (default)
+# answer:     let the LLM write the final answer after the tool ran
+AGENT_MODES = ("single_hop", "answer")
+DEFAULT_AGENT_MODE = os.getenv("CHATBOT_AGENT_MODE", "single_hop")
+
+
+def stream_agent_events(message: str, mode: str = None):
+    """Answer message, yielding events as soon as they are produced.
+
+    Events are dicts with a "type" key:
+    - token: a chunk of text generated by the LLM
+    - tool:  a tool result
+    - done:  the final response text
+    """
+    mode = mode if mode in AGENT_MODES else DEFAULT_AGENT_MODE
+    # The router's answer is a bare tool result; in answer mode the agent
+    # writes the reply anyway, so the rules are not even tried
+    routed = route_message(message) if mode == "single_hop" else None
+    if routed:
+        tool_name, result = routed
+        yield {"type": "tool", "name": tool_name, "content": result}
+        yield {"type": "done", "response": result or NO_ANSWER}
+        return
+
+    config = {"recursion_limit": 10}
+    tool_result = None
+    answer_tokens = []
+    start = time.perf_counter()
+
+    stream = agent_executor.stream(
+        {"messages": [HumanMessage(content=message)]},
+        config=config,
+        stream_mode=["messages", "updates"],
+    )
+    try:
+        for stream_mode, chunk in stream:
+            if stream_mode == "messages":
+                msg, metadata = chunk
+                if metadata.get("langgraph_node") == "agent":
+                    content = msg.content if isinstance(msg.content, str) else ""
+                    if content:
+                        answer_tokens.append(content)
+                        yield {"type": "token", "content": content}
+            elif "tools" in chunk and "messages" in chunk["tools"]:
+                for msg in chunk["tools"]["messages"]:
+                    if hasattr(msg, "content") and msg.content:
+                        if tool_result is None:
+                            tool_result = msg.content
+                        # Text written before the tool call is not the answer
+                        answer_tokens = []
+                        yield {"type": "tool", "name": getattr(msg, "name", ""), "content": msg.content}
+                        break
+                if tool_result is not None and mode == "single_hop":
+                    break
+    finally:
+        # Closing the stream stops the graph before its next LLM call
+        stream.close()
+
+    router.stats.record_agent(time.perf_counter() - start)
+    if mode == "answer":
+        response = "".join(answer_tokens) or tool_result
+    else:
+        response = tool_result or "".join(answer_tokens)
+    yield {"type": "done", "response": response or NO_ANSWER}
+
+
+def answer_message(message: str, mode: str = None) -> str:
+    """Run stream_agent_events to completion and return the final response"""
+    response = NO_ANSWER
+    for event in stream_agent_events(message, mode):
+        if event["type"] == "done":
+            response = event["response"]
+    return response
+
+
+class ChatbotHandler(JSONRequestHandler):
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, {
+                'intent_router': router.stats.snapshot(),
+                'sessions': process_data.session_store.stats(),
+            })
+        else:
+            self._send_not_found()
+
     def do_POST(self):
         if self.path == '/chat':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            self._handle_chat()
+        elif self.path == '/chat/stream':
+            self._handle_chat_stream()
+        else:
+            self._send_not_found()
+
+    def _handle_chat(self):
+        try:
+            data = self._read_request()
+            message = data.get('message', '')
+            
+            if not message:
+                self._send_json(400, {'error': 'Message required'})
+                return
+            
+            print(f"\n📨 Received: {message}")
+            
+            with process_data.conversation(data.get('conversation_id')):
+                response_text = answer_message(message, data.get('mode'))
+            print(f"✅ Response: {response_text[:100]}...")
+            
+            self._send_json(200, {'response': response_text})
             
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+
+    def _handle_chat_stream(self):
+        """Server-Sent Events version of /chat; the connection closes after done"""
+        try:
+            data = self._read_request()
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        message = data.get('message', '')
+        if not message:
+            self._send_json(400, {'error': 'Message required'})
+            return
+
+        print(f"\n📨 Received (stream): {message}")
+        self._start_event_stream()
+
+        try:
+            with process_data.conversation(data.get('conversation_id')):
+                for event in stream_agent_events(message, data.get('mode')):
+                    self._send_event(event["type"], event)
+        except (BrokenPipeError, ConnectionResetError):
+            print("⚠️ Client disconnected")
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
             try:
-                data = json.loads(post_data.decode('utf-8'))
-                message = data.get('message', '')
-                
-                if not message:
-                    self.send_response(400)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': 'Message required'}).encode())
-                    return
-                
-                print(f"\n📨 Received: {message}")
-                
-                # Process with LLM agent
-                tool_result = None
-                config = {"recursion_limit": 10}
-                
-                for chunk in agent_executor.stream({"messages": [HumanMessage(content=message)]}, config=config):
-                    if "tools" in chunk and "messages" in chunk["tools"]:
-                        for msg in chunk["tools"]["messages"]:
-                            if hasattr(msg, "content") and msg.content:
-                                tool_result = msg.content
-                                break
-                
-                response_text = tool_result if tool_result else "Xin lỗi, tôi không thể xử lý câu hỏi này."
-                print(f"✅ Response: {response_text[:100]}...")
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({'response': response_text}).encode())
-                
-            except Exception as e:
-                print(f"❌ Error: {str(e)}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
-    
+                self._send_event("error", {"error": str(e)})
+            except OSError:
+                pass
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def log_message(self, format, *args):
         pass
 
 if __name__ == '__main__':
-    server = HTTPServer(('localhost', 8001), ChatbotHandler)
-    server.serve_forever()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chatbot HTTP server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of requests served concurrently")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="connections allowed to wait for a worker before getting 503")
+    parser.add_argument("--serial", action="store_true",
+                        help="use the old single-threaded HTTPServer")
+    args = parser.parse_args()
+
+    server = make_server(('localhost', args.port), ChatbotHandler,
+                         workers=args.workers, queue_size=args.queue_size, serial=args.serial)
+    mode = "serial" if args.serial else f"{args.workers} workers, queue {args.queue_size}"
+    print(f"🧵 Serving mode: {mode}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
 
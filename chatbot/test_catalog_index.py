@@ -0,0 +1,134 @@
+"""Run with: python -m unittest test_catalog_index (from chatbot/)"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from catalog_index import BrandIndex, NameIndex, PriceIndex, normalize_brand
+
+
+class BrandIndexTests(unittest.TestCase):
+    def setUp(self):
+        brands = pd.Series(["Sony", " SONY ", "Samsung", "A&B (US)", None, "sony", "Samsung Pro", "", "Sony Music"])
+        prices = np.array([100.0, 300.0, 50.0, 20.0, 999.0, np.nan, 80.0, 10.0, 200.0])
+        names = np.array(["TV", "Speaker", "Phone", "Cable", "Ghost", "TV", "Tablet", "Nameless", "Album"],
+                         dtype=object)
+        self.index = BrandIndex(brands, prices, names)
+
+    def test_normalize_brand(self):
+        self.assertEqual(normalize_brand("  Sony   Music "), "sony music")
+
+    def test_brand_ignores_case_and_spacing(self):
+        self.assertEqual(self.index.match(" SONY  music"), ["sony music"])
+        self.assertEqual(self.index.count(["sony"]), 3)
+
+    def test_known_brand_still_matches_every_brand_containing_it(self):
+        # Same rows as brandName.str.contains("Sony", case=False)
+        self.assertEqual(self.index.match("Sony"), ["sony", "sony music"])
+        self.assertEqual(self.index.count(self.index.match("Sony")), 4)
+        self.assertEqual(list(self.index.positions(self.index.match("Sony"))), [1, 8, 0])
+
+    def test_unknown_brand_matches_every_brand_containing_it(self):
+        self.assertEqual(self.index.match("sam"), ["samsung", "samsung pro"])
+        self.assertEqual(self.index.match("a&b ("), ["a&b (us)"])
+        self.assertEqual(self.index.match("nokia"), [])
+
+    def test_positions_by_descending_price_one_per_name(self):
+        # The unpriced "TV" row is a duplicate name of the 100.0 one
+        self.assertEqual(list(self.index.positions(["sony"])), [1, 0])
+        self.assertEqual(list(self.index.positions(["samsung", "samsung pro"])), [6, 2])
+
+    def test_rows_without_brand_are_not_indexed(self):
+        self.assertNotIn("", self.index.counts)
+        self.assertEqual(sum(self.index.counts.values()), 7)
+
+
+class PriceIndexTests(unittest.TestCase):
+    """Compared with the pandas filters the price tools used before the index"""
+
+    def setUp(self):
+        self.prices = pd.Series(["30", "10", None, "20", "abc", "10", "40", "25"])
+        self.numeric = pd.to_numeric(self.prices, errors="coerce")
+        self.index = PriceIndex(self.prices)
+
+    def baseline_range(self, low, high):
+        return self.numeric[(self.numeric >= low) & (self.numeric <= high)].sort_values(kind="stable").index
+
+    def test_min_and_max_are_the_first_rows_with_that_price(self):
+        self.assertEqual(self.index.min_position(), 1)
+        self.assertEqual(self.index.max_position(), 6)
+        self.assertEqual(len(self.index), 6)
+
+    def test_range_bounds_are_inclusive(self):
+        for low, high in ((10, 30), (10, 10), (11, 29), (0, 100), (25, 25)):
+            with self.subTest(low=low, high=high):
+                self.assertEqual(list(self.index.range_positions(low, high)), list(self.baseline_range(low, high)))
+
+    def test_empty_range(self):
+        self.assertEqual(len(self.index.range_positions(41, 50)), 0)
+        self.assertEqual(len(self.index.range_positions(21, 24)), 0)
+        self.assertEqual(len(self.index.range_positions(30, 20)), 0)
+
+    def baseline_nearest(self, ref_price):
+        return (self.numeric - ref_price).abs().sort_values(kind="stable").index
+
+    def test_nearest_by_distance_then_unparseable_prices(self):
+        for ref_price in (22, 15, 10, 0, 100, 25, 27.5):
+            with self.subTest(ref_price=ref_price):
+                self.assertEqual(list(self.index.nearest_positions(ref_price)),
+                                 list(self.baseline_nearest(ref_price)))
+
+    def test_ties_at_the_nearest_price_are_in_row_order(self):
+        # 15 is 5 away from both 10 (rows 1 and 5) and 20 (row 3)
+        self.assertEqual(list(self.index.nearest_positions(15))[:3], [1, 3, 5])
+
+    def test_empty_catalog(self):
+        index = PriceIndex(pd.Series([], dtype=object))
+        self.assertEqual(len(index), 0)
+        self.assertEqual(len(index.range_positions(0, 100)), 0)
+        self.assertEqual(list(index.nearest_positions(10)), [])
+
+
+class NameIndexTests(unittest.TestCase):
+    NAMES = ["Sony WH-1000XM5 Headphones", "Samsung Galaxy S24", "Điện thoại Galaxy A15", "USB-C cable",
+             "sony bravia tv", "", "Galaxy Buds", "Bàn phím cơ"]
+
+    def setUp(self):
+        self.index = NameIndex(self.NAMES)
+
+    def baseline(self, term):
+        """The str.contains lookup NameIndex replaced"""
+        mask = pd.Series(self.NAMES).str.contains(term, case=False, na=False, regex=False)
+        return list(np.flatnonzero(mask.to_numpy()))
+
+    def test_matches_the_substring_search(self):
+        for term in ("sony", "GALAXY", "galaxy s", "-c ca", "phím", "xm5 head", "nokia", "tv", "a", "bàn phím cơ"):
+            with self.subTest(term=term):
+                self.assertEqual(list(self.index.find(term)), self.baseline(term))
+
+    def test_terms_shorter_than_a_trigram(self):
+        self.assertEqual(list(self.index.find("s")), self.baseline("s"))
+        self.assertEqual(list(self.index.find("tv")), [4])
+        self.assertEqual(list(self.index.find("")), self.baseline(""))
+
+    def test_case_is_folded_but_accents_are_not(self):
+        self.assertEqual(list(self.index.find("ĐIỆN THOẠI")), [2])
+        self.assertEqual(list(self.index.find("dien thoai")), [])
+
+    def test_limit(self):
+        self.assertEqual(list(self.index.find("galaxy", limit=2)), [1, 2])
+        self.assertEqual(list(self.index.find("a", limit=3)), self.baseline("a")[:3])
+
+    def test_first_match_tries_terms_in_order(self):
+        term, rows = self.index.first_match(["galaxy tab", "", "galaxy", "sony"])
+        self.assertEqual((term, list(rows)), ("galaxy", [1, 2, 6]))
+        term, rows = self.index.first_match(["nokia"], limit=1)
+        self.assertEqual((term, len(rows)), (None, 0))
+
+    def test_empty_catalog(self):
+        self.assertEqual(len(NameIndex([]).find("sony")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
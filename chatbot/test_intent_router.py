@@ -0,0 +1,89 @@
+"""Run with: python -m unittest test_intent_router (from chatbot/)"""
+
+import unittest
+
+from intent_router import IntentRouter, fold, parse_number
+
+
+class IntentRouterTests(unittest.TestCase):
+    def setUp(self):
+        self.router = IntentRouter(["Samsung", "Sony", "Apple"])
+
+    def route(self, message):
+        route = self.router.route(message)
+        return (route.tool, route.args) if route else None
+
+    def test_fold(self):
+        self.assertEqual(fold("  ĐẮT   Nhất "), "dat nhat")
+
+    def test_parse_number(self):
+        self.assertEqual(parse_number("1,500"), 1500)
+        self.assertEqual(parse_number("100", "k"), 100000)
+        self.assertEqual(parse_number("1.5", "trieu"), 1500000)
+
+    def test_price_range(self):
+        cases = {
+            "từ 1 đến 2 triệu": (1000000, 2000000),
+            "sản phẩm từ 100k đến 200k": (100000, 200000),
+            "giá từ 300000 đến 100000": (100000, 300000),
+            "between $10 and $20": (10, 20),
+            "tôi muốn mua sản phẩm giá từ 1 đến 2 triệu": (1000000, 2000000),
+        }
+        for message, (low, high) in cases.items():
+            with self.subTest(message=message):
+                tool, args = self.route(message)
+                self.assertEqual(tool, "recommend_product_by_range")
+                self.assertEqual((args["min_price"], args["max_price"]), (low, high))
+
+    def test_range_without_price_context_or_with_a_category_goes_to_the_agent(self):
+        for message in ("từ 10 đến 20", "tôi muốn mua đồ từ 2 đến 3 tuổi", "từ 1 đến 2 kg",
+                        "áo từ 100k đến 200k"):
+            with self.subTest(message=message):
+                self.assertIsNone(self.route(message))
+
+    def test_superlatives(self):
+        self.assertEqual(self.route("sản phẩm rẻ nhất"), ("get_lowest_price", {"field": "salePrice"}))
+        self.assertEqual(self.route("Sản phẩm nào ĐẮT NHẤT?"), ("get_highest_price", {"field": "salePrice"}))
+
+    def test_qualified_or_plural_superlatives_go_to_the_agent(self):
+        for message in ("cái nào rẻ nhất của hãng sony", "tai nghe rẻ nhất", "top 5 sản phẩm rẻ nhất",
+                        "rating của sản phẩm đắt nhất", "sản phẩm đắt nhất và rẻ nhất"):
+            with self.subTest(message=message):
+                self.assertIsNone(self.route(message))
+
+    def test_brand(self):
+        tool, args = self.route("sản phẩm samsung")
+        self.assertEqual(tool, "product_from_brand")
+        self.assertEqual(args["brand_name"], "Samsung")
+        self.assertIsNone(self.route("sản phẩm nokia"))
+
+    def test_near_price(self):
+        tool, args = self.route("gợi ý 5 sản phẩm gần giá 500k")
+        self.assertEqual(tool, "suggest_by_price")
+        self.assertEqual((args["ref_price"], args["n"]), (500000, 5))
+
+    def test_near_price_needs_a_price_and_no_other_condition(self):
+        self.assertEqual(self.route("tầm 500k")[1]["ref_price"], 500000)
+        self.assertEqual(self.route("sản phẩm gần 200 nghìn đồng")[1]["ref_price"], 200000)
+        self.assertEqual(self.route("around $50")[1]["ref_price"], 50)
+        for message in ("sữa tắm 500ml", "gần 5 sao", "tầm 2 kg", "sản phẩm tầm 10 tuổi", "quanh 2 năm",
+                        "sản phẩm tầm 200", "mắt kính tầm 200", "áo gần 300k"):
+            with self.subTest(message=message):
+                self.assertIsNone(self.route(message))
+
+    def test_same_brand_keeps_the_product_name_as_typed(self):
+        tool, args = self.route("sản phẩm cùng hãng với Galaxy S24 Ultra?")
+        self.assertEqual(tool, "product_same_brand")
+        self.assertEqual(args["product_name"], "Galaxy S24 Ultra")
+
+    def test_product_field(self):
+        self.assertEqual(self.route("giá của sản phẩm iPhone 15")[0], "search_text")
+
+    def test_unrelated_messages_go_to_the_agent(self):
+        for message in ("xin chào", "", "bạn có thể giúp gì cho tôi?"):
+            with self.subTest(message=message):
+                self.assertIsNone(self.route(message))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Run with: python -m unittest test_serving (from chatbot/)"""
+
+import http.client
+import json
+import threading
+import unittest
+
+from serving import JSONRequestHandler, make_server
+
+
+class EchoHandler(JSONRequestHandler):
+    connections = []
+
+    def setup(self):
+        super().setup()
+        self.connections.append(self.client_address)
+
+    def do_POST(self):
+        if self.path == '/chat':
+            self._send_json(200, {'response': self._read_request()['message']})
+        elif self.path == '/chat/stream':
+            self._read_request()
+            self._start_event_stream()
+            self._send_event('done', {'response': 'ok'})
+        else:
+            self._send_not_found()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class KeepAliveTests(unittest.TestCase):
+    def setUp(self):
+        EchoHandler.connections = []
+        self.server = make_server(('localhost', 0), EchoHandler, workers=2, queue_size=2)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.conn = http.client.HTTPConnection('localhost', self.server.server_address[1], timeout=5)
+        self.addCleanup(self.conn.close)
+
+    def post(self, path, message):
+        self.conn.request('POST', path, json.dumps({'message': message}), {'Content-Type': 'application/json'})
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def test_sequential_calls_reuse_one_connection(self):
+        for message in ('first', 'second'):
+            response, body = self.post('/chat', message)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(body), {'response': message})
+            self.assertFalse(response.will_close)
+        self.assertEqual(len(EchoHandler.connections), 1)
+
+    def test_event_stream_closes_the_connection(self):
+        response, body = self.post('/chat/stream', 'hi')
+        self.assertTrue(response.will_close)
+        self.assertEqual(body, b'event: done\ndata: {"response": "ok"}\n\n')
+        response, _ = self.post('/chat', 'again')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(EchoHandler.connections), 2)
+
+    def test_not_found_closes_the_connection(self):
+        response, _ = self.post('/unknown', 'hi')
+        self.assertEqual(response.status, 404)
+        self.assertTrue(response.will_close)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Run with: python -m unittest test_session_store (from chatbot/)"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore, make_session_store
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SessionStoreTests(unittest.TestCase):
+    def test_interface_cannot_be_instantiated(self):
+        with self.assertRaises(TypeError):
+            SessionStore()
+
+
+class MemorySessionStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("session_store.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_update_merges_and_get_returns_a_copy(self):
+        store = MemorySessionStore()
+        store.update("a", last_product="TV")
+        store.update("a", last_price=100)
+        session = store.get("a")
+        self.assertEqual(session, {"last_product": "TV", "last_price": 100})
+        session["last_price"] = 0
+        self.assertEqual(store.get("a")["last_price"], 100)
+        self.assertEqual(store.get("unknown"), {})
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = MemorySessionStore(max_sessions=2)
+        store.update("a", n=1)
+        store.update("b", n=2)
+        store.get("a")
+        store.update("c", n=3)
+        self.assertEqual(store.get("b"), {})
+        self.assertEqual(store.get("a"), {"n": 1})
+        self.assertEqual(store.get("c"), {"n": 3})
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_total_size_is_bounded(self):
+        store = MemorySessionStore(max_bytes=100)
+        for i in range(10):
+            store.update(f"id{i}", text="x" * 30)
+        stats = store.stats()
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(store.get("id9"), {"text": "x" * 30})
+
+    def test_idle_session_expires(self):
+        store = MemorySessionStore(ttl=60)
+        store.update("a", n=1)
+        self.clock.now += 59
+        self.assertEqual(store.get("a"), {"n": 1})
+        self.clock.now += 61
+        self.assertEqual(store.get("a"), {})
+        store.update("a", m=2)
+        self.assertEqual(store.get("a"), {"m": 2})
+        self.assertEqual(store.stats()["expired"], 1)
+
+
+class SQLiteSessionStoreTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sessions.db")
+        self.clock = FakeClock()
+        patcher = mock.patch("session_store.time.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sessions_persist_across_instances(self):
+        SQLiteSessionStore(self.path).update("a", last_product="TV")
+        SQLiteSessionStore(self.path).update("a", last_price=100)
+        store = SQLiteSessionStore(self.path)
+        self.assertEqual(store.get("a"), {"last_product": "TV", "last_price": 100})
+        self.assertEqual(store.stats()["sessions"], 1)
+
+    def test_expiry_and_eviction(self):
+        store = SQLiteSessionStore(self.path, ttl=60, max_sessions=2)
+        store.update("a", n=1)
+        self.clock.now += 1
+        store.update("b", n=2)
+        self.clock.now += 1
+        store.update("c", n=3)
+        self.assertEqual(store.get("a"), {})
+        self.clock.now += 61
+        self.assertEqual(store.get("c"), {})
+
+
+class MakeSessionStoreTests(unittest.TestCase):
+    def test_memory_by_default(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIsInstance(make_session_store(), MemorySessionStore)
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "s.db")
+            env = {"CHATBOT_SESSION_BACKEND": "sqlite", "CHATBOT_SESSION_DB": path}
+            with mock.patch.dict(os.environ, env):
+                store = make_session_store()
+            self.assertIsInstance(store, SQLiteSessionStore)
+            self.assertEqual(store.path, path)
+            store._connect().close()
+
+    def test_unknown_backend(self):
+        with mock.patch.dict(os.environ, {"CHATBOT_SESSION_BACKEND": "redis"}):
+            with self.assertRaises(ValueError):
+                make_session_store()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
+import { API_ENDPOINTS } from '../config/api';
 
 interface Message {
   id: string;
@@ -8,6 +9,19 @@ interface Message {
   isStreaming?: boolean;
 }
 
+// One id per browser tab, so the chatbot server keeps "món này" per user
+const getConversationId = (): string => {
+  const key = 'chatbotConversationId';
+  let id = sessionStorage.getItem(key);
+  if (!id) {
+    id = typeof crypto !== 'undefined' && 'randomUUID' in crypto
+      ? crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    sessionStorage.setItem(key, id);
+  }
+  return id;
+};
+
 const FloatingChatbot: React.FC = () => {
   const [messages, setMessages] = useState<Message[]>([
     {
@@ -73,56 +87,88 @@ const FloatingChatbot: React.FC = () => {
 
     setMessages(prev => [...prev, botMessage]);
 
+    const setBotText = (text: string, isStreaming = true) => {
+      setMessages(prev => prev.map(msg =>
+        msg.id === botMessageId
+          ? { ...msg, text, isStreaming }
+          : msg
+      ));
+    };
+
     try {
-      const response = await fetch('http://localhost:8000/api/chatbot/chat/', {
+      const response = await fetch(API_ENDPOINTS.CHATBOT_STREAM, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ message: userMessage.text }),
+        body: JSON.stringify({
+          message: userMessage.text,
+          conversation_id: getConversationId(),
+        }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Network response was not ok');
       }
 
-      const data = await response.json();
-      
-      if (data.status === 'success' && data.response) {
-        // Real streaming effect - character by character
-        const responseText = data.response;
-        let currentText = '';
-        
-        for (let i = 0; i < responseText.length; i++) {
-          currentText += responseText[i];
-          
-          setMessages(prev => prev.map(msg => 
-            msg.id === botMessageId 
-              ? { ...msg, text: currentText }
-              : msg
-          ));
-          
-          // Only scroll to bottom occasionally during streaming, not every character
-          if (i % 20 === 0 || responseText[i] === '\n') {
+      // Read Server-Sent Events as they arrive: "token" events append text,
+      // a "tool" event carries the actual answer, "done" closes the message.
+      // In the server's "answer" mode the LLM keeps writing after the tool
+      // event; those tokens start a fresh answer that replaces the tool text.
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let currentText = '';
+      let answered = false;
+      let answerText = '';
+      let finished = false;
+
+      while (!finished) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+
+          let eventType = 'message';
+          let dataLine = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) eventType = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLine += line.slice(5).trim();
+          }
+          if (!dataLine) continue;
+          const payload = JSON.parse(dataLine);
+
+          if (eventType === 'token' && !answered) {
+            currentText += payload.content;
+            setBotText(currentText);
+          } else if (eventType === 'token') {
+            answerText += payload.content;
+            currentText = answerText;
+            setBotText(currentText);
+          } else if (eventType === 'tool' && !answered) {
+            answered = true;
+            currentText = payload.content;
+            setBotText(currentText);
             scrollToBottom(true);
+          } else if (eventType === 'done') {
+            currentText = payload.response || currentText;
+            finished = true;
+          } else if (eventType === 'error') {
+            throw new Error(payload.error || 'Unknown error');
           }
-          
-          // Variable delay for more natural streaming
-          const delay = responseText[i] === '\n' ? 100 : 
-                       responseText[i] === '.' ? 150 : 
-                       responseText[i] === ',' ? 50 : 30;
-          await new Promise(resolve => setTimeout(resolve, delay));
         }
-        
-        // Mark as completed
-        setMessages(prev => prev.map(msg => 
-          msg.id === botMessageId 
-            ? { ...msg, isStreaming: false }
-            : msg
-        ));
-      } else {
-        throw new Error(data.response || 'Unknown error');
       }
+
+      if (!currentText) {
+        throw new Error('Empty response');
+      }
+      setBotText(currentText, false);
+      scrollToBottom(true);
     } catch (error) {
       console.error('Error:', error);
       setMessages(prev => prev.map(msg => 
@@ -1,40 +1,96 @@
-import React, { useEffect, useState, useMemo } from 'react';
-import { Product } from '../types/Product';
+import React, { useEffect, useState, useMemo, useRef } from 'react';
+import { Product, ProductFilters } from '../types/Product';
 import { productService } from '../services/productService';
 import SearchFilter from './SearchFilter';
 
 
+const PAGE_SIZE = 24;
+const SEARCH_DEBOUNCE_MS = 300;
+
+const ORDERING_OPTIONS = [
+  { value: 'id', label: 'Mặc định' },
+  { value: 'price', label: 'Giá tăng dần' },
+  { value: '-price', label: 'Giá giảm dần' },
+  { value: '-rating', label: 'Đánh giá cao nhất' },
+  { value: '-discount', label: 'Giảm giá nhiều nhất' },
+  { value: '-sold_count', label: 'Bán chạy nhất' }
+];
+
+// With a search term the server ranks by relevance; otherwise it lists in the chosen order
+const fetchPage = (filters: ProductFilters, cursor?: string | null) =>
+  filters.q
+    ? productService.searchProducts(filters, cursor)
+    : productService.getProducts(filters, cursor);
+
 interface Props {
   onAdd: (product: Product) => void;
 }
 
 const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
   const [products, setProducts] = useState<Product[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [filterBrand, setFilterBrand] = useState('');
   const [filterCategory, setFilterCategory] = useState('');
+  const [ordering, setOrdering] = useState('id');
+  const [brands, setBrands] = useState<string[]>([]);
+  const [categories, setCategories] = useState<string[]>([]);
+  // Responses to superseded filters are dropped
+  const requestId = useRef(0);
+
+  const filters = useMemo(() => ({
+    q: searchTerm.trim(),
+    brand: filterBrand.trim(),
+    category: filterCategory.trim(),
+    ordering,
+    pageSize: PAGE_SIZE
+  }), [searchTerm, filterBrand, filterCategory, ordering]);
 
   useEffect(() => {
-    // Fetch data from Django API
+    // Fetch the first page from Django whenever the filters change
+    const current = ++requestId.current;
     const fetchProducts = async () => {
       try {
         setLoading(true);
         setError(null);
-        const products = await productService.getAllProducts();
-        setProducts(products);
+        const page = await fetchPage(filters);
+        if (current !== requestId.current) return;
+        setProducts(page.products);
+        setNextCursor(page.nextCursor);
       } catch (error) {
+        if (current !== requestId.current) return;
         console.error('Error fetching products:', error);
         setError('Không thể kết nối với server. Vui lòng kiểm tra lại.');
         setProducts([]);
+        setNextCursor(null);
       } finally {
-        setLoading(false);
+        if (current === requestId.current) setLoading(false);
       }
     };
 
-    fetchProducts();
-  }, []);
+    // Wait until the user stops typing
+    const timer = setTimeout(fetchProducts, SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [filters]);
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    const current = requestId.current;
+    try {
+      setLoadingMore(true);
+      const page = await fetchPage(filters, nextCursor);
+      if (current !== requestId.current) return;
+      setProducts(prev => [...prev, ...page.products]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error fetching more products:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const formatPrice = (price: number) => {
     return new Intl.NumberFormat('vi-VN').format(price);
@@ -78,36 +134,15 @@ const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
     return 'General';
   };
 
-  // Extract unique brands and categories for filters
-  const { brands, categories } = useMemo(() => {
-    const uniqueBrands = new Set<string>();
-    const uniqueCategories = new Set<string>();
-    
-    products.forEach(product => {
-      const brand = getProductBrand(product);
-      const category = getProductCategory(product);
-      uniqueBrands.add(brand);
-      uniqueCategories.add(category);
-    });
-    
-    return {
-      brands: Array.from(uniqueBrands).sort(),
-      categories: Array.from(uniqueCategories).sort()
-    };
-  }, [products]);
-
-  // Filter products based on search and filter criteria
-  const filteredProducts = useMemo(() => {
-    return products.filter(product => {
-      const matchesSearch = product.name.toLowerCase().includes(searchTerm.toLowerCase());
-      const brand = getProductBrand(product);
-      const category = getProductCategory(product);
-      const matchesBrand = !filterBrand || brand.toLowerCase().includes(filterBrand.toLowerCase());
-      const matchesCategory = !filterCategory || category.toLowerCase().includes(filterCategory.toLowerCase());
-      
-      return matchesSearch && matchesBrand && matchesCategory;
-    });
-  }, [products, searchTerm, filterBrand, filterCategory]);
+  // Brands and categories of the whole catalog, counted by the server
+  useEffect(() => {
+    productService.getFacets()
+      .then(facets => {
+        setBrands(facets.brand.map(facet => facet.value));
+        setCategories(facets.category.map(facet => facet.value));
+      })
+      .catch(error => console.error('Error fetching facets:', error));
+  }, []);
 
   const handleSearch = (term: string) => {
     setSearchTerm(term);
@@ -122,7 +157,7 @@ const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
 
   return (
     <div className="w-full p-4 bg-blue-50 min-h-screen">
-      {loading && (
+      {loading && products.length === 0 && (
         <div className="flex justify-center items-center h-50 text-lg text-gray-600">
           Đang tải dữ liệu...
         </div>
@@ -134,7 +169,7 @@ const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
         </div>
       )}
 
-      {!loading && !error && (
+      {!error && (products.length > 0 || !loading) && (
         <>
           {/* Search and Filter */}
           <SearchFilter
@@ -144,14 +179,25 @@ const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
             categories={categories}
           />
 
-          {/* Results count */}
-          <div className="mb-4 text-sm text-gray-600">
-            Hiển thị {filteredProducts.length} trong tổng số {products.length} sản phẩm
+          {/* Results count and ordering */}
+          <div className="mb-4 flex items-center justify-between text-sm text-gray-600">
+            <span>
+              Hiển thị {products.length}{nextCursor ? '+' : ''} sản phẩm
+            </span>
+            <select
+              value={ordering}
+              onChange={(e) => setOrdering(e.target.value)}
+              className="px-3 py-1 border border-gray-300 rounded-md bg-white focus:outline-none focus:ring-2 focus:ring-blue-500"
+            >
+              {ORDERING_OPTIONS.map(option => (
+                <option key={option.value} value={option.value}>{option.label}</option>
+              ))}
+            </select>
           </div>
 
           {/* Products Grid */}
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">
-            {filteredProducts.map((product) => (
+            {products.map((product) => (
           <div key={product.id} className="bg-white rounded-lg p-4 shadow-md relative hover:shadow-lg transition-all duration-300 transform hover:-translate-y-1">
             {/* Product Image */}
             <div className="w-full h-40 rounded-lg mb-3 overflow-hidden">
@@ -221,6 +267,19 @@ const ProductListComponent: React.FC<Props> = ({ onAdd }) => {
           </div>
         ))}
           </div>
+
+          {/* Next page */}
+          {nextCursor && (
+            <div className="flex justify-center mt-6">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-6 py-2 bg-white text-blue-600 border border-blue-600 rounded-lg hover:bg-blue-50 transition-colors disabled:opacity-50"
+              >
+                {loadingMore ? 'Đang tải...' : 'Xem thêm'}
+              </button>
+            </div>
+          )}
         </>
       )}
     </div>
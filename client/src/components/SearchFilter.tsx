@@ -1,4 +1,7 @@
 import React, { useState, useEffect } from 'react';
+import { productService } from '../services/productService';
+
+const SUGGEST_DEBOUNCE_MS = 150;
 
 interface SearchFilterProps {
   onSearch: (searchTerm: string) => void;
@@ -16,11 +19,36 @@ const SearchFilter: React.FC<SearchFilterProps> = ({
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedBrand, setSelectedBrand] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('');
+  const [suggestions, setSuggestions] = useState<string[]>([]);
 
   useEffect(() => {
     onSearch(searchTerm);
   }, [searchTerm, onSearch]);
 
+  useEffect(() => {
+    // Typeahead from the server's in-memory index; stale answers are dropped
+    const prefix = searchTerm.trim();
+    if (!prefix) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const result = await productService.suggest(prefix);
+        if (!cancelled) {
+          setSuggestions([...result.brands.map(b => b.name), ...result.products.map(p => p.name)]);
+        }
+      } catch {
+        if (!cancelled) setSuggestions([]);
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm]);
+
   useEffect(() => {
     onFilter(selectedBrand, selectedCategory);
   }, [selectedBrand, selectedCategory, onFilter]);
@@ -38,8 +66,14 @@ const SearchFilter: React.FC<SearchFilterProps> = ({
             placeholder="Nhập tên sản phẩm..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
+            list="product-suggestions"
             className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent"
           />
+          <datalist id="product-suggestions">
+            {suggestions.map(suggestion => (
+              <option key={suggestion} value={suggestion} />
+            ))}
+          </datalist>
         </div>
 
         {/* Brand Filter */}
@@ -52,8 +86,14 @@ const SearchFilter: React.FC<SearchFilterProps> = ({
             placeholder="Nhập tên thương hiệu..."
             value={selectedBrand}
             onChange={(e) => setSelectedBrand(e.target.value)}
+            list="brand-options"
             className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent"
           />
+          <datalist id="brand-options">
+            {brands.map(brand => (
+              <option key={brand} value={brand} />
+            ))}
+          </datalist>
         </div>
 
         {/* Clear Filters */}
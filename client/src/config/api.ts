@@ -4,7 +4,15 @@ export const API_BASE_URL = 'http://127.0.0.1:8000';
 export const API_ENDPOINTS = {
   PRODUCTS: `${API_BASE_URL}/api/products/`,
   PRODUCT_DETAIL: (id: number) => `${API_BASE_URL}/api/products/${id}/`,
+  PRODUCTS_SEARCH: `${API_BASE_URL}/api/products/search/`,
+  PRODUCTS_FACETS: `${API_BASE_URL}/api/products/facets/`,
+  PRODUCTS_SUGGEST: `${API_BASE_URL}/api/products/suggest/`,
+  PRODUCTS_TOP: (list: string) => `${API_BASE_URL}/api/products/top/${list}/`,
+  PRODUCTS_EXPORT: (format: 'json' | 'ndjson' = 'json') => `${API_BASE_URL}/api/products/export/?format=${format}`,
   CREATE_PRODUCT: `${API_BASE_URL}/api/products/create/`,
+  BULK_CREATE_PRODUCTS: `${API_BASE_URL}/api/products/bulk/`,
+  CHATBOT_CHAT: `${API_BASE_URL}/api/chatbot/chat/`,
+  CHATBOT_STREAM: `${API_BASE_URL}/api/chatbot/chat/stream/`,
 };
 
 // API utility functions
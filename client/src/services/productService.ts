@@ -1,4 +1,6 @@
-import { Product } from '../types/Product';
+import {
+  BulkCreateResult, Product, ProductFacets, ProductFilters, ProductPage, Suggestions, TopList
+} from '../types/Product';
 import { API_ENDPOINTS, apiClient } from '../config/api';
 
 // Transform backend data to frontend format
@@ -26,18 +28,104 @@ const transformToBackendFormat = (product: Partial<Product>) => ({
   labels: product.labels
 });
 
+// Frontend filter names -> query parameters of GET /api/products/
+const FILTER_PARAMS: Record<keyof ProductFilters, string> = {
+  q: 'q',
+  brand: 'brand',
+  category: 'category',
+  label: 'label',
+  minPrice: 'min_price',
+  maxPrice: 'max_price',
+  minRating: 'min_rating',
+  minDiscount: 'min_discount',
+  ordering: 'ordering',
+  pageSize: 'page_size'
+};
+
+const buildQuery = (filters: ProductFilters, cursor?: string | null) => {
+  const params = new URLSearchParams();
+  (Object.keys(FILTER_PARAMS) as (keyof ProductFilters)[]).forEach(key => {
+    const value = filters[key];
+    if (value !== undefined && value !== null && value !== '') {
+      params.set(FILTER_PARAMS[key], String(value));
+    }
+  });
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  return params.toString();
+};
+
 export const productService = {
-  // Get all products
-  async getAllProducts(): Promise<Product[]> {
+  // Get one page of products, filtered and ordered by the server.
+  // Pass the nextCursor of the previous page to get the following one.
+  async getProducts(filters: ProductFilters = {}, cursor?: string | null): Promise<ProductPage> {
     try {
-      const data = await apiClient.get(API_ENDPOINTS.PRODUCTS);
-      return data.map(transformProduct);
+      const query = buildQuery(filters, cursor);
+      const data = await apiClient.get(query ? `${API_ENDPOINTS.PRODUCTS}?${query}` : API_ENDPOINTS.PRODUCTS);
+      return {
+        products: data.results.map(transformProduct),
+        nextCursor: data.next_cursor
+      };
     } catch (error) {
       console.error('Error fetching products:', error);
       throw error;
     }
   },
 
+  // Full-text search on names and labels, best matches first (filters.q is required).
+  // Accents can be left out; the last word also matches as a prefix.
+  async searchProducts(filters: ProductFilters, cursor?: string | null): Promise<ProductPage> {
+    try {
+      const query = buildQuery({ ...filters, ordering: undefined }, cursor);
+      const data = await apiClient.get(`${API_ENDPOINTS.PRODUCTS_SEARCH}?${query}`);
+      return {
+        products: data.results.map(transformProduct),
+        nextCursor: data.next_cursor
+      };
+    } catch (error) {
+      console.error('Error searching products:', error);
+      throw error;
+    }
+  },
+
+  // Brand, category, price and rating counts; with filters, counts of the matching products
+  async getFacets(filters: ProductFilters = {}): Promise<ProductFacets> {
+    try {
+      const query = buildQuery({ ...filters, ordering: undefined, pageSize: undefined });
+      return await apiClient.get(query ? `${API_ENDPOINTS.PRODUCTS_FACETS}?${query}` : API_ENDPOINTS.PRODUCTS_FACETS);
+    } catch (error) {
+      console.error('Error fetching facets:', error);
+      throw error;
+    }
+  },
+
+  // Typeahead: most popular product names and brands starting with prefix
+  async suggest(prefix: string, k = 8): Promise<Suggestions> {
+    try {
+      const params = new URLSearchParams({ prefix, k: String(k) });
+      const data = await apiClient.get(`${API_ENDPOINTS.PRODUCTS_SUGGEST}?${params}`);
+      return {
+        products: data.products.map((p: any) => ({ id: p.id, name: p.name, soldCount: p.sold_count })),
+        brands: data.brands.map((b: any) => ({ name: b.name, products: b.products, soldCount: b.sold_count }))
+      };
+    } catch (error) {
+      console.error('Error fetching suggestions:', error);
+      throw error;
+    }
+  },
+
+  // Get a top-N list: cheapest, most_discounted, best_rated or best_selling
+  async getTopProducts(list: TopList, n = 10): Promise<Product[]> {
+    try {
+      const data = await apiClient.get(`${API_ENDPOINTS.PRODUCTS_TOP(list)}?n=${n}`);
+      return data.results.map(transformProduct);
+    } catch (error) {
+      console.error(`Error fetching ${list} products:`, error);
+      throw error;
+    }
+  },
+
   // Get product by ID
   async getProductById(id: number): Promise<Product> {
     try {
@@ -59,5 +147,18 @@ export const productService = {
       console.error('Error creating product:', error);
       throw error;
     }
+  },
+
+  // Create many products in one request; invalid items are reported, not fatal
+  async createProducts(products: Partial<Product>[]): Promise<BulkCreateResult> {
+    try {
+      return await apiClient.post(
+        API_ENDPOINTS.BULK_CREATE_PRODUCTS,
+        products.map(transformToBackendFormat)
+      );
+    } catch (error) {
+      console.error('Error creating products:', error);
+      throw error;
+    }
   }
-}; 
\ No newline at end of file
+};
@@ -9,4 +9,52 @@ export interface Product {
   image?: string;
   labels?: string[];
 }
-  
\ No newline at end of file
+  
+export interface ProductFilters {
+  q?: string;
+  brand?: string;
+  category?: string;
+  label?: string;
+  minPrice?: number;
+  maxPrice?: number;
+  minRating?: number;
+  minDiscount?: number;
+  ordering?: string;
+  pageSize?: number;
+}
+
+export type TopList = 'cheapest' | 'most_discounted' | 'best_rated' | 'best_selling';
+
+export interface ProductPage {
+  products: Product[];
+  nextCursor: string | null;
+}
+
+export interface Suggestions {
+  products: { id: number; name: string; soldCount: number }[];
+  brands: { name: string; products: number; soldCount: number }[];
+}
+
+export interface FacetValue {
+  value: string;
+  count: number;
+}
+
+export interface FacetBucket extends FacetValue {
+  min: number;
+  max: number | null;
+}
+
+export interface ProductFacets {
+  brand: FacetValue[];
+  category: FacetValue[];
+  price: FacetBucket[];
+  rating: FacetBucket[];
+  filtered: boolean;
+}
+
+export interface BulkCreateResult {
+  created: number;
+  ids: number[];
+  errors: { index: number; error: string }[];
+}
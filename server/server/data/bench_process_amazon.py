@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chunked, vectorized process_amazon_csv vs the previous iterrows loop.
+
+A synthetic Amazon CSV with the columns of the real dump is generated
+(seeded, so runs are comparable): prices written as "44.99" or "$1,044.99",
+image lists as JSON arrays with a few malformed ones, and some rows with a
+missing or zero price. Both implementations process it; the outputs must be
+byte for byte identical. The NDJSON output of the chunked version is timed
+too and must hold the same products, one json.dumps per line. Reports
+rows/sec and peak traced memory.
+
+Usage:
+    python3 bench_process_amazon.py [--rows 200000] [--chunksize 20000]
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from process_amazon_data import (
+    REQUIRED_COLUMNS, extract_first_image, load_and_clean_data, process_amazon_csv, to_float, to_int,
+)
+
+BRANDS = ["Sony", "Amazon Basics", "VEVOR", "Owala", "Logitech", "Anker", "Ernie Ball", "Queenmore", ""]
+WORDS = ["Wireless", "Headphones", "Bluetooth", "Speaker", "Portable", "Charger", "USB-C", "Cable",
+         "Stainless", "Steel", "Water", "Bottle", "Insulated", "Dog", "Sweater", "Guitar", "Strings"]
+
+
+def write_csv(path, rows):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIRED_COLUMNS)
+        writer.writeheader()
+        for i in range(rows):
+            listed = rng.randint(100, 300000) / 100
+            sale = round(listed * rng.uniform(0.5, 1), 2)
+            images = [f"https://m.media-amazon.com/images/I/{i}{n}._AC_US40_.jpg" for n in range(rng.randint(1, 4))]
+            image_field = json.dumps(images)
+            if i % 97 == 0:
+                image_field = image_field.replace('", "', '" "')  # not valid JSON
+            row = {column: "x" for column in REQUIRED_COLUMNS}
+            row.update({
+                "name": f"{rng.choice(BRANDS)} {' '.join(rng.sample(WORDS, 5))} {i}",
+                "brandName": rng.choice(BRANDS) or " ",
+                "salePrice": f"${sale:,.2f}" if i % 3 == 0 else f"{sale:.2f}",
+                "listedPrice": "0" if i % 251 == 0 else ("" if i % 499 == 0 else f"{listed:.2f}"),
+                "rating": f"{rng.randint(10, 50) / 10}",
+                "reviewCount": str(rng.randint(0, 5000)),
+                "nodeName": "Electronics",
+                "imageUrls": image_field,
+            })
+            writer.writerow(row)
+
+
+def iterrows_loop(input_csv_path, output_json_path):
+    """process_amazon_csv as it was before the rewrite"""
+    products = []
+    df_clean = load_and_clean_data(input_csv_path)
+    for idx, row in df_clean.iterrows():
+        name = (row.get("name") or "").strip()
+        if not name:
+            continue
+        try:
+            sale_price = to_float(row.get("salePrice"))
+            listed_price = to_float(row.get("listedPrice"))
+            final_price_vnd = int(sale_price * 24000)
+            original_price_vnd = int(listed_price * 24000)
+            discount = round((1 - (final_price_vnd / original_price_vnd)) * 100)
+            rating = to_float(row.get("rating"))
+            review_count = to_int(row.get("reviewCount"), 0)
+            image_url = extract_first_image(row.get("imageUrls", ""))
+            brand = (row.get("brandName") or "").strip()
+            category = (row.get("nodeName") or "").strip()
+            labels = []
+            if brand:
+                labels.append(brand)
+            if category:
+                labels.append(category)
+            labels.extend(["amazon", "imported"])
+            products.append({
+                "name": name,
+                "price": final_price_vnd,
+                "original_price": original_price_vnd,
+                "discount": discount,
+                "rating": rating,
+                "sold_count": review_count,
+                "image": image_url,
+                "labels": labels,
+            })
+        except Exception as e:
+            print(f"Error processing product {name}: {e}")
+            continue
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump(products, f, ensure_ascii=False, indent=2)
+    return len(products)
+
+
+def measure(call):
+    """Seconds of one run, then peak traced memory of a second one (progress output is dropped)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        call()
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunksize", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "amazon_data.csv")
+        write_csv(csv_path, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(csv_path) / 1e6:.1f} MB CSV")
+
+        outputs = {}
+        for label, call, suffix in [
+            ("iterrows loop", lambda path: iterrows_loop(csv_path, path), ".json"),
+            ("chunked vectorized", lambda path: process_amazon_csv(csv_path, path, args.chunksize), ".json"),
+            ("chunked ndjson", lambda path: process_amazon_csv(csv_path, path, args.chunksize), ".ndjson"),
+        ]:
+            path = os.path.join(tmp, label.replace(" ", "_") + suffix)
+            seconds, peak = measure(lambda: call(path))
+            with open(path, "rb") as f:
+                outputs[label] = f.read()
+            print(f"RESULT {label:<20} {args.rows / seconds:>10,.0f} rows/s {seconds:>7.2f} s "
+                  f"peak {peak / 1e6:>7.1f} MB")
+
+        lines = outputs.pop("chunked ndjson").decode("utf-8").splitlines()
+        same = len(set(outputs.values())) == 1
+        print(f"Outputs identical: {same}")
+        products = json.loads(outputs["chunked vectorized"])
+        same_products = lines == [json.dumps(product, ensure_ascii=False) for product in products]
+        print(f"NDJSON holds the same products: {same_products}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import csv
 import json
 import os
+import re
 import sys
 import django
+import numpy as np
 import pandas as pd
 
 # Ensure project is on path
@@ -11,7 +13,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 django.setup()
 
+from shop.catalog_feed import FEED_SUFFIXES
 from shop.models import Product
+from update_database import import_file
 
 
 def to_int(value, default: int = 0) -> int:
@@ -54,7 +58,6 @@ def extract_first_image(image_field: str) -> str:
     cleaned = image_field.strip().strip('[]')
     
     # Use regex to find quoted URLs
-    import re
     urls = re.findall(r'"([^"]*)"', cleaned)
     
     # Filter for actual Amazon image URLs
@@ -70,107 +73,257 @@ def extract_first_image(image_field: str) -> str:
     
     return ""
 
+REQUIRED_COLUMNS = [
+    "additionalProperties","brandName","breadcrumbs","color","currency","current_depth","description",
+    "descriptionRaw","features","imageUrls","inStock","listedPrice","material","name","new_path","nodeName",
+    "rating","reviewCount","salePrice","size","style","variants","weight_rawUnit","weight_unit","weight_value"
+]
+SELECTED_COLUMNS = ["additionalProperties","brandName","breadcrumbs", "description", "descriptionRaw",
+    "features", "salePrice","listedPrice", "material", "name", "rating", "size", "style", "imageUrls"]
+
+# Rows per read_csv chunk; memory stays bounded by this, not by the file size
+CHUNK_SIZE = 20000
+USD_TO_VND = 24000
+
+NAN = float("nan")
+# "ASIN" followed by its value in additionalProperties, e.g. {"name": "ASIN", "value": "B07XJ8C8F5"}
+ASIN_PATTERN = r'\bASIN\b[^A-Z0-9]{1,40}?([A-Z0-9]{10})\b'
+# A JSON array of strings without escapes: its first element is the first image
+SIMPLE_JSON_LIST_PATTERN = r'[ \t\n\r]*\[[ \t\n\r]*"([^"\\\x00-\x1f]*)"(?:[ \t\n\r]*,[ \t\n\r]*"[^"\\\x00-\x1f]*")*[ \t\n\r]*\][ \t\n\r]*'
+
+
+def _clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.str.replace(r"[^0-9a-zA-Z_]", "_", regex=True)
+    df_clean = df.dropna(subset=[c for c in REQUIRED_COLUMNS if c in df.columns])
+    return df_clean[SELECTED_COLUMNS]
+
+
 def load_and_clean_data(csv_path: str) -> pd.DataFrame:
     """Load and clean Amazon data"""
-    df = pd.read_csv(csv_path)
-    df.columns = df.columns.str.replace(r"[^0-9a-zA-Z_]", "_", regex=True)
-    required_cols = [
-        "additionalProperties","brandName","breadcrumbs","color","currency","current_depth","description",
-        "descriptionRaw","features","imageUrls","inStock","listedPrice","material","name","new_path","nodeName",
-        "rating","reviewCount","salePrice","size","style","variants","weight_rawUnit","weight_unit","weight_value"
-    ]
-    df_clean = df.dropna(subset=[c for c in required_cols if c in df.columns])
-    df_clean = df_clean[["additionalProperties","brandName","breadcrumbs", "description", "descriptionRaw",
-        "features", "salePrice","listedPrice", "material", "name", "rating", "size", "style", "imageUrls"]
+    return _clean_columns(pd.read_csv(csv_path))
+
+
+def iter_clean_chunks(csv_path: str, chunksize: int = CHUNK_SIZE):
+    """Cleaned Amazon data, chunksize rows at a time.
+
+    All columns are read as text (numbers are parsed by to_numbers), and
+    only the columns that are checked or kept are read at all.
+    """
+    keep = set(REQUIRED_COLUMNS)
+    reader = pd.read_csv(
+        csv_path, dtype=str, chunksize=chunksize,
+        usecols=lambda column: re.sub(r"[^0-9a-zA-Z_]", "_", column) in keep,
+    )
+    for chunk in reader:
+        yield _clean_columns(chunk)
+
+
+def to_numbers(column: pd.Series) -> pd.Series:
+    """Vectorized to_float: "$1,299.00" -> 1299.0, anything unparseable -> NaN"""
+    # astype(float) parses each value with float(), like to_float does
+    try:
+        return column.astype(float)
+    except ValueError:
+        pass
+    cleaned = column.str.replace("$", "", regex=False).str.replace(",", "", regex=False)
+    try:
+        return cleaned.astype(float)
+    except ValueError:
+        return cleaned.map(lambda value: to_float(value, NAN)).astype(float)
+
+
+def first_images(column: pd.Series) -> pd.Series:
+    """Vectorized extract_first_image; values that are not a plain JSON list
+    of URLs go through extract_first_image itself"""
+    images = column.str.extract(f"^{SIMPLE_JSON_LIST_PATTERN}$", expand=False)
+    irregular = images.isna()
+    if irregular.any():
+        images[irregular] = column[irregular].map(extract_first_image)
+    return images
+
+
+def transform_chunk(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Product columns of a cleaned chunk (brand instead of the labels list)"""
+    names = df_clean["name"].str.strip()
+    df_clean = df_clean[names != ""]
+    names = names[names != ""]
+
+    final_price = to_numbers(df_clean["salePrice"]) * USD_TO_VND
+    original_price = to_numbers(df_clean["listedPrice"]) * USD_TO_VND
+    # int() truncates; a price that is missing or makes the discount a division by 0 skips the row
+    valid = np.isfinite(final_price) & np.isfinite(original_price) & (original_price.abs() >= 1)
+    for name in names[~valid]:
+        print(f"Error processing product {name}: invalid salePrice or listedPrice")
+    if not valid.all():
+        df_clean, names = df_clean[valid], names[valid]
+        final_price, original_price = final_price[valid], original_price[valid]
+    final_price = np.trunc(final_price).astype("int64")
+    original_price = np.trunc(original_price).astype("int64")
+
+    ratings = to_numbers(df_clean["rating"]).astype(object)
+    ratings[ratings.isna()] = None  # as null, where to_float gave None
+    asins = df_clean["additionalProperties"].str.extract(ASIN_PATTERN, expand=False)
+
+    # reviewCount and nodeName are dropped by the cleaning step, so sold_count
+    # is always 0 and there is no category label
+    return pd.DataFrame({
+        "name": names,
+        "price": final_price,
+        "original_price": original_price,
+        "discount": np.rint((1 - final_price / original_price) * 100).astype("int64"),
+        "rating": ratings,
+        "sold_count": 0,
+        "image": first_images(df_clean["imageUrls"]),
+        "brand": df_clean["brandName"].str.strip(),
+        # Identity of the product for incremental imports (shop/catalog_sync.py)
+        "external_id": asins.map(lambda asin: f"asin:{asin}", na_action="ignore"),
+    })
+
+
+def product_dicts(products: pd.DataFrame) -> list:
+    """Rows of transform_chunk as product dicts"""
+    products = [
+        {
+            "name": name,
+            "price": price,
+            "original_price": original_price,
+            "discount": discount,
+            "rating": rating,
+            "sold_count": sold_count,
+            "image": image,
+            "labels": [brand, "amazon", "imported"] if brand else ["amazon", "imported"],
+            "external_id": external_id,
+        }
+        for name, price, original_price, discount, rating, sold_count, image, brand, external_id in zip(
+            *(products[column].tolist() for column in products.columns)
+        )
     ]
-    return df_clean
+    for product in products:
+        if not isinstance(product["external_id"], str):  # no ASIN
+            del product["external_id"]
+    return products
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+def _json_value(value) -> str:
+    """Scalar as json.dumps(value, ensure_ascii=False) writes it"""
+    if isinstance(value, str):
+        return json.encoder.encode_basestring(value)
+    if value is None:
+        return "null"
+    return _encoder.encode(value)
+
+
+def _encoded_columns(products: pd.DataFrame) -> dict:
+    """Columns of transform_chunk as JSON text; "" for a missing brand or external_id"""
+    return {
+        "name": products["name"].map(json.encoder.encode_basestring),
+        "price": products["price"].astype(str),
+        "original_price": products["original_price"].astype(str),
+        "discount": products["discount"].astype(str),
+        "rating": products["rating"].map(_json_value),
+        "sold_count": products["sold_count"].astype(str),
+        "image": products["image"].map(json.encoder.encode_basestring),
+        "brand": products["brand"].map(lambda brand: _json_value(brand) if brand else ""),
+        # Only products with an ASIN have an external_id
+        "external_id": products["external_id"].map(_json_value, na_action="ignore").fillna(""),
+    }
+
+
+def indented_json(products: pd.DataFrame) -> pd.Series:
+    """Each row of transform_chunk as json.dump(..., indent=2) writes it inside a list.
+
+    The keys are fixed, so the text is assembled column by column from the
+    encoded values; the indenting encoder of json.dump is pure Python and
+    much slower.
+    """
+    columns = _encoded_columns(products)
+    brand_lines = ("      " + columns["brand"] + ",\n").where(columns["brand"] != "", "")
+    external_ids = (',\n    "external_id": ' + columns["external_id"]).where(columns["external_id"] != "", "")
+    return (
+        '  {\n    "name": ' + columns["name"]
+        + ',\n    "price": ' + columns["price"]
+        + ',\n    "original_price": ' + columns["original_price"]
+        + ',\n    "discount": ' + columns["discount"]
+        + ',\n    "rating": ' + columns["rating"]
+        + ',\n    "sold_count": ' + columns["sold_count"]
+        + ',\n    "image": ' + columns["image"]
+        + ',\n    "labels": [\n' + brand_lines + '      "amazon",\n      "imported"\n    ]'
+        + external_ids + '\n  }'
+    )
+
+
+def ndjson_lines(products: pd.DataFrame) -> pd.Series:
+    """Each row of transform_chunk as json.dumps(..., ensure_ascii=False) writes it"""
+    columns = _encoded_columns(products)
+    brands = (columns["brand"] + ", ").where(columns["brand"] != "", "")
+    external_ids = (', "external_id": ' + columns["external_id"]).where(columns["external_id"] != "", "")
+    return (
+        '{"name": ' + columns["name"]
+        + ', "price": ' + columns["price"]
+        + ', "original_price": ' + columns["original_price"]
+        + ', "discount": ' + columns["discount"]
+        + ', "rating": ' + columns["rating"]
+        + ', "sold_count": ' + columns["sold_count"]
+        + ', "image": ' + columns["image"]
+        + ', "labels": [' + brands + '"amazon", "imported"]'
+        + external_ids + '}'
+    )
+
 
 def process_amazon_csv(
     input_csv_path: str = os.path.join(os.path.dirname(__file__), "..", "..", "..", "chatbot", "amazon_data.csv"),
-    output_json_path: str = os.path.join(os.path.dirname(__file__), "processed_amazon_products.json"),
-) -> None:
-    """Process Amazon CSV and create processed_amazon_products.json"""
-    
-    products = []
+    output_json_path: str = os.path.join(os.path.dirname(__file__), "processed_amazon_products.ndjson"),
+    chunksize: int = CHUNK_SIZE,
+) -> int:
+    """Process Amazon CSV and create processed_amazon_products.ndjson
+
+    The CSV is read and transformed chunksize rows at a time and each chunk
+    is written out before the next is read. An .ndjson / .jsonl output gets
+    one product per line, as json.dumps(product, ensure_ascii=False) writes
+    it; any other path gets byte for byte what
+    json.dump(products, f, ensure_ascii=False, indent=2) would write.
+    """
     processed_count = 0
-    
+    sample = None
+    ndjson = output_json_path.endswith(FEED_SUFFIXES)
+
     print(f"Reading Amazon data from: {input_csv_path}")
-    
-    df_clean = load_and_clean_data(input_csv_path)
-    
-    for idx, row in df_clean.iterrows():
-        name = (row.get("name") or "").strip()
-        if not name:
-            continue
-            
-        try:
-                
-            # Price handling
-            sale_price = to_float(row.get("salePrice"))
-            listed_price = to_float(row.get("listedPrice"))
-            
-            final_price_vnd = int(sale_price * 24000)
-            original_price_vnd = int(listed_price * 24000)
-            
-            # Calculate discount
-            discount = round((1 - (final_price_vnd / original_price_vnd)) * 100)
-            
-            # Rating and reviews
-            rating = to_float(row.get("rating"))
-            review_count = to_int(row.get("reviewCount"), 0)
-            
-            # Image
-            image_url = extract_first_image(row.get("imageUrls", ""))
-            
-            # Brand and category info
-            brand = (row.get("brandName") or "").strip()
-            category = (row.get("nodeName") or "").strip()
-            
-            # Create labels
-            labels = []
-            if brand:
-                labels.append(brand)
-            if category:
-                labels.append(category)
-            labels.extend(["amazon", "imported"])
-            
-            product = {
-                "name": name,
-                "price": final_price_vnd,
-                "original_price": original_price_vnd,
-                "discount": discount,
-                "rating": rating,
-                "sold_count": review_count,  # Using review count as proxy for sold count
-                "image": image_url,
-                "labels": labels,
-            }
-            
-            products.append(product)
-            processed_count += 1
-        except Exception as e:
-            print(f"Error processing product {name}: {e}")
-            continue
-            
-            if processed_count % 100 == 0:
-                print(f"Processed {processed_count} products...")
-    
-    # Save to JSON
+
     with open(output_json_path, "w", encoding="utf-8") as f:
-        json.dump(products, f, ensure_ascii=False, indent=2)
-    
-    print(f"Successfully processed {len(products)} Amazon products")
+        if not ndjson:
+            f.write("[")
+        for df_clean in iter_clean_chunks(input_csv_path, chunksize):
+            products = transform_chunk(df_clean)
+            if products.empty:
+                continue
+            if ndjson:
+                f.write("\n".join(ndjson_lines(products)) + "\n")
+            else:
+                f.write(",\n" if processed_count else "\n")
+                f.write(",\n".join(indented_json(products)))
+            processed_count += len(products)
+            sample = sample or product_dicts(products.head(1))[0]
+            print(f"Processed {processed_count} products...")
+        if not ndjson:
+            f.write("\n]" if processed_count else "]")
+
+    print(f"Successfully processed {processed_count} Amazon products")
     print(f"Output saved to: {output_json_path}")
-    
+
     # Show sample
-    if products:
+    if sample:
         print("\nSample Amazon product:")
-        print(json.dumps(products[0], ensure_ascii=False, indent=2))
+        print(json.dumps(sample, ensure_ascii=False, indent=2))
+    return processed_count
 
 
-def update_database_with_amazon():
+def update_database_with_amazon(replace=False):
     """Update database with Amazon products"""
     
-    json_file = 'processed_amazon_products.json'
+    json_file = 'processed_amazon_products.ndjson'
     
     # Check if JSON file exists
     if not os.path.exists(json_file):
@@ -178,49 +331,8 @@ def update_database_with_amazon():
         return
     
     try:
-        # Load JSON data
-        with open(json_file, 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-        
-        print(f"Loaded {len(products_data)} Amazon products from JSON")
-        
-        # Delete existing products
-        existing_count = Product.objects.count()
-        if existing_count > 0:
-            print(f"Deleting {existing_count} existing products...")
-            Product.objects.all().delete()
-        
-        # Create new Amazon products
-        print("Creating new Amazon products...")
-        created_count = 0
-        
-        for product_data in products_data:
-            try:
-                product = Product.objects.create(
-                    name=product_data['name'],
-                    price=product_data['price'],
-                    original_price=product_data.get('original_price'),
-                    discount=product_data.get('discount'),
-                    rating=product_data.get('rating'),
-                    sold_count=product_data.get('sold_count'),
-                    image=product_data.get('image')
-                )
-                
-                # Set labels if provided
-                if 'labels' in product_data:
-                    product.set_labels_list(product_data['labels'])
-                    product.save()
-                
-                created_count += 1
-                
-                if created_count % 100 == 0:
-                    print(f"Created {created_count} products...")
-                    
-            except Exception as e:
-                print(f"Error creating product {product_data.get('name', 'Unknown')}: {e}")
-                continue
-        
-        print(f"Successfully created {created_count} Amazon products")
+        # Streamed batch by batch; an interrupted import resumes where it stopped
+        import_file(json_file, replace=replace)
         
         # Verify
         final_count = Product.objects.count()
@@ -245,4 +357,5 @@ if __name__ == "__main__":
     process_amazon_csv()
     
     print("\nUpdating database...")
-    update_database_with_amazon()
+    # --replace: delete every product and insert the feed again (new ids)
+    update_database_with_amazon(replace='--replace' in sys.argv[1:])
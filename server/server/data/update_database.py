@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import django
 import json
 
@@ -10,12 +11,102 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 django.setup()
 
+from shop.catalog_feed import FEED_SUFFIXES, Checkpoint, feed_items, import_feed
+from shop.catalog_sync import sync_catalog
+from shop.importing import replace_catalog
 from shop.models import Product
 
-def update_database():
-    """Update database with products from processed_products.json"""
-    
-    json_file = 'processed_products.json'
+
+def _print_errors(products_data, errors):
+    for error in errors:
+        product_data = products_data[error['index']]
+        name = product_data.get('name', 'Unknown') if isinstance(product_data, dict) else 'Unknown'
+        print(f"Error creating product {name}: {error['error']}")
+
+
+def import_products(products_data, replace=False):
+    """Import product dicts, printing progress and throughput.
+
+    By default the catalog is synced incrementally (shop/catalog_sync.py):
+    products keep their ids and unchanged ones are not written. With
+    replace=True every product is deleted and the feed inserted again.
+    """
+    start = time.perf_counter()
+
+    def rate(done):
+        return done / (time.perf_counter() - start)
+
+    if replace:
+        existing_count = Product.objects.count()
+        if existing_count > 0:
+            print(f"Deleting {existing_count} existing products...")
+        print("Creating new products...")
+        _, ids, errors = replace_catalog(
+            products_data, progress=lambda created: print(f"Created {created} products ({rate(created):.0f} products/s)..."),
+        )
+        _print_errors(products_data, errors)
+        elapsed = time.perf_counter() - start
+        print(f"Successfully created {len(ids)} products in {elapsed:.1f}s ({rate(len(ids)):.0f} products/s)")
+        return
+
+    print("Syncing products...")
+    summary = sync_catalog(
+        products_data, progress=lambda step, done: print(f"{step.capitalize()} {done} products..."),
+    )
+    _print_errors(products_data, summary['errors'])
+    elapsed = time.perf_counter() - start
+    print(f"Created {summary['created']}, updated {summary['updated']}, deleted {summary['deleted']}, "
+          f"unchanged {summary['unchanged']} products in {elapsed:.1f}s "
+          f"({rate(len(products_data)):.0f} products/s)")
+
+
+def import_feed_file(path, replace=False):
+    """Import an NDJSON file without loading it: synced batch by batch and
+    resumable (shop/catalog_feed.py), or streamed into replace_catalog"""
+    start = time.perf_counter()
+
+    def rate(done):
+        return done / (time.perf_counter() - start)
+
+    if replace:
+        # Products get new ids, so a checkpoint of an earlier sync no longer applies
+        Checkpoint(path).remove()
+        print("Replacing all products...")
+        _, ids, errors = replace_catalog(
+            feed_items(path), progress=lambda created: print(f"Created {created} products ({rate(created):.0f} products/s)..."),
+        )
+        for error in errors:
+            print(f"Error creating product #{error['index'] + 1}: {error['error']}")
+        print(f"Successfully created {len(ids)} products in {time.perf_counter() - start:.1f}s")
+        return
+
+    checkpoint = Checkpoint.load(path)
+    if checkpoint.index:
+        print(f"Resuming after {checkpoint.index} products...")
+    print("Syncing products...")
+    summary = import_feed(path, progress=lambda step, done: print(
+        f"{step.capitalize()} {done} products ({rate(done - checkpoint.index):.0f} products/s)..."
+        if step == 'imported' else f"{step.capitalize()} {done} products...",
+    ))
+    for error in summary['errors']:
+        print(f"Error in product #{error['index'] + 1}: {error['error']}")
+    print(f"Created {summary['created']}, updated {summary['updated']}, deleted {summary['deleted']}, "
+          f"unchanged {summary['unchanged']} products in {time.perf_counter() - start:.1f}s")
+
+
+def import_file(path, replace=False):
+    """Import a processed catalog file: NDJSON is streamed, a JSON array is loaded whole"""
+    if path.endswith(FEED_SUFFIXES):
+        import_feed_file(path, replace=replace)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        products_data = json.load(f)
+    print(f"Loaded {len(products_data)} products from JSON")
+    import_products(products_data, replace=replace)
+
+
+def update_database(json_file='processed_amazon_products.ndjson', replace=False):
+    """Update database with products from processed_amazon_products.ndjson (or another JSON / NDJSON file)"""
     
     # Check if JSON file exists
     if not os.path.exists(json_file):
@@ -23,49 +114,7 @@ def update_database():
         return
     
     try:
-        # Load JSON data
-        with open(json_file, 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-        
-        print(f"Loaded {len(products_data)} products from JSON")
-        
-        # Delete existing products
-        existing_count = Product.objects.count()
-        if existing_count > 0:
-            print(f"Deleting {existing_count} existing products...")
-            Product.objects.all().delete()
-        
-        # Create new products
-        print("Creating new products...")
-        created_count = 0
-        
-        for product_data in products_data:
-            try:
-                product = Product.objects.create(
-                    name=product_data['name'],
-                    price=product_data['price'],
-                    original_price=product_data.get('original_price'),
-                    discount=product_data.get('discount'),
-                    rating=product_data.get('rating'),
-                    sold_count=product_data.get('sold_count'),
-                    image=product_data.get('image')
-                )
-                
-                # Set labels if provided
-                if 'labels' in product_data:
-                    product.set_labels_list(product_data['labels'])
-                    product.save()
-                
-                created_count += 1
-                
-                if created_count % 100 == 0:
-                    print(f"Created {created_count} products...")
-                    
-            except Exception as e:
-                print(f"Error creating product {product_data.get('name', 'Unknown')}: {e}")
-                continue
-        
-        print(f"Successfully created {created_count} products")
+        import_file(json_file, replace=replace)
         
         # Verify
         final_count = Product.objects.count()
@@ -85,4 +134,6 @@ def update_database():
         print(f"Error updating database: {e}")
 
 if __name__ == "__main__":
-    update_database()
+    # --replace: delete every product and insert the feed again (new ids)
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    update_database(*files[:1], replace='--replace' in sys.argv[1:])
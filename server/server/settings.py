@@ -145,3 +145,51 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
 }
+
+# Chatbot server client (shop/chatbot_client.py)
+CHATBOT_CLIENT = {
+    'BASE_URL': os.getenv('CHATBOT_SERVER_URL', 'http://localhost:8001'),
+    'CONNECT_TIMEOUT': float(os.getenv('CHATBOT_CONNECT_TIMEOUT', '5')),
+    'READ_TIMEOUT': float(os.getenv('CHATBOT_READ_TIMEOUT', '300')),
+    'MAX_CONNECTIONS': 20,
+    'MAX_KEEPALIVE_CONNECTIONS': 10,
+    # Calls beyond this limit wait ACQUIRE_TIMEOUT seconds, then get a 503
+    'MAX_IN_FLIGHT': int(os.getenv('CHATBOT_MAX_IN_FLIGHT', '16')),
+    # Under ASGI: calls per worker process; each one costs a coroutine, not a thread
+    'ASYNC_MAX_IN_FLIGHT': int(os.getenv('CHATBOT_ASYNC_MAX_IN_FLIGHT', '256')),
+    'ACQUIRE_TIMEOUT': 1.0,
+    # Circuit breaker: open after N consecutive failures, retry after RESET_TIMEOUT
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+}
+
+# Product endpoint response cache (shop/catalog_cache.py). Entries are keyed
+# on the catalog version, so writes invalidate them without a purge.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'products': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'products',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+PRODUCT_CACHE = {
+    'ENABLED': os.getenv('PRODUCT_CACHE_ENABLED', '1') != '0',
+    'CACHE_ALIAS': 'products',
+    # How long a process trusts its copy of the catalog version before
+    # re-reading it (writes from other processes show up after this delay)
+    'VERSION_TTL': float(os.getenv('PRODUCT_CACHE_VERSION_TTL', '1.0')),
+    # gzip/brotli-encode cached responses for clients that accept it; off by
+    # default since a reverse proxy usually does this
+    'COMPRESS': os.getenv('PRODUCT_CACHE_COMPRESS', '0') == '1',
+    'COMPRESS_MIN_SIZE': int(os.getenv('PRODUCT_CACHE_COMPRESS_MIN_SIZE', '1024')),
+}
+
+PRODUCT_JSON = {
+    # Encode product responses with orjson when it is installed
+    'ORJSON': os.getenv('PRODUCT_JSON_ORJSON', '1') != '0',
+}
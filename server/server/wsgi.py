@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 application = get_wsgi_application()
+
+# Build the typeahead index now rather than on the first request
+from shop import suggest  # noqa: E402
+
+suggest.preload()
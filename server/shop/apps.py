@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .catalog_cache import catalog_changed
+        from .models import Product
+
+        # Any product write invalidates the cached product responses
+        post_save.connect(catalog_changed, sender=Product, dispatch_uid='shop.product_saved')
+        post_delete.connect(catalog_changed, sender=Product, dispatch_uid='shop.product_deleted')
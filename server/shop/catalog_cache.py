@@ -0,0 +1,229 @@
+"""
+Response cache for the read-only product endpoints.
+
+Responses are stored as the serialized JSON bytes, keyed on the catalog
+version and a hash of the request path + query string. Every write to the catalog
+bumps the version (a single row in the database, so all server processes
+and the import scripts share it), which makes the old entries unreachable;
+they age out of the cache on their own.
+
+Cached responses carry a strong ETag (a hash of the bytes), so clients that
+send If-None-Match get ``304 Not Modified`` without a body.
+
+With COMPRESS enabled, bodies of at least COMPRESS_MIN_SIZE bytes are sent
+gzip- or brotli-encoded (brotli only when the ``brotli`` package is
+installed) to clients that accept it. Each encoding is compressed once and
+cached next to the plain body, with its own ETag.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .models import CatalogVersion
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_SETTINGS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'products',
+    'VERSION_TTL': 1.0,
+    'COMPRESS': False,
+    'COMPRESS_MIN_SIZE': 1024,
+}
+
+# Preferred first; mtime=0 keeps the gzip bytes (and so the ETag) stable
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    COMPRESSORS = {'br': lambda body: brotli.compress(body, quality=5), **COMPRESSORS}
+
+
+def _options():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'PRODUCT_CACHE', {})}
+
+
+class CacheStats:
+    """Hit/miss counters of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.not_modified = 0
+
+    def record(self, hit, not_modified):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if not_modified:
+                self.not_modified += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+stats = CacheStats()
+
+_version = None
+_version_checked_at = 0.0
+_version_lock = threading.Lock()
+_batch = threading.local()
+
+
+def current_version():
+    """Catalog version, re-read from the database at most every VERSION_TTL seconds"""
+    global _version, _version_checked_at
+    now = time.monotonic()
+    if _version is None or now - _version_checked_at > _options()['VERSION_TTL']:
+        with _version_lock:
+            row = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+            _version = row or 0
+            _version_checked_at = now
+    return _version
+
+
+def bump_catalog_version():
+    """Invalidate every cached product response (in all processes)"""
+    global _version
+    if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    with _version_lock:
+        # Re-read on the next request instead of waiting for VERSION_TTL
+        _version = None
+
+
+def catalog_changed(**kwargs):
+    """Signal receiver: bump the version once the write is committed"""
+    if getattr(_batch, 'depth', 0):
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@contextmanager
+def catalog_change():
+    """Group many product writes (imports, bulk updates) into a single bump.
+
+    Per-row signals are ignored inside the block; the version is bumped
+    once when the outermost block exits, whether or not it succeeded.
+    """
+    depth = getattr(_batch, 'depth', 0)
+    _batch.depth = depth + 1
+    try:
+        yield
+    finally:
+        _batch.depth = depth
+        if depth == 0:
+            transaction.on_commit(bump_catalog_version)
+
+
+def _cache_key(version, request):
+    # Hashed: cursors and filters can make the URL longer than memcached's
+    # 250 character key limit
+    query = '&'.join(sorted(request.GET.urlencode().split('&')))
+    digest = hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'catalog:{version}:{digest}'
+
+
+def _make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _accepted_encoding(request):
+    """First of COMPRESSORS that the client accepts (q > 0), or None"""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip().removeprefix('q=')
+        if quality.replace('.', '', 1).isdigit() and not float(quality):
+            continue
+        accepted.add(coding.strip().lower())
+    for encoding in COMPRESSORS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def _encoded_entry(cache, key, entry, encoding):
+    """Entry of the encoded body, compressed on first use"""
+    encoded = cache.get(f'{key}:{encoding}')
+    if encoded is None:
+        body, content_type, etag = entry
+        encoded = (COMPRESSORS[encoding](body), content_type, f'{etag[:-1]}-{encoding}"')
+        cache.set(f'{key}:{encoding}', encoded)
+    return encoded
+
+
+def cached_catalog_response(view):
+    """Serve GET responses of view from the cache, with ETag / 304 support.
+
+    Only 200 responses are cached; errors always go through the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        options = _options()
+        if not options['ENABLED'] or request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        cache = caches[options['CACHE_ALIAS']]
+        key = _cache_key(current_version(), request)
+        entry = cache.get(key)
+        hit = entry is not None
+        if not hit:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            body = response.content
+            entry = (body, response['Content-Type'], _make_etag(body))
+            cache.set(key, entry)
+
+        encoding = None
+        if options['COMPRESS'] and len(entry[0]) >= options['COMPRESS_MIN_SIZE']:
+            encoding = _accepted_encoding(request)
+            if encoding:
+                entry = _encoded_entry(cache, key, entry, encoding)
+
+        body, content_type, etag = entry
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        not_modified = etag in etags or etags == ['*']
+        stats.record(hit, not_modified)
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        if options['COMPRESS']:
+            response['Vary'] = 'Accept-Encoding'
+        # Let browsers keep the body but revalidate it on every use
+        response['Cache-Control'] = 'no-cache'
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    return wrapper
@@ -0,0 +1,198 @@
+"""
+Processed catalog files as NDJSON: one product payload per line.
+
+process_amazon_data.py writes them chunk by chunk and import_feed reads them
+batch by batch, so neither side holds the catalog in memory. Each batch is
+synced (catalog_sync.plan_batch) and committed on its own; after every
+commit the byte offset reached is saved in a checkpoint next to the file,
+and an import that crashed or was interrupted resumes from there. Once the
+whole file is in, the products it did not name are deleted and the
+checkpoint is removed.
+
+Every batch finds its products through the external_id index, so memory
+does not grow with the catalog either: products stored without an
+external_id get their name key (catalog_sync.assign_name_keys) before the
+first batch.
+
+A checkpoint is <file>.checkpoint (JSON) plus <file>.checkpoint.ids, the ids
+of the products the import has claimed so far. It only applies to the file
+it was written for: if the file's size or mtime changed, the import starts
+over.
+"""
+
+import json
+import os
+from array import array
+
+from django.db import transaction
+
+from .catalog_cache import catalog_change
+from .catalog_sync import apply_plan, assign_name_keys, plan_batch, updated_count
+from .importing import BULK_CHUNK_SIZE, ProductDataError
+from .models import Product
+
+FEED_BATCH_SIZE = 2000
+FEED_SUFFIXES = ('.ndjson', '.jsonl')
+
+
+def read_feed(path, offset=0):
+    """Yield (offset after the line, payload) for each non-empty line from offset.
+
+    A line that is not valid JSON yields a ProductDataError instead.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield offset, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield offset, ProductDataError(f"invalid JSON: {e}")
+
+
+def feed_items(path):
+    """Payloads of an NDJSON file, for importers that take an iterable"""
+    return (item for _, item in read_feed(path))
+
+
+class IdSet:
+    """Product ids as a bitmap: an eighth of a byte per id up to the largest"""
+
+    def __init__(self, ids=()):
+        self.bits = bytearray()
+        self.update(ids)
+
+    def update(self, ids):
+        for product_id in ids:
+            byte = product_id >> 3
+            if byte >= len(self.bits):
+                self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+            self.bits[byte] |= 1 << (product_id & 7)
+
+    def __contains__(self, product_id):
+        byte = product_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (product_id & 7)))
+
+
+class Checkpoint:
+    """Progress of the import of one feed file"""
+
+    def __init__(self, path):
+        self.path = path + '.checkpoint'
+        self.ids_path = self.path + '.ids'
+        stat = os.stat(path)
+        self.feed = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self.offset = 0
+        self.index = 0
+        self.ids = 0
+        self.summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+
+    @classmethod
+    def load(cls, path):
+        """The saved checkpoint of path, or a fresh one if there is none for this file"""
+        checkpoint = cls(path)
+        try:
+            with open(checkpoint.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return checkpoint
+        if state.get('feed') == checkpoint.feed:
+            checkpoint.offset = state['offset']
+            checkpoint.index = state['index']
+            checkpoint.ids = state['ids']
+            checkpoint.summary = state['summary']
+        return checkpoint
+
+    def claimed_ids(self):
+        """Ids saved with the checkpoint; ids appended after its last save are dropped"""
+        ids = array('q')
+        if self.ids:
+            with open(self.ids_path, 'rb') as f:
+                ids.fromfile(f, self.ids)
+        with open(self.ids_path, 'ab') as f:
+            f.truncate(self.ids * ids.itemsize)
+        return ids
+
+    def save(self, offset, index, ids):
+        """Record a committed batch: ids first, then the state that counts them"""
+        with open(self.ids_path, 'ab') as f:
+            array('q', ids).tofile(f)
+        self.offset, self.index, self.ids = offset, index, self.ids + len(ids)
+        state = {'feed': self.feed, 'offset': self.offset, 'index': self.index,
+                 'ids': self.ids, 'summary': self.summary}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def remove(self):
+        for path in (self.path, self.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _batches(path, offset, batch_size):
+    """Lists of payloads from offset, with the offset after each list"""
+    batch = []
+    for offset, item in read_feed(path, offset):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch, offset
+            batch = []
+    if batch:
+        yield batch, offset
+
+
+def _delete_unclaimed(seen, chunk_size):
+    """Delete every product whose id is not in seen; returns how many"""
+    ids = [product_id for product_id in Product.objects.values_list('id', flat=True).iterator(chunk_size=5000)
+           if product_id not in seen]
+    if ids:
+        with catalog_change(), transaction.atomic():
+            for start in range(0, len(ids), chunk_size):
+                Product.objects.filter(id__in=ids[start:start + chunk_size]).delete()
+    return len(ids)
+
+
+def import_feed(path, batch_size=FEED_BATCH_SIZE, chunk_size=BULK_CHUNK_SIZE, progress=None, resume=True):
+    """Sync the catalog with an NDJSON file, batch_size lines per transaction.
+
+    With resume (the default) an interrupted import of the same file carries
+    on from its checkpoint. progress, if given, is called as
+    progress(step, done) with step 'imported' (items read so far) after
+    every batch and 'deleted' at the end.
+
+    Returns the summary of catalog_sync.sync_catalog plus 'resumed', the
+    number of items that had been imported before this run.
+    """
+    checkpoint = Checkpoint.load(path) if resume else Checkpoint(path)
+    if not checkpoint.index:
+        checkpoint.remove()
+    resumed = checkpoint.index
+    summary = checkpoint.summary
+    seen = IdSet(checkpoint.claimed_ids())
+    assign_name_keys(chunk_size)
+
+    for batch, offset in _batches(path, checkpoint.offset, batch_size):
+        plan = plan_batch(batch, checkpoint.index, seen)
+        created = []
+        if plan.has_changes:
+            with catalog_change(), transaction.atomic():
+                created = apply_plan(plan, chunk_size)
+        summary['created'] += len(created)
+        summary['updated'] += updated_count(plan)
+        summary['unchanged'] += plan.unchanged
+        summary['errors'].extend(plan.errors)
+        ids = plan.matched + created
+        seen.update(ids)
+        checkpoint.save(offset, checkpoint.index + len(batch), ids)
+        if progress:
+            progress('imported', checkpoint.index)
+
+    summary['deleted'] = _delete_unclaimed(seen, chunk_size)
+    if progress and summary['deleted']:
+        progress('deleted', summary['deleted'])
+    checkpoint.remove()
+    return {**summary, 'resumed': resumed}
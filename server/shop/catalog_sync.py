@@ -0,0 +1,298 @@
+"""
+Incremental catalog sync: apply an import feed as a diff.
+
+Every feed item is matched to an existing product by its identity: the
+payload's external_id (process_amazon_data writes "asin:<ASIN>"), or else
+a hash of its normalized name and brand (first label). Products stored
+before they had that identity, or under the name hash, are matched on the
+name hash as a fallback and get the feed's external_id.
+
+Matched products that differ are updated in place, so their ids (and the
+carts that refer to them) survive an import; new items are inserted and
+products missing from the feed are deleted. Unchanged products are not
+written at all; when nothing changed there is no transaction and the
+catalog version is not bumped.
+
+sync_catalog diffs a whole feed at once. plan_batch diffs one batch of a
+streamed feed against the rows it names, for catalog_feed.import_feed.
+"""
+
+import hashlib
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .catalog_cache import catalog_change
+from .importing import BULK_CHUNK_SIZE, ProductDataError, _insert_chunk, product_from_data
+from .models import Product, ProductLabel, normalize_label, store_labels
+
+# Compared and written on update; labels are compared separately
+SYNC_FIELDS = ('name', 'price', 'original_price', 'discount', 'rating', 'sold_count', 'image', 'external_id')
+NAME_KEY_PREFIX = 'nb:'
+
+
+def name_key(name, labels):
+    """Identity of a product without an external id: hash of name and brand"""
+    brand = labels[0] if labels else ''
+    digest = hashlib.sha1(f'{normalize_label(name)}\x1f{normalize_label(brand)}'.encode()).hexdigest()
+    return NAME_KEY_PREFIX + digest[:32]
+
+
+class SyncPlan:
+    """Rows to insert, update, relabel and delete to make the catalog match a feed"""
+
+    def __init__(self):
+        self.inserts = []
+        # Changed fields -> products; only those columns are written (and only
+        # the triggers on them fire)
+        self.updates = defaultdict(list)
+        self.relabels = []
+        self.deletes = []
+        self.unchanged = 0
+        self.errors = []
+        self.indexes = {}
+        # Ids of the existing products the feed matched
+        self.matched = []
+
+    @property
+    def has_changes(self):
+        return bool(self.inserts or self.updates or self.relabels or self.deletes)
+
+
+def _existing_products(queryset=None):
+    """id -> (values of SYNC_FIELDS, label names) of every product (in queryset)"""
+    labels_query = ProductLabel.objects.all()
+    if queryset is None:
+        queryset = Product.objects.all()
+    else:
+        labels_query = labels_query.filter(product__in=queryset.values('id'))
+    labels = defaultdict(list)
+    for product_id, label in (labels_query.order_by('product_id', 'position')
+                              .values_list('product_id', 'label__name').iterator(chunk_size=5000)):
+        labels[product_id].append(label)
+    return {
+        row[0]: (row[1:], tuple(labels.get(row[0], ())))
+        for row in queryset.values_list('id', *SYNC_FIELDS).iterator(chunk_size=5000)
+    }
+
+
+def _feed_products(items, plan, start=0):
+    """external_id -> validated product of items; numbered from start.
+
+    Invalid and duplicate items are recorded in plan.errors. Readers of
+    streamed bodies pass parse errors through as exceptions.
+    """
+    feed = {}
+    for index, data in enumerate(items, start):
+        if isinstance(data, Exception):
+            plan.errors.append({'index': index, 'error': str(data)})
+            continue
+        try:
+            product = product_from_data(data)
+        except ProductDataError as e:
+            plan.errors.append({'index': index, 'error': str(e)})
+            continue
+        if product.external_id is None:
+            product.external_id = name_key(product.name, product._label_names)
+        if product.external_id in feed:
+            plan.errors.append({'index': index, 'error': f"duplicate of item {plan.indexes[product.external_id]} "
+                                                         f"({product.external_id})"})
+            continue
+        feed[product.external_id] = product
+        plan.indexes[product.external_id] = index
+    return feed
+
+
+def _diff(plan, feed, matches, existing):
+    """Sort the feed into inserts, updates, relabels and unchanged products"""
+    for external_id, product in feed.items():
+        product_id = matches.get(external_id)
+        if product_id is None:
+            plan.inserts.append(product)
+            continue
+        plan.matched.append(product_id)
+        values, labels = existing[product_id]
+        product.pk = product_id
+        product._state.adding = False
+        changed = False
+        fields = tuple(field for field, value in zip(SYNC_FIELDS, values) if getattr(product, field) != value)
+        if fields:
+            plan.updates[fields].append(product)
+            changed = True
+        if tuple(product._label_names) != labels:
+            plan.relabels.append(product)
+            changed = True
+        if not changed:
+            plan.unchanged += 1
+
+
+def plan_sync(items):
+    """Diff an iterable of product payloads against the catalog"""
+    plan = SyncPlan()
+    feed = _feed_products(items, plan)
+
+    existing = _existing_products()
+    external_field = SYNC_FIELDS.index('external_id')
+    by_external_id = {values[external_field]: product_id for product_id, (values, _) in existing.items()
+                      if values[external_field]}
+    matches = {}
+    for external_id, product in feed.items():
+        if external_id in by_external_id:
+            matches[external_id] = by_external_id.pop(external_id)
+
+    # Fallback on the name hash, for rows that are not claimed by an exact match
+    claimed = set(matches.values())
+    by_name_key = {}
+    for product_id, (values, labels) in existing.items():
+        current = values[external_field]
+        if product_id not in claimed and (current is None or current.startswith(NAME_KEY_PREFIX)):
+            by_name_key.setdefault(name_key(values[0], labels), product_id)
+    for external_id, product in feed.items():
+        if external_id not in matches:
+            product_id = by_name_key.pop(name_key(product.name, product._label_names), None)
+            if product_id is not None:
+                matches[external_id] = product_id
+                claimed.add(product_id)
+
+    _diff(plan, feed, matches, existing)
+    plan.deletes = sorted(existing.keys() - claimed)
+    return plan
+
+
+def assign_name_keys(chunk_size=BULK_CHUNK_SIZE):
+    """Store the name key of every product without an external_id, chunk by chunk.
+
+    plan_batch can then find those products through the external_id index
+    instead of hashing the whole catalog up front. A product whose key is
+    already taken (same name and brand as another) keeps none, as plan_sync
+    would only match the first of them. Returns how many products got a key.
+    """
+    keyed, last_id = 0, 0
+    while True:
+        ids = list(Product.objects.filter(external_id__isnull=True, id__gt=last_id)
+                   .order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return keyed
+        last_id = ids[-1]
+        keys = {product_id: name_key(values[0], labels)
+                for product_id, (values, labels) in _existing_products(Product.objects.filter(id__in=ids)).items()}
+        taken = set(Product.objects.filter(external_id__in=set(keys.values())).values_list('external_id', flat=True))
+        rows = []
+        for product_id in ids:
+            if keys[product_id] not in taken:
+                taken.add(keys[product_id])
+                rows.append((keys[product_id], product_id))
+        # One prepared statement per chunk; bulk_update would build a CASE per
+        # row. external_id is not served by the API, so cached responses stay valid.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f'UPDATE {Product._meta.db_table} SET external_id = %s WHERE id = %s', rows)
+        keyed += len(rows)
+
+
+def plan_batch(items, start, seen):
+    """plan_sync for one batch of a streamed feed, without deletes.
+
+    Only the rows the batch names are read, through the external_id index:
+    run assign_name_keys first so that products stored without an
+    external_id have one. Items are numbered from start. seen holds the ids
+    already claimed by earlier batches: an item matching one of those is a
+    duplicate. Across batches items are matched in feed order rather than
+    exact matches first.
+    """
+    plan = SyncPlan()
+    feed = _feed_products(items, plan, start)
+
+    matches = {}
+    for product_id, external_id in Product.objects.filter(external_id__in=list(feed)).values_list('id', 'external_id'):
+        if product_id in seen:
+            index = plan.indexes[external_id]
+            plan.errors.append({'index': index, 'error': f"duplicate of an earlier item ({external_id})"})
+            del feed[external_id]
+        else:
+            matches[external_id] = product_id
+
+    # Fallback on the name hash for items with their own external_id, e.g.
+    # a product stored under its name key before it had an ASIN
+    fallback_keys = {name_key(product.name, product._label_names): external_id
+                     for external_id, product in feed.items()
+                     if external_id not in matches and not external_id.startswith(NAME_KEY_PREFIX)}
+    claimed = set(matches.values())
+    for product_id, key in Product.objects.filter(external_id__in=list(fallback_keys)).values_list('id', 'external_id'):
+        if product_id not in seen and product_id not in claimed:
+            matches[fallback_keys[key]] = product_id
+            claimed.add(product_id)
+
+    _diff(plan, feed, matches, _existing_products(Product.objects.filter(id__in=claimed)))
+    return plan
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def apply_plan(plan, chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """Write a plan in the current transaction; returns the ids of the created products.
+
+    progress, if given, is called as progress(step, done) with step
+    'deleted', 'updated', 'relabeled' or 'created' after every chunk.
+    Insert failures are added to plan.errors.
+    """
+    def report(step, done):
+        if progress:
+            progress(step, done)
+
+    done = 0
+    for chunk in _chunks(plan.deletes, chunk_size):
+        Product.objects.filter(id__in=chunk).delete()
+        done += len(chunk)
+        report('deleted', done)
+
+    done = 0
+    for fields, products in plan.updates.items():
+        for chunk in _chunks(products, chunk_size):
+            Product.objects.bulk_update(chunk, fields)
+            done += len(chunk)
+            report('updated', done)
+
+    done = 0
+    for chunk in _chunks(plan.relabels, chunk_size):
+        ProductLabel.objects.filter(product_id__in=[product.pk for product in chunk]).delete()
+        for product in chunk:
+            product._pending_labels = product._label_names
+        store_labels(chunk)
+        done += len(chunk)
+        report('relabeled', done)
+
+    ids = []
+    for chunk in _chunks(plan.inserts, chunk_size):
+        created, failures = _insert_chunk(chunk)
+        ids.extend(product.pk for product in created)
+        plan.errors.extend({'index': plan.indexes[chunk[position].external_id], 'error': message}
+                           for position, message in failures)
+        report('created', len(ids))
+    return ids
+
+
+def updated_count(plan):
+    """Products updated by a plan; a product whose labels changed but nothing else counts too"""
+    return len({product.pk for products in [*plan.updates.values(), plan.relabels] for product in products})
+
+
+def sync_catalog(items, chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """Make the catalog match items (product payloads), touching only what differs.
+
+    All writes share one transaction. progress is passed to apply_plan.
+
+    Returns {'created', 'updated', 'deleted', 'unchanged': counts,
+    'errors': [{'index': i, 'error': message}]}.
+    """
+    plan = plan_sync(items)
+    summary = {'created': 0, 'updated': updated_count(plan), 'deleted': len(plan.deletes),
+               'unchanged': plan.unchanged, 'errors': plan.errors}
+    if not plan.has_changes:
+        return summary
+
+    with catalog_change(), transaction.atomic():
+        summary['created'] = len(apply_plan(plan, chunk_size, progress))
+    return summary
@@ -0,0 +1,443 @@
+"""
+Pooled HTTP client for the chatbot server (chatbot/simple_chatbot_server.py).
+
+Django used to spawn ``call_chatbot_server.py`` for every chat message. This
+module keeps one keep-alive connection pool per Django process instead, caps
+the number of in-flight calls and trips a circuit breaker when the chatbot
+server keeps failing, so a dead server costs a fast error instead of a
+blocked worker.
+
+ChatbotClient serves the sync (WSGI) views. Under ASGI the chatbot views use
+AsyncChatbotClient, one per event loop: a waiting chat costs a coroutine
+instead of a worker thread, and a cancelled view (browser gone) closes the
+upstream request so the chatbot server stops working on it.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+
+DEFAULT_SETTINGS = {
+    'BASE_URL': 'http://localhost:8001',
+    'CONNECT_TIMEOUT': 5.0,
+    'READ_TIMEOUT': 300.0,
+    'MAX_CONNECTIONS': 20,
+    'MAX_KEEPALIVE_CONNECTIONS': 10,
+    'MAX_IN_FLIGHT': 16,
+    'ACQUIRE_TIMEOUT': 1.0,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+    # AsyncChatbotClient: calls (and pooled connections) per event loop
+    'ASYNC_MAX_IN_FLIGHT': 256,
+}
+
+SERVER_DOWN_MESSAGE = "❌ Chatbot server chưa chạy. Vui lòng chạy: python3 simple_chatbot_server.py"
+TIMEOUT_MESSAGE = "⏱️ Chatbot timeout"
+BUSY_MESSAGE = "⏳ Chatbot đang bận. Vui lòng thử lại sau."
+
+
+class ChatbotError(Exception):
+    """Chatbot server call failed; ``user_message`` is safe to show in the UI"""
+
+    def __init__(self, user_message, details=''):
+        super().__init__(details or user_message)
+        self.user_message = user_message
+        self.details = details
+
+
+class ChatbotUnavailable(ChatbotError):
+    """Call rejected locally (circuit open or too many in-flight calls)"""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down.
+
+    While half-open a single trial call is let through; its outcome closes
+    or re-opens the circuit. A call that ends without an outcome (cancelled,
+    or a stream closed early) must call record_cancelled, or no further
+    trial would ever be let through.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """The call ended without telling whether the server works; let another trial through"""
+        with self._lock:
+            self._trial_running = False
+
+
+class _StreamRelay:
+    """Iterator over a streamed response that always frees its in-flight slot.
+
+    A plain generator would not run its ``finally`` when closed before the
+    first ``next()``, e.g. when the browser disconnects before the first chunk.
+    """
+
+    def __init__(self, client, response):
+        self._client = client
+        self._response = response
+        self._closed = False
+        self._recorded = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._response.iter_raw():
+                yield chunk
+            self._recorded = True
+            self._client.breaker.record_success()
+        except httpx.HTTPError as e:
+            self._recorded = True
+            self._client.breaker.record_failure()
+            error = self._client._translate(e)
+            payload = json.dumps({'error': error.user_message}, ensure_ascii=False)
+            yield f"event: error\ndata: {payload}\n\n".encode('utf-8')
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            self._client._slots.release()
+            if not self._recorded:
+                # Closed before the end of the stream (browser gone)
+                self._client.breaker.record_cancelled()
+
+
+class ChatbotClient:
+    """Thread-safe client shared by every request of the Django process"""
+
+    def __init__(self, base_url, connect_timeout, read_timeout, max_connections,
+                 max_keepalive_connections, max_in_flight, acquire_timeout,
+                 failure_threshold, reset_timeout):
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._http = httpx.Client(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    def chat(self, message, mode=None, conversation_id=None):
+        """Send one message to ``/chat`` and return the response text.
+
+        mode selects the agent mode on the chatbot server ("single_hop" or
+        "answer"); None keeps the server default. conversation_id keys the
+        server-side session that follow-ups like "món này" refer to.
+        """
+        self._acquire()
+        try:
+            response = self._http.post('/chat', json=self._payload(message, mode, conversation_id))
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise self._translate(e)
+        except BaseException:
+            self.breaker.record_cancelled()
+            raise
+        finally:
+            self._slots.release()
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code != 200:
+            raise ChatbotError(f"Error: {response.status_code}", response.text[:500])
+        return response.json().get('response', 'No response')
+
+    def stream(self, message, mode=None, conversation_id=None):
+        """Open ``/chat/stream`` and return an iterator over raw SSE bytes.
+
+        Connection and status errors are raised here, before the first byte,
+        so the view can still answer with a JSON error. The in-flight slot is
+        held until the returned iterator is exhausted or closed.
+        """
+        self._acquire()
+        try:
+            request = self._http.build_request('POST', '/chat/stream', json=self._payload(message, mode, conversation_id))
+            response = self._http.send(request, stream=True)
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            self._slots.release()
+            raise self._translate(e)
+        except BaseException:
+            self.breaker.record_cancelled()
+            self._slots.release()
+            raise
+
+        if response.status_code != 200:
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            details = response.read().decode('utf-8', 'replace')[:500]
+            response.close()
+            self._slots.release()
+            raise ChatbotError(f"Error: {response.status_code}", details)
+
+        return self._relay(response)
+
+    @staticmethod
+    def _payload(message, mode, conversation_id):
+        payload = {'message': message}
+        if mode:
+            payload['mode'] = mode
+        if conversation_id:
+            payload['conversation_id'] = str(conversation_id)[:128]
+        return payload
+
+    def _relay(self, response):
+        return _StreamRelay(self, response)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ChatbotUnavailable(BUSY_MESSAGE, 'too many in-flight chatbot calls')
+        if not self.breaker.allow():
+            self._slots.release()
+            raise ChatbotUnavailable(BUSY_MESSAGE, 'circuit open')
+
+    @staticmethod
+    def _translate(error):
+        if isinstance(error, httpx.ConnectError):
+            return ChatbotError(SERVER_DOWN_MESSAGE, str(error))
+        if isinstance(error, httpx.TimeoutException):
+            return ChatbotError(TIMEOUT_MESSAGE, str(error))
+        return ChatbotError(f"❌ Error: {error}", str(error))
+
+    def close(self):
+        self._http.close()
+
+
+class _AsyncStreamRelay:
+    """Async iterator over a streamed response that always frees its in-flight slot.
+
+    Django cancels the view task when the browser disconnects; the
+    cancellation lands in ``__aiter__`` and closes the upstream response.
+    ``close`` covers a response closed before iteration started.
+    """
+
+    def __init__(self, client, response):
+        self._client = client
+        self._response = response
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+        self._recorded = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._response.aiter_raw():
+                yield chunk
+            self._recorded = True
+            self._client.breaker.record_success()
+        except httpx.HTTPError as e:
+            self._recorded = True
+            self._client.breaker.record_failure()
+            error = self._client._translate(e)
+            payload = json.dumps({'error': error.user_message}, ensure_ascii=False)
+            yield f"event: error\ndata: {payload}\n\n".encode('utf-8')
+        finally:
+            if not self._closed:
+                self._release()
+                await self._response.aclose()
+
+    def close(self):
+        # Django calls this from a worker thread once the response is done
+        self._loop.call_soon_threadsafe(self._close_in_loop)
+
+    def _close_in_loop(self):
+        if not self._closed:
+            self._release()
+            self._loop.create_task(self._response.aclose())
+
+    def _release(self):
+        self._closed = True
+        self._client._slots.release()
+        if not self._recorded:
+            # Cancelled or closed before the end of the stream
+            self._client.breaker.record_cancelled()
+
+
+class AsyncChatbotClient:
+    """Client shared by the coroutines of one event loop"""
+
+    def __init__(self, base_url, connect_timeout, read_timeout, max_in_flight,
+                 acquire_timeout, failure_threshold, reset_timeout):
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # Every in-flight call (an SSE stream can last minutes) holds a connection
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+
+    async def chat(self, message, mode=None, conversation_id=None):
+        """Async ChatbotClient.chat; cancelling the caller aborts the upstream call"""
+        await self._acquire()
+        try:
+            response = await self._http.post('/chat', json=ChatbotClient._payload(message, mode, conversation_id))
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise self._translate(e)
+        except BaseException:
+            # CancelledError: the browser went away mid-call
+            self.breaker.record_cancelled()
+            raise
+        finally:
+            self._slots.release()
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code != 200:
+            raise ChatbotError(f"Error: {response.status_code}", response.text[:500])
+        return response.json().get('response', 'No response')
+
+    async def stream(self, message, mode=None, conversation_id=None):
+        """Async ChatbotClient.stream; returns an async iterator over raw SSE bytes"""
+        await self._acquire()
+        try:
+            request = self._http.build_request(
+                'POST', '/chat/stream', json=ChatbotClient._payload(message, mode, conversation_id)
+            )
+            response = await self._http.send(request, stream=True)
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            self._slots.release()
+            raise self._translate(e)
+        except BaseException:
+            self.breaker.record_cancelled()
+            self._slots.release()
+            raise
+
+        if response.status_code != 200:
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            try:
+                details = (await response.aread()).decode('utf-8', 'replace')[:500]
+            finally:
+                await response.aclose()
+                self._slots.release()
+            raise ChatbotError(f"Error: {response.status_code}", details)
+
+        return _AsyncStreamRelay(self, response)
+
+    async def _acquire(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise ChatbotUnavailable(BUSY_MESSAGE, 'too many in-flight chatbot calls')
+        if not self.breaker.allow():
+            self._slots.release()
+            raise ChatbotUnavailable(BUSY_MESSAGE, 'circuit open')
+
+    @staticmethod
+    def _translate(error):
+        return ChatbotClient._translate(error)
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+def _options():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'CHATBOT_CLIENT', {})}
+
+
+_client = None
+_client_lock = threading.Lock()
+# event loop -> AsyncChatbotClient; an ASGI server runs one loop per worker process
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_chatbot_client():
+    """Return the process-wide client, building it from settings.CHATBOT_CLIENT"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = _options()
+                _client = ChatbotClient(
+                    base_url=options['BASE_URL'],
+                    connect_timeout=options['CONNECT_TIMEOUT'],
+                    read_timeout=options['READ_TIMEOUT'],
+                    max_connections=options['MAX_CONNECTIONS'],
+                    max_keepalive_connections=options['MAX_KEEPALIVE_CONNECTIONS'],
+                    max_in_flight=options['MAX_IN_FLIGHT'],
+                    acquire_timeout=options['ACQUIRE_TIMEOUT'],
+                    failure_threshold=options['FAILURE_THRESHOLD'],
+                    reset_timeout=options['RESET_TIMEOUT'],
+                )
+    return _client
+
+
+def get_async_chatbot_client():
+    """Return the client of the running event loop (call from a coroutine)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        options = _options()
+        client = _async_clients[loop] = AsyncChatbotClient(
+            base_url=options['BASE_URL'],
+            connect_timeout=options['CONNECT_TIMEOUT'],
+            read_timeout=options['READ_TIMEOUT'],
+            max_in_flight=options['ASYNC_MAX_IN_FLIGHT'],
+            acquire_timeout=options['ACQUIRE_TIMEOUT'],
+            failure_threshold=options['FAILURE_THRESHOLD'],
+            reset_timeout=options['RESET_TIMEOUT'],
+        )
+    return client
@@ -0,0 +1,113 @@
+"""
+Facet counts for the filter panel: brands, categories, price and rating buckets.
+
+For the whole catalog the counts come from the FacetCount table, which
+database triggers keep up to date on every product and label write
+(migration 0007), so reading them costs one indexed query per facet however
+large the catalog is. When list filters are given, the counts of the
+matching products are aggregated on the fly instead.
+
+The bucket bounds below are baked into the triggers of migration 0007;
+changing them needs a migration that recreates the triggers and recounts.
+"""
+
+from django.db import connection
+from django.db.models import Case, CharField, Count, Value, When
+
+from .listing import ListingError, _number, filter_products
+from .models import FacetCount, Product, ProductLabel
+
+# Lower bounds; a bucket runs up to the next bound (exclusive), the last one is open
+PRICE_BUCKETS = (0, 200000, 500000, 1000000, 2000000, 5000000, 10000000)
+RATING_BUCKETS = (0, 1, 2, 3, 4, 4.5)
+
+# Label position of the label facets
+LABEL_FACETS = {'brand': 0, 'category': 1}
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def _format(bound):
+    return str(int(bound)) if float(bound).is_integer() else str(bound)
+
+
+def bucket_values(bounds):
+    """(value, min, max) of each bucket: '200000-500000', '10000000+'"""
+    buckets = []
+    for low, high in zip(bounds, bounds[1:] + (None,)):
+        value = f'{_format(low)}-{_format(high)}' if high is not None else f'{_format(low)}+'
+        buckets.append((value, low, high))
+    return buckets
+
+
+def _bucket_case(field, bounds):
+    """CASE putting field into its bucket, like the triggers do (the first
+    bucket also takes values below its lower bound)"""
+    buckets = bucket_values(bounds)
+    whens = [When(**{f'{field}__lt': high}, then=Value(value)) for value, _, high in buckets[:-1]]
+    return Case(*whens, default=Value(buckets[-1][0]), output_field=CharField())
+
+
+def _stored_counts(facet, limit=None):
+    counts = FacetCount.objects.filter(facet=facet, count__gt=0).order_by('-count', 'value')
+    if limit is not None:
+        counts = counts[:limit]
+    return dict(counts.values_list('value', 'count'))
+
+
+def _live_label_counts(products, position, limit):
+    rows = (
+        ProductLabel.objects.filter(product__in=products, position=position)
+        .values('label__name').annotate(count=Count('id')).order_by('-count', 'label__name')[:limit]
+    )
+    return {row['label__name']: row['count'] for row in rows}
+
+
+def _live_bucket_counts(products, field, bounds):
+    rows = (
+        products.filter(**{f'{field}__isnull': False})
+        .annotate(bucket=_bucket_case(field, bounds))
+        .values('bucket').annotate(count=Count('id')).order_by()
+    )
+    return {row['bucket']: row['count'] for row in rows}
+
+
+def _buckets(bounds, counts):
+    return [
+        {'value': value, 'min': low, 'max': high, 'count': counts.get(value, 0)}
+        for value, low, high in bucket_values(bounds)
+    ]
+
+
+def product_facets(params):
+    """Counts per brand, category, price bucket and rating bucket.
+
+    Without list filters in params the precomputed counts are returned;
+    with them, the counts of the matching products. 'limit' caps the number
+    of brands and categories (largest first).
+    """
+    limit = _number(params, 'limit', int) or DEFAULT_LIMIT
+    if limit < 1:
+        raise ListingError("'limit' must be positive")
+    limit = min(limit, MAX_LIMIT)
+
+    products = filter_products(Product.objects.all(), params)
+    if not products.query.where and connection.vendor == 'sqlite':
+        labels = {facet: _stored_counts(facet, limit) for facet in LABEL_FACETS}
+        price = _stored_counts('price')
+        rating = _stored_counts('rating')
+        filtered = False
+    else:
+        labels = {facet: _live_label_counts(products, position, limit)
+                  for facet, position in LABEL_FACETS.items()}
+        price = _live_bucket_counts(products, 'price', PRICE_BUCKETS)
+        rating = _live_bucket_counts(products, 'rating', RATING_BUCKETS)
+        filtered = bool(products.query.where)
+
+    result = {facet: [{'value': value, 'count': count} for value, count in counts.items()]
+              for facet, counts in labels.items()}
+    result['price'] = _buckets(PRICE_BUCKETS, price)
+    result['rating'] = _buckets(RATING_BUCKETS, rating)
+    result['filtered'] = filtered
+    return result
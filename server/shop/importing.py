@@ -0,0 +1,172 @@
+"""
+Turning product payloads (API bodies, import JSON) into Product rows.
+
+product_from_data validates one payload and returns an unsaved Product with
+its labels already set; they are written together with the product.
+bulk_create_products inserts many of them in chunked bulk_create calls and
+reports the payloads it had to reject instead of failing the whole batch.
+replace_catalog swaps the whole catalog for an import in one transaction.
+"""
+
+from django.db import DatabaseError, transaction
+
+from .catalog_cache import catalog_change
+from .models import Label, Product, store_labels
+
+BULK_CHUNK_SIZE = 500
+
+INTEGER_FIELDS = ('price', 'original_price', 'discount', 'sold_count')
+
+
+class ProductDataError(ValueError):
+    """A product payload that cannot be stored"""
+
+
+def _integer(data, field):
+    value = data.get(field)
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ProductDataError(f"'{field}' must be an integer")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ProductDataError(f"'{field}' must be an integer")
+    if number != int(number):
+        raise ProductDataError(f"'{field}' must be an integer")
+    return int(number)
+
+
+def product_from_data(data):
+    """Validated, unsaved Product for one payload dict"""
+    if not isinstance(data, dict):
+        raise ProductDataError("product must be a JSON object")
+
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ProductDataError("'name' is required")
+    if len(name) > Product._meta.get_field('name').max_length:
+        raise ProductDataError("'name' is too long")
+
+    values = {field: _integer(data, field) for field in INTEGER_FIELDS}
+    if values['price'] is None:
+        raise ProductDataError("'price' is required")
+    if values['price'] < 0:
+        raise ProductDataError("'price' must not be negative")
+
+    rating = data.get('rating')
+    if rating is not None:
+        if isinstance(rating, bool):
+            raise ProductDataError("'rating' must be a number")
+        try:
+            rating = float(rating)
+        except (TypeError, ValueError):
+            raise ProductDataError("'rating' must be a number")
+
+    image = data.get('image')
+    if image is not None:
+        if not isinstance(image, str):
+            raise ProductDataError("'image' must be a string")
+        if len(image) > Product._meta.get_field('image').max_length:
+            raise ProductDataError("'image' is too long")
+
+    external_id = data.get('external_id')
+    if external_id is not None:
+        if not isinstance(external_id, str) or not external_id:
+            raise ProductDataError("'external_id' must be a non-empty string")
+        if len(external_id) > Product._meta.get_field('external_id').max_length:
+            raise ProductDataError("'external_id' is too long")
+
+    labels = data.get('labels')
+    if labels is not None and (
+        not isinstance(labels, list) or not all(isinstance(label, str) for label in labels)
+    ):
+        raise ProductDataError("'labels' must be a list of strings")
+    if labels and any(len(label) > Label._meta.get_field('name').max_length for label in labels):
+        raise ProductDataError("a label is too long")
+
+    product = Product(name=name, rating=rating, image=image, external_id=external_id, **values)
+    product.set_labels_list(labels)
+    return product
+
+
+def _insert_chunk(products):
+    """Insert one chunk; on a database error fall back to row-by-row inserts.
+
+    Returns (created products, [(position in chunk, message)]).
+    """
+    try:
+        with transaction.atomic():
+            created = Product.objects.bulk_create(products)
+            store_labels(created)
+            return created, []
+    except DatabaseError:
+        pass
+
+    created, errors = [], []
+    for position, product in enumerate(products):
+        # Undo whatever the failed bulk_create assigned
+        product.pk = None
+        product._state.adding = True
+        try:
+            with transaction.atomic():
+                product.save(force_insert=True)
+            created.append(product)
+        except DatabaseError as e:
+            product.pk = None
+            errors.append((position, str(e)))
+    return created, errors
+
+
+def bulk_create_products(items, chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """Validate and insert an iterable of payloads.
+
+    items is consumed lazily, so a streamed body (NDJSON) never has to be
+    held in memory as a whole. All inserts share one transaction and bump
+    the catalog version once. progress, if given, is called with the number
+    of products created so far after every chunk.
+
+    Returns (ids of created products, [{'index': i, 'error': message}]).
+    """
+    ids, errors = [], []
+    pending, pending_indexes = [], []
+
+    def flush():
+        created, failures = _insert_chunk(pending)
+        ids.extend(product.id for product in created)
+        errors.extend({'index': pending_indexes[position], 'error': message}
+                      for position, message in failures)
+        pending.clear()
+        pending_indexes.clear()
+        if progress:
+            progress(len(ids))
+
+    with catalog_change(), transaction.atomic():
+        for index, data in enumerate(items):
+            if isinstance(data, Exception):
+                # Parse errors are passed through by the caller's reader
+                errors.append({'index': index, 'error': str(data)})
+                continue
+            try:
+                pending.append(product_from_data(data))
+                pending_indexes.append(index)
+            except ProductDataError as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            if len(pending) >= chunk_size:
+                flush()
+        if pending:
+            flush()
+    return ids, errors
+
+
+def replace_catalog(items, chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """Delete every product and import items instead, all or nothing.
+
+    Returns (number of products deleted, ids, errors) like bulk_create_products.
+    """
+    with catalog_change(), transaction.atomic():
+        deleted = Product.objects.count()
+        Product.objects.all().delete()
+        ids, errors = bulk_create_products(items, chunk_size, progress)
+    return deleted, ids, errors
@@ -0,0 +1,252 @@
+"""
+Server-side filtering and keyset pagination for the product list.
+
+A page is fetched with ``WHERE <filters> AND <after cursor> ORDER BY
+<field>, id LIMIT page_size + 1``, so the work per request depends on the
+page size, not on the catalog size or on how deep the client has scrolled
+(no OFFSET). The cursor is the (field value, id) of the last row returned,
+encoded as an opaque URL-safe string.
+"""
+
+import base64
+import json
+
+from django.db.models import F, Q
+
+from .models import Label, Product, ProductLabel, normalize_label
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# ordering parameter -> (model field, descending)
+ORDERINGS = {
+    'id': ('id', False),
+    '-id': ('id', True),
+    'price': ('price', False),
+    '-price': ('price', True),
+    'rating': ('rating', False),
+    '-rating': ('rating', True),
+    'discount': ('discount', False),
+    '-discount': ('discount', True),
+    'sold_count': ('sold_count', False),
+    '-sold_count': ('sold_count', True),
+    'name': ('name', False),
+    '-name': ('name', True),
+}
+DEFAULT_ORDERING = 'id'
+
+# top-N list -> ordering; products without a value for the field are left out
+TOP_LISTS = {
+    'cheapest': 'price',
+    'most_discounted': '-discount',
+    'best_rated': '-rating',
+    'best_selling': '-sold_count',
+}
+DEFAULT_TOP_N = 10
+
+# Keys of a serialized product, selectable with ?fields=
+PRODUCT_FIELDS = (
+    'id', 'name', 'price', 'original_price', 'discount', 'rating', 'sold_count', 'image', 'labels',
+)
+
+
+class ListingError(ValueError):
+    """Invalid query parameter; the view answers 400 with the message"""
+
+
+def _number(params, name, cast=float):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ListingError(f"'{name}' must be a number")
+
+
+def _label_filter(value, position=None, exact=False):
+    """Q on product id for products carrying a matching label.
+
+    The label vocabulary is small, so the substring match runs on the labels
+    table; products are then found through the (label, position) index.
+    """
+    if exact:
+        labels = Label.objects.filter(name=value)
+    else:
+        labels = Label.objects.filter(normalized__contains=normalize_label(value))
+    product_labels = ProductLabel.objects.filter(label__in=labels)
+    if position is not None:
+        product_labels = product_labels.filter(position=position)
+    return Q(id__in=product_labels.values('product_id'))
+
+
+def filter_products(queryset, params):
+    """Apply the list filters found in params (a QueryDict or dict).
+
+    q           name contains (case-insensitive)
+    brand       first label contains (case-insensitive)
+    category    second label contains (case-insensitive)
+    label       any label equals
+    min_price, max_price, min_rating, min_discount
+    """
+    q = (params.get('q') or '').strip()
+    if q:
+        queryset = queryset.filter(name__icontains=q)
+
+    brand = (params.get('brand') or '').strip()
+    if brand:
+        queryset = queryset.filter(_label_filter(brand, position=0))
+    category = (params.get('category') or '').strip()
+    if category:
+        queryset = queryset.filter(_label_filter(category, position=1))
+    label = (params.get('label') or '').strip()
+    if label:
+        queryset = queryset.filter(_label_filter(label, exact=True))
+
+    min_price = _number(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = _number(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    min_rating = _number(params, 'min_rating')
+    if min_rating is not None:
+        queryset = queryset.filter(rating__gte=min_rating)
+    min_discount = _number(params, 'min_discount')
+    if min_discount is not None:
+        queryset = queryset.filter(discount__gte=min_discount)
+    return queryset
+
+
+def parse_fields(params):
+    """Fields requested with ?fields=a,b (all of them by default), in PRODUCT_FIELDS order"""
+    value = (params.get('fields') or '').strip()
+    if not value:
+        return PRODUCT_FIELDS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested.difference(PRODUCT_FIELDS)
+    if unknown:
+        raise ListingError(f"Unknown fields: {', '.join(sorted(unknown))}; "
+                           f"expected some of: {', '.join(PRODUCT_FIELDS)}")
+    return tuple(field for field in PRODUCT_FIELDS if field in requested)
+
+
+def only_fields(queryset, fields, *needed):
+    """Load only the columns of fields (plus needed, e.g. the ordering field);
+    the label prefetch is dropped when labels are not asked for"""
+    if fields == PRODUCT_FIELDS:
+        return queryset
+    queryset = queryset.only('id', *(field for field in fields if field != 'labels'), *needed)
+    if 'labels' not in fields:
+        queryset = queryset.prefetch_related(None)
+    return queryset
+
+
+def encode_cursor(ordering, value, last_id):
+    raw = json.dumps([ordering, value, last_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_ordering, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ListingError("Invalid cursor")
+    if cursor_ordering != ordering or not isinstance(last_id, int):
+        raise ListingError("Cursor does not match ordering")
+    return value, last_id
+
+
+def _after(field, descending, value, last_id):
+    """Conditions selecting the rows strictly after (value, last_id) in
+    ORDER BY field, id, as a list of segments to read one after the other.
+
+    NULLs come first in ascending order and last in descending order, the
+    SQLite default, made explicit so other databases page the same way.
+    The NULL rows are a segment of their own and the redundant
+    field >= value (<= value) bound is spelled out, so each segment is a
+    seek into the (field, id) index rather than a scan from its start.
+    """
+    if field == 'id':
+        return [Q(id__lt=last_id) if descending else Q(id__gt=last_id)]
+    nullable = Product._meta.get_field(field).null
+    is_null = Q(**{f'{field}__isnull': True})
+    if descending:
+        if value is None:
+            return [is_null & Q(id__lt=last_id)]
+        before = Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id})
+        bounded = Q(**{f'{field}__lte': value}) & before
+        return [bounded, is_null] if nullable else [bounded]
+    if value is None:
+        return [is_null & Q(id__gt=last_id), Q(**{f'{field}__isnull': False})]
+    after = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': last_id})
+    return [Q(**{f'{field}__gte': value}) & after]
+
+
+def order_by(field, descending):
+    """ORDER BY terms matching the (field, id) indexes and _after()"""
+    if field == 'id':
+        return ['-id'] if descending else ['id']
+    if descending:
+        return [F(field).desc(nulls_last=True), '-id']
+    return [F(field).asc(nulls_first=True), 'id']
+
+
+def paginate(queryset, params):
+    """One page of queryset as (products, next_cursor, ordering, page_size)"""
+    ordering = params.get('ordering') or DEFAULT_ORDERING
+    if ordering not in ORDERINGS:
+        raise ListingError(f"'ordering' must be one of: {', '.join(ORDERINGS)}")
+    field, descending = ORDERINGS[ordering]
+
+    page_size = _number(params, 'page_size', int) or DEFAULT_PAGE_SIZE
+    if page_size < 1:
+        raise ListingError("'page_size' must be positive")
+    page_size = min(page_size, MAX_PAGE_SIZE)
+
+    segments = [Q()]
+    cursor = params.get('cursor')
+    if cursor:
+        value, last_id = decode_cursor(cursor, ordering)
+        segments = _after(field, descending, value, last_id)
+
+    queryset = queryset.order_by(*order_by(field, descending))
+    products = []
+    for condition in segments:
+        products += queryset.filter(condition)[:page_size + 1 - len(products)]
+        if len(products) > page_size:
+            break
+
+    next_cursor = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        last = products[-1]
+        next_cursor = encode_cursor(ordering, getattr(last, field), last.id)
+    return products, next_cursor, ordering, page_size
+
+
+def product_page(params, fields=PRODUCT_FIELDS):
+    """Filtered, paginated products for the list endpoint"""
+    ordering = ORDERINGS.get(params.get('ordering') or DEFAULT_ORDERING, ('id', False))
+    queryset = only_fields(Product.objects.with_labels(), fields, ordering[0])
+    return paginate(filter_products(queryset, params), params)
+
+
+def top_queryset(kind, queryset=None):
+    """Unsliced queryset of a top-N list, ordered along its (field, id) index"""
+    if kind not in TOP_LISTS:
+        raise ListingError(f"Unknown list '{kind}', expected one of: {', '.join(TOP_LISTS)}")
+    field, descending = ORDERINGS[TOP_LISTS[kind]]
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.filter(**{f'{field}__isnull': False}).order_by(*order_by(field, descending))
+
+
+def top_products(kind, params, fields=PRODUCT_FIELDS):
+    """First n products of a top-N list, after the list filters in params"""
+    n = _number(params, 'n', int) or DEFAULT_TOP_N
+    if n < 1:
+        raise ListingError("'n' must be positive")
+    queryset = filter_products(only_fields(Product.objects.with_labels(), fields), params)
+    return list(top_queryset(kind, queryset)[:min(n, MAX_PAGE_SIZE)])
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from shop import catalog_cache
+from shop.models import Product, store_labels
+from shop.views import product_detail, product_list
+
+
+class Command(BaseCommand):
+    help = 'Measure product endpoint requests/sec with and without the response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per scenario')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many synthetic products first (rolled back afterwards)')
+        parser.add_argument('--page-size', type=int, default=24)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(options['seed'])
+            self._run(options)
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        self.stdout.write(f"Seeding {count} synthetic products...")
+        products = []
+        for i in range(count):
+            product = Product(name=f"Bench product {i}", price=1000 + i % 500 * 100,
+                              discount=10 + i % 21, rating=3 + i % 3 * 0.5, sold_count=i % 1000)
+            product.set_labels_list([f"Brand {i % 50}", f"Category {i % 12}", "amazon", "imported"])
+            products.append(product)
+        store_labels(Product.objects.bulk_create(products, batch_size=1000))
+
+    def _run(self, options):
+        first = Product.objects.order_by('id').first()
+        if first is None:
+            self.stderr.write("No products in the database; use --seed N")
+            return
+
+        factory = RequestFactory()
+        list_query = {'page_size': options['page_size'], 'ordering': '-rating'}
+        scenarios = [
+            ('list page', lambda **headers: product_list(factory.get('/api/products/', list_query, **headers))),
+            ('detail', lambda **headers: product_detail(factory.get(f'/api/products/{first.id}/', **headers),
+                                                        first.id)),
+        ]
+
+        self.stdout.write(f"{'scenario':<12} {'no cache':>12} {'cache hit':>12} {'304':>12}")
+        for label, call in scenarios:
+            with override_settings(PRODUCT_CACHE={'ENABLED': False}):
+                uncached = self._rate(call, options['requests'])
+            catalog_cache.stats.reset()
+            etag = call()['ETag']  # warm the cache
+            cached = self._rate(call, options['requests'])
+            revalidated = self._rate(lambda: call(HTTP_IF_NONE_MATCH=etag), options['requests'])
+            self.stdout.write(f"{label:<12} {uncached:>8.0f} r/s {cached:>8.0f} r/s {revalidated:>8.0f} r/s")
+            self.stdout.write(f"{'':<12} counters: {catalog_cache.stats.snapshot()}")
+
+    @staticmethod
+    def _rate(call, requests):
+        start = time.perf_counter()
+        for _ in range(requests):
+            call()
+        return requests / (time.perf_counter() - start)
@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from shop import serialization
+from shop.catalog_cache import COMPRESSORS
+from shop.models import Product, store_labels
+from shop.views import product_list
+
+SPARSE_FIELDS = 'id,name,price,rating,image'
+
+
+class Command(BaseCommand):
+    help = 'Compare product list payload sizes and CPU time: full vs sparse fields, json vs orjson, compression'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per scenario')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many synthetic products first (rolled back afterwards)')
+        parser.add_argument('--page-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(options['seed'])
+            self._run(options)
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        self.stdout.write(f"Seeding {count} synthetic products...")
+        products = []
+        for i in range(count):
+            product = Product(name=f"Sản phẩm thử nghiệm số {i}", price=1000 + i % 500 * 100,
+                              original_price=2000 + i % 500 * 100, discount=10 + i % 21, rating=3 + i % 3 * 0.5, sold_count=i % 1000,
+                              image=f"https://example.com/images/{i}.jpg")
+            product.set_labels_list([f"Brand {i % 50}", f"Category {i % 12}", "amazon", "imported"])
+            products.append(product)
+        store_labels(Product.objects.bulk_create(products, batch_size=1000))
+
+    def _run(self, options):
+        if not Product.objects.exists():
+            self.stderr.write("No products in the database; use --seed N")
+            return
+
+        factory = RequestFactory()
+        encoders = [('json', False)]
+        if serialization.orjson is not None:
+            encoders.append(('orjson', True))
+        compressors = list(COMPRESSORS)
+
+        header = f"{'fields':<8} {'encoder':<8} {'bytes':>9}"
+        header += ''.join(f" {name + ' bytes':>11}" for name in compressors)
+        self.stdout.write(f"page of {options['page_size']}, cache off, CPU per request over {options['requests']} requests")
+        self.stdout.write(f"{header} {'encode ms':>10} {'request ms':>11}")
+        for label, fields in [('full', None), ('sparse', SPARSE_FIELDS)]:
+            query = {'page_size': options['page_size'], 'ordering': '-rating'}
+            if fields:
+                query['fields'] = fields
+            for encoder, use_orjson in encoders:
+                with override_settings(PRODUCT_CACHE={'ENABLED': False}, PRODUCT_JSON={'ORJSON': use_orjson}):
+                    call = lambda: product_list(factory.get('/api/products/', query))
+                    body = call().content
+                    data = serialization.orjson.loads(body) if use_orjson else json.loads(body)
+                    encode_ms = self._cpu_ms(lambda: serialization.dumps(data), options['requests'])
+                    request_ms = self._cpu_ms(call, options['requests'])
+                line = f"{label:<8} {encoder:<8} {len(body):>9}"
+                line += ''.join(f" {len(COMPRESSORS[name](body)):>11}" for name in compressors)
+                self.stdout.write(f"{line} {encode_ms:>10.3f} {request_ms:>11.2f}")
+
+    @staticmethod
+    def _cpu_ms(call, requests):
+        start = time.process_time()
+        for _ in range(requests):
+            call()
+        return (time.process_time() - start) * 1000 / requests
@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shop.models import Product, store_labels
+from shop.search import search_products
+
+WORDS = ['điện thoại', 'tai nghe', 'bluetooth', 'sạc nhanh', 'không dây', 'màn hình', 'laptop',
+         'chuột', 'bàn phím', 'loa', 'đồng hồ', 'thông minh', 'camera', 'pin', 'ốp lưng', 'cáp',
+         'máy tính bảng', 'gaming', 'chống nước', 'mini', 'cao cấp', 'chính hãng', 'usb', 'wifi',
+         'tủ lạnh', 'máy giặt', 'nồi chiên', 'quạt', 'đèn led', 'bình giữ nhiệt', 'balo', 'giày',
+         'áo thun', 'kem chống nắng', 'sữa rửa mặt', 'son môi', 'nước hoa', 'máy lọc không khí',
+         'robot hút bụi', 'ghế công thái học', 'bàn làm việc', 'kính', 'ví da', 'vali', 'lều',
+         'xe đạp', 'đồ chơi', 'sách', 'bút', 'máy ảnh']
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Sony', 'Anker', 'Logitech', 'Oppo', 'JBL']
+# (label, query): a common word, a rarer pair, a prefix being typed, accents left out, no match
+QUERIES = [
+    ('common word', 'bluetooth'),
+    ('two words', 'đồng hồ thông minh'),
+    ('prefix', 'tai ngh'),
+    ('no accents', 'dien thoai'),
+    ('no match', 'xyzzy'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare FTS5 product search with a name__icontains scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=100000,
+                            help='Insert this many synthetic products first (rolled back afterwards)')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Runs per query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"FTS5 search needs SQLite, not {connection.vendor}")
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(options['seed'])
+            self._run(options['repeat'])
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        self.stdout.write(f"Seeding {count} synthetic products...")
+        rng = random.Random(0)
+        start = time.perf_counter()
+        products = []
+        for i in range(count):
+            brand = rng.choice(BRANDS)
+            name = f"{brand} {' '.join(rng.sample(WORDS, 3))} {i}"
+            product = Product(name=name, price=1000 + i % 500 * 100, rating=3 + i % 3 * 0.5)
+            product.set_labels_list([brand, f"Category {i % 12}", "amazon"])
+            products.append(product)
+            if len(products) == 5000:
+                store_labels(Product.objects.bulk_create(products))
+                products = []
+        store_labels(Product.objects.bulk_create(products))
+        self.stdout.write(f"  {count / (time.perf_counter() - start):.0f} products/s "
+                          f"(search index kept up to date by triggers)")
+
+    def _run(self, repeat):
+        total = Product.objects.count()
+        self.stdout.write(f"{total} products, first page of 24, median of {repeat} runs")
+        self.stdout.write(f"{'query':<28} {'fts5 ms':>9} {'hits':>6} {'icontains ms':>13} {'hits':>6}")
+        for label, query in QUERIES:
+            fts_ms, fts_hits = self._time(lambda: search_products({'q': query})[0], repeat)
+            scan_ms, scan_hits = self._time(
+                lambda: list(Product.objects.with_labels().filter(name__icontains=query).order_by('id')[:24]),
+                repeat,
+            )
+            self.stdout.write(f"{label + ': ' + query:<28} {fts_ms:>9.2f} {fts_hits:>6} "
+                              f"{scan_ms:>13.2f} {scan_hits:>6}")
+
+    @staticmethod
+    def _time(call, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = call()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], len(result)
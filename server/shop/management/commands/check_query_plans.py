@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.listing import ORDERINGS, TOP_LISTS, _after, order_by, top_queryset
+from shop.models import Product
+
+# A cursor position in the middle of the catalog; the plan doesn't depend on it
+SAMPLE_VALUES = {'price': 100000, 'rating': 4.5, 'discount': 20, 'sold_count': 100, 'name': 'M'}
+SAMPLE_ID = 1000
+PAGE = 25
+
+
+class Command(BaseCommand):
+    help = 'Check with EXPLAIN QUERY PLAN that list and top-N queries use the product indexes'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"EXPLAIN QUERY PLAN checks are written for SQLite, not {connection.vendor}")
+
+        failures = 0
+        for label, queryset, index in self._queries():
+            plan = queryset.explain()
+            uses_index = index is None or f'INDEX {index}' in plan or 'INTEGER PRIMARY KEY' in plan
+            sorts = 'USE TEMP B-TREE FOR ORDER BY' in plan
+            ok = uses_index and not sorts
+            failures += not ok
+            status = self.style.SUCCESS('OK  ') if ok else self.style.ERROR('FAIL')
+            self.stdout.write(f"{status} {label}")
+            for line in plan.splitlines():
+                self.stdout.write(f"       {line}")
+
+        if failures:
+            raise CommandError(f"{failures} queries do not use their index")
+        self.stdout.write(self.style.SUCCESS("All list queries are served by an index"))
+
+    def _queries(self):
+        """(label, queryset, expected index name) for every list query shape"""
+        products = Product.objects.all()
+        for ordering, (field, descending) in ORDERINGS.items():
+            index = None if field == 'id' else f'product_{field}_idx'
+            ordered = products.order_by(*order_by(field, descending))
+            yield f"list ordering={ordering} first page", ordered[:PAGE + 1], index
+            for value in (SAMPLE_VALUES.get(field, SAMPLE_ID), None):
+                if field == 'id' and value is None:
+                    continue
+                for n, condition in enumerate(_after(field, descending, value, SAMPLE_ID), 1):
+                    yield (f"list ordering={ordering} cursor value={value!r} segment {n}",
+                           ordered.filter(condition)[:PAGE + 1], index)
+
+        for kind, ordering in TOP_LISTS.items():
+            field, _ = ORDERINGS[ordering]
+            yield f"top {kind}", top_queryset(kind)[:10], f'product_{field}_idx'
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import Product
+from shop.pricing import DEFAULT_MAX_DISCOUNT, DEFAULT_MIN_DISCOUNT, apply_discounts, discount_distribution, spread_discounts
+
+
+class Command(BaseCommand):
+    help = 'Give every product a discount from --min to --max percent (picked by id) with one UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min', type=int, default=DEFAULT_MIN_DISCOUNT, dest='low')
+        parser.add_argument('--max', type=int, default=DEFAULT_MAX_DISCOUNT, dest='high')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the resulting distribution; no rows are written')
+
+    def handle(self, *args, **options):
+        try:
+            rule = spread_discounts(options['low'], options['high'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        distribution = discount_distribution(rule)
+        total = sum(distribution.values())
+        if not total:
+            self.stdout.write("No products found in database")
+            return
+
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {total} products, nothing is written")
+        else:
+            updated = apply_discounts(rule)
+            self.stdout.write(f"Updated {updated} of {total} products ({total - updated} already had their discount)")
+
+        self.stdout.write("\nDiscount distribution:")
+        for discount, count in distribution.items():
+            self.stdout.write(f"{discount}%: {count} products ({count / total * 100:.1f}%)")
+
+        self.stdout.write("\nSample products:")
+        for product in Product.objects.annotate(new_discount=rule).order_by('id')[:5]:
+            self.stdout.write(f"Product #{product.id}: {product.name} - {product.new_discount}% discount")
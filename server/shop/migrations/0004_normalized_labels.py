@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:59
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_labels(apps, schema_editor):
+    """Move the JSON text of Product.labels into Label / ProductLabel rows"""
+    Product = apps.get_model('shop', 'Product')
+    Label = apps.get_model('shop', 'Label')
+    ProductLabel = apps.get_model('shop', 'ProductLabel')
+
+    label_ids = {}
+    batch = []
+    for product_id, text in Product.objects.exclude(labels=None).values_list('id', 'labels').iterator(chunk_size=2000):
+        try:
+            names = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(names, list):
+            continue
+        for position, name in enumerate(str(name)[:255] for name in names):
+            if name not in label_ids:
+                label_ids[name] = Label.objects.create(
+                    name=name, normalized=' '.join(name.casefold().split())
+                ).id
+            batch.append(ProductLabel(product_id=product_id, label_id=label_ids[name], position=position))
+        if len(batch) >= 2000:
+            ProductLabel.objects.bulk_create(batch)
+            batch = []
+    ProductLabel.objects.bulk_create(batch)
+
+
+def restore_labels(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductLabel = apps.get_model('shop', 'ProductLabel')
+
+    names = {}
+    rows = ProductLabel.objects.order_by('product_id', 'position').values_list('product_id', 'label__name')
+    for product_id, name in rows.iterator(chunk_size=2000):
+        names.setdefault(product_id, []).append(name)
+    for product_id, labels in names.items():
+        Product.objects.filter(id=product_id).update(labels=json.dumps(labels))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_catalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Label',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('normalized', models.CharField(db_index=True, max_length=255)),
+            ],
+            options={
+                'db_table': 'labels',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('label', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_labels', to='shop.label')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_labels', to='shop.product')),
+            ],
+            options={
+                'db_table': 'product_labels',
+                'ordering': ['position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productlabel',
+            index=models.Index(fields=['label', 'position'], name='product_label_lookup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productlabel',
+            constraint=models.UniqueConstraint(fields=('product', 'position'), name='product_label_position_unique'),
+        ),
+        migrations.RunPython(copy_labels, restore_labels),
+        migrations.RemoveField(
+            model_name='product',
+            name='labels',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='labels',
+            field=models.ManyToManyField(related_name='products', through='shop.ProductLabel', to='shop.label'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# unicode61 removes accents but "đ" is a letter of its own; fold it to "d" too
+# (shop.search.match_expression does the same to the query)
+def fold(sql):
+    return f"replace(replace({sql}, 'đ', 'd'), 'Đ', 'D')"
+
+
+def labels_of(product_id):
+    """Labels of one product as a single space separated text, in label order"""
+    return fold(f"""coalesce((
+        SELECT group_concat(name, ' ') FROM (
+            SELECT labels.name FROM product_labels
+            JOIN labels ON labels.id = product_labels.label_id
+            WHERE product_labels.product_id = {product_id}
+            ORDER BY product_labels.position
+        )
+    ), '')""")
+
+
+CREATE_SQL = [
+    # rowid is the product id; remove_diacritics folds "Điện thoại" and "dien thoai" together
+    """CREATE VIRTUAL TABLE product_search USING fts5(
+        name, labels,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    """INSERT INTO product_search (rowid, name, labels)
+       SELECT id, %s, %s FROM products""" % (fold('name'), labels_of('products.id')),
+    """CREATE TRIGGER product_search_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_search (rowid, name, labels) VALUES (NEW.id, %s, '');
+    END""" % fold('NEW.name'),
+    """CREATE TRIGGER product_search_update AFTER UPDATE OF name ON products BEGIN
+        UPDATE product_search SET name = %s WHERE rowid = NEW.id;
+    END""" % fold('NEW.name'),
+    """CREATE TRIGGER product_search_delete AFTER DELETE ON products BEGIN
+        DELETE FROM product_search WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER product_search_label_insert AFTER INSERT ON product_labels BEGIN
+        UPDATE product_search SET labels = %s WHERE rowid = NEW.product_id;
+    END""" % labels_of('NEW.product_id'),
+    """CREATE TRIGGER product_search_label_delete AFTER DELETE ON product_labels BEGIN
+        UPDATE product_search SET labels = %s WHERE rowid = OLD.product_id;
+    END""" % labels_of('OLD.product_id'),
+    """CREATE TRIGGER product_search_label_rename AFTER UPDATE OF name ON labels BEGIN
+        UPDATE product_search SET labels = %s
+        WHERE rowid IN (SELECT product_id FROM product_labels WHERE label_id = NEW.id);
+    END""" % labels_of('product_search.rowid'),
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS product_search_label_rename",
+    "DROP TRIGGER IF EXISTS product_search_label_delete",
+    "DROP TRIGGER IF EXISTS product_search_label_insert",
+    "DROP TRIGGER IF EXISTS product_search_delete",
+    "DROP TRIGGER IF EXISTS product_search_update",
+    "DROP TRIGGER IF EXISTS product_search_insert",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite only; shop.search falls back to a name scan elsewhere
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,133 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+# Bucket lower bounds as of this migration (shop.facets has the same values)
+PRICE_BUCKETS = (0, 200000, 500000, 1000000, 2000000, 5000000, 10000000)
+RATING_BUCKETS = (0, 1, 2, 3, 4, 4.5)
+
+
+def _format(bound):
+    return str(int(bound)) if float(bound).is_integer() else str(bound)
+
+
+def bucket(expression, bounds):
+    """SQL CASE naming the bucket of expression: '200000-500000', '10000000+'"""
+    whens = ''.join(
+        f" WHEN {expression} < {high} THEN '{_format(low)}-{_format(high)}'"
+        for low, high in zip(bounds, bounds[1:])
+    )
+    return f"CASE{whens} ELSE '{_format(bounds[-1])}+' END"
+
+
+def add(facet, value, delta, condition='true'):
+    """Statement adding delta to the count of (facet, value) when condition holds"""
+    return (
+        f"INSERT INTO facet_counts (facet, value, count) SELECT {facet}, {value}, {delta} WHERE {condition}"
+        f" ON CONFLICT (facet, value) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+def product_facets(row, delta, changed=False):
+    """Price and rating bucket updates for OLD or NEW products row"""
+    price_condition = 'OLD.price IS NOT NEW.price' if changed else 'true'
+    rating_condition = f'{row}.rating IS NOT NULL'
+    if changed:
+        rating_condition += ' AND OLD.rating IS NOT NEW.rating'
+    return (
+        add("'price'", bucket(f'{row}.price', PRICE_BUCKETS), delta, price_condition)
+        + add("'rating'", bucket(f'{row}.rating', RATING_BUCKETS), delta, rating_condition)
+    )
+
+
+def label_facet(row, delta):
+    """Brand (position 0) / category (position 1) update for OLD or NEW product_labels row"""
+    return add(
+        f"CASE {row}.position WHEN 0 THEN 'brand' ELSE 'category' END",
+        f"(SELECT name FROM labels WHERE id = {row}.label_id)",
+        delta,
+        f"{row}.position < 2",
+    )
+
+
+CREATE_SQL = [
+    f"""INSERT INTO facet_counts (facet, value, count)
+        SELECT 'price', {bucket('price', PRICE_BUCKETS)}, count(*) FROM products GROUP BY 2""",
+    f"""INSERT INTO facet_counts (facet, value, count)
+        SELECT 'rating', {bucket('rating', RATING_BUCKETS)}, count(*) FROM products
+        WHERE rating IS NOT NULL GROUP BY 2""",
+    """INSERT INTO facet_counts (facet, value, count)
+        SELECT CASE product_labels.position WHEN 0 THEN 'brand' ELSE 'category' END, labels.name, count(*)
+        FROM product_labels JOIN labels ON labels.id = product_labels.label_id
+        WHERE product_labels.position < 2 GROUP BY 1, 2""",
+    f"""CREATE TRIGGER facet_products_insert AFTER INSERT ON products BEGIN
+        {product_facets('NEW', 1)}
+    END""",
+    f"""CREATE TRIGGER facet_products_delete AFTER DELETE ON products BEGIN
+        {product_facets('OLD', -1)}
+    END""",
+    f"""CREATE TRIGGER facet_products_update AFTER UPDATE OF price, rating ON products
+    WHEN OLD.price IS NOT NEW.price OR OLD.rating IS NOT NEW.rating BEGIN
+        {product_facets('OLD', -1, changed=True)}
+        {product_facets('NEW', 1, changed=True)}
+    END""",
+    f"""CREATE TRIGGER facet_labels_insert AFTER INSERT ON product_labels WHEN NEW.position < 2 BEGIN
+        {label_facet('NEW', 1)}
+    END""",
+    f"""CREATE TRIGGER facet_labels_delete AFTER DELETE ON product_labels WHEN OLD.position < 2 BEGIN
+        {label_facet('OLD', -1)}
+    END""",
+    f"""CREATE TRIGGER facet_labels_update AFTER UPDATE OF label_id, position ON product_labels BEGIN
+        {label_facet('OLD', -1)}
+        {label_facet('NEW', 1)}
+    END""",
+    """CREATE TRIGGER facet_label_rename AFTER UPDATE OF name ON labels BEGIN
+        DELETE FROM facet_counts WHERE facet IN ('brand', 'category') AND value = NEW.name;
+        UPDATE facet_counts SET value = NEW.name WHERE facet IN ('brand', 'category') AND value = OLD.name;
+    END""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS facet_label_rename",
+    "DROP TRIGGER IF EXISTS facet_labels_update",
+    "DROP TRIGGER IF EXISTS facet_labels_delete",
+    "DROP TRIGGER IF EXISTS facet_labels_insert",
+    "DROP TRIGGER IF EXISTS facet_products_update",
+    "DROP TRIGGER IF EXISTS facet_products_delete",
+    "DROP TRIGGER IF EXISTS facet_products_insert",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # Triggers are written for SQLite; shop.facets counts on the fly elsewhere
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'facet_counts',
+                'indexes': [models.Index(fields=['facet', '-count'], name='facet_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='facet_count_unique')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+# Widen Product.name from 200 to 500 characters: Amazon product names run
+# past 200 (two of them in the bundled feed).
+#
+# On SQLite only the migration state changes. SQLite does not enforce varchar
+# lengths, so the column already holds 500 characters, and a plain AlterField
+# would remake the products table - dropping the triggers that keep the
+# product_search FTS table (0006) and facet_counts (0007) in sync, which
+# would then have to be created again here. Other databases get a regular
+# ALTER COLUMN through the schema editor.
+
+NAME_LENGTH = 500
+
+
+def _name_field(max_length, model):
+    field = models.CharField(max_length=max_length)
+    field.set_attributes_from_name('name')
+    field.model = model
+    return field
+
+
+def _alter_name(old_length, new_length):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            return
+        Product = apps.get_model('shop', 'Product')
+        schema_editor.alter_field(Product, _name_field(old_length, Product), _name_field(new_length, Product))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_external_id'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(_alter_name(200, NAME_LENGTH), _alter_name(NAME_LENGTH, 200))],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='product',
+                    name='name',
+                    field=models.CharField(max_length=NAME_LENGTH),
+                ),
+            ],
+        ),
+    ]
@@ -1,34 +1,189 @@
-from django.db import models
-import json
+from django.db import models, transaction
+
+
+def normalize_label(name):
+    """Case-folded label used for case-insensitive label filters"""
+    return " ".join(name.casefold().split())
+
+
+class Label(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    normalized = models.CharField(max_length=255, db_index=True)
+
+    @classmethod
+    def ids_for(cls, names):
+        """name -> id for names, creating the labels that don't exist yet"""
+        names = set(names)
+        ids = dict(cls.objects.filter(name__in=names).values_list('name', 'id'))
+        missing = names - ids.keys()
+        if missing:
+            cls.objects.bulk_create(
+                [cls(name=name, normalized=normalize_label(name)) for name in missing],
+                ignore_conflicts=True,
+            )
+            ids.update(cls.objects.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'labels'
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_labels(self):
+        """Fetch labels for all products in one extra query, in label order"""
+        return self.prefetch_related(models.Prefetch(
+            'product_labels',
+            queryset=ProductLabel.objects.select_related('label').order_by('position'),
+        ))
+
 
 class Product(models.Model):
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=500)
     price = models.IntegerField()
     original_price = models.IntegerField(null=True, blank=True)
     discount = models.IntegerField(null=True, blank=True)
     rating = models.FloatField(null=True, blank=True)
     sold_count = models.IntegerField(null=True, blank=True)
     image = models.CharField(max_length=500, null=True, blank=True)
-    labels = models.TextField(null=True, blank=True)  # JSON string for labels array
+    # Stable identity in the import feeds (e.g. "asin:B07..."); see shop/catalog_sync.py
+    external_id = models.CharField(max_length=64, null=True, blank=True)
+    # Ordered: position 0 is the brand, position 1 the category
+    labels = models.ManyToManyField(Label, through='ProductLabel', related_name='products')
+
+    objects = ProductQuerySet.as_manager()
 
     def get_labels_list(self):
-        """Convert JSON string to list"""
-        if self.labels:
-            try:
-                return json.loads(self.labels)
-            except json.JSONDecodeError:
-                return []
-        return []
+        """Label names in order"""
+        known = getattr(self, '_label_names', None)
+        if known is not None:
+            return list(known)
+        if self.pk is None:
+            return []
+        if 'product_labels' in getattr(self, '_prefetched_objects_cache', {}):
+            product_labels = self.product_labels.all()
+        else:
+            product_labels = self.product_labels.select_related('label').order_by('position')
+        return [product_label.label.name for product_label in product_labels]
 
     def set_labels_list(self, labels_list):
-        """Convert list to JSON string"""
-        if labels_list:
-            self.labels = json.dumps(labels_list)
-        else:
-            self.labels = None
+        """Replace the labels; on an unsaved product they are written by save()"""
+        from .catalog_cache import catalog_change
+
+        self._label_names = list(labels_list or [])
+        self._pending_labels = self._label_names
+        if self.pk is not None:
+            with catalog_change(), transaction.atomic():
+                ProductLabel.objects.filter(product=self).delete()
+                store_labels([self])
+
+    def save(self, *args, **kwargs):
+        # The row and its labels are committed together and the catalog
+        # version is bumped after both; the post_save bump would come before
+        # the labels, letting a concurrent request cache the product without them
+        from .catalog_cache import catalog_change
+
+        adding = self._state.adding
+        with catalog_change(), transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                store_labels([self])
 
     def __str__(self):
         return self.name
 
     class Meta:
         db_table = 'products'
+        # Keyset pagination and top-N lists sort on (field, id); see shop/listing.py
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['rating', 'id'], name='product_rating_idx'),
+            models.Index(fields=['discount', 'id'], name='product_discount_idx'),
+            models.Index(fields=['sold_count', 'id'], name='product_sold_count_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+        ]
+        constraints = [
+            # Partial, so it is created as an index: a plain unique constraint
+            # would make SQLite rebuild the table and drop its triggers
+            models.UniqueConstraint(
+                fields=['external_id'], condition=models.Q(external_id__isnull=False),
+                name='product_external_id_unique',
+            ),
+        ]
+
+
+class ProductLabel(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_labels')
+    label = models.ForeignKey(Label, on_delete=models.CASCADE, related_name='product_labels')
+    position = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'product_labels'
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'position'], name='product_label_position_unique'),
+        ]
+        indexes = [
+            # Brand (position 0) / category (position 1) filters
+            models.Index(fields=['label', 'position'], name='product_label_lookup_idx'),
+        ]
+
+
+def store_labels(products):
+    """Write the labels set with set_labels_list on freshly inserted products.
+
+    Works on a whole batch (e.g. after bulk_create) with one label lookup and
+    one bulk insert.
+    """
+    pending = [
+        (product, product._pending_labels) for product in products
+        if getattr(product, '_pending_labels', None) is not None
+    ]
+    if not pending:
+        return
+    label_ids = Label.ids_for(name for _, labels in pending for name in labels)
+    ProductLabel.objects.bulk_create([
+        ProductLabel(product_id=product.pk, label_id=label_ids[name], position=position)
+        for product, labels in pending
+        for position, name in enumerate(labels)
+    ])
+    for product, _ in pending:
+        del product._pending_labels
+
+
+class FacetCount(models.Model):
+    """Number of products per brand, category, price bucket and rating bucket.
+
+    Maintained by database triggers (migration 0007) on every product and
+    label write; see shop/facets.py.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+    class Meta:
+        db_table = 'facet_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='facet_count_unique'),
+        ]
+        indexes = [
+            # Largest brands / categories first
+            models.Index(fields=['facet', '-count'], name='facet_count_idx'),
+        ]
+
+
+class CatalogVersion(models.Model):
+    """Single row counting catalog changes; cached product responses are keyed on it"""
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+    class Meta:
+        db_table = 'catalog_version'
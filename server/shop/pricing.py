@@ -0,0 +1,46 @@
+"""
+Catalog-wide pricing rules, applied with one set-based UPDATE.
+
+A rule is a Django expression computing the new discount of a product from
+its own columns (e.g. spread_discounts: 10-30% picked by id).
+discount_distribution aggregates the expression in SQL to report what it
+would produce without writing anything; apply_discounts writes only the
+rows whose discount actually changes, as a single statement.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .catalog_cache import catalog_changed
+from .models import Product
+
+DEFAULT_MIN_DISCOUNT = 10
+DEFAULT_MAX_DISCOUNT = 30
+
+
+def spread_discounts(low=DEFAULT_MIN_DISCOUNT, high=DEFAULT_MAX_DISCOUNT):
+    """Discount from low to high (step 1) picked by product id, so it is stable"""
+    if not 0 <= low <= high <= 100:
+        raise ValueError("discounts must satisfy 0 <= low <= high <= 100")
+    return F('id') % (high - low + 1) + low
+
+
+def discount_distribution(rule, queryset=None):
+    """{discount: number of products} the rule would produce, computed in SQL"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.annotate(new_discount=rule)
+        .values('new_discount').annotate(count=Count('id')).order_by('new_discount')
+    )
+    return {row['new_discount']: row['count'] for row in rows}
+
+
+def apply_discounts(rule, queryset=None):
+    """Set discount = rule on every product where it differs; returns rows updated"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    with transaction.atomic():
+        updated = queryset.exclude(discount=rule).update(discount=rule)
+        # update() sends no signals; invalidate the cached responses ourselves
+        if updated:
+            catalog_changed()
+    return updated
@@ -0,0 +1,110 @@
+"""
+Full-text product search on the SQLite FTS5 table ``product_search``.
+
+The table mirrors Product.name and the product's labels (rowid = product
+id) and is kept in sync by triggers on products, product_labels and labels
+(migration 0006), so every write path - the API, bulk_create imports, the
+data scripts, the admin - updates it without extra code.
+
+Results are ranked by BM25 (name matches weigh more than label matches)
+and paginated with an opaque cursor, like the product list. The list
+filters (brand, price, ...) can be combined with the search.
+"""
+
+import re
+
+from django.db import connection
+
+from .listing import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PRODUCT_FIELDS, ListingError, _number, decode_cursor, encode_cursor,
+    filter_products, only_fields,
+)
+from .models import Product
+
+# bm25() column weights: name, labels
+NAME_WEIGHT = 10.0
+LABELS_WEIGHT = 1.0
+
+MAX_TERMS = 16
+
+_TERM = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """FTS5 MATCH expression for free text typed by a user.
+
+    Every word must match; the last one also matches as a prefix, so results
+    show up while the user is still typing. Words are quoted, so FTS5 syntax
+    in the input (AND, NEAR, column filters, ...) is searched for literally.
+    """
+    # "đ" is folded to "d" in the index as well (migration 0006)
+    terms = _TERM.findall(query.replace('đ', 'd').replace('Đ', 'D'))[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def _ranked_ids(match, filtered, limit, offset):
+    """Product ids matching the expression, best first"""
+    sql = "SELECT rowid FROM product_search WHERE product_search MATCH %s"
+    params = [match]
+    if filtered is not None:
+        subquery, subquery_params = filtered.values('id').query.sql_with_params()
+        sql += f" AND rowid IN ({subquery})"
+        params += subquery_params
+    sql += " ORDER BY bm25(product_search, %s, %s), rowid LIMIT %s OFFSET %s"
+    params += [NAME_WEIGHT, LABELS_WEIGHT, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_products(params, fields=PRODUCT_FIELDS):
+    """One page of search results as (products, next_cursor, page_size).
+
+    params: q (required), the list filters, page_size and cursor (the
+    next_cursor of the previous page).
+    """
+    query = (params.get('q') or '').strip()
+    if not query:
+        raise ListingError("'q' is required")
+
+    page_size = _number(params, 'page_size', int) or DEFAULT_PAGE_SIZE
+    if page_size < 1:
+        raise ListingError("'page_size' must be positive")
+    page_size = min(page_size, MAX_PAGE_SIZE)
+
+    # The rank of a row depends on the whole result set, so the cursor holds
+    # the position in the ranking (and the query it belongs to)
+    offset = 0
+    cursor = params.get('cursor')
+    if cursor:
+        cursor_query, offset = decode_cursor(cursor, 'rank')
+        if cursor_query != query or offset < 0:
+            raise ListingError("Cursor does not match the search")
+
+    products = only_fields(Product.objects.with_labels(), fields)
+    filtered = filter_products(Product.objects.all(), {key: value for key, value in params.items() if key != 'q'})
+    if not filtered.query.where:
+        filtered = None
+
+    if not search_available():
+        queryset = filter_products(products, params).order_by('id')
+        products = list(queryset[offset:offset + page_size + 1])
+    else:
+        match = match_expression(query)
+        ids = _ranked_ids(match, filtered, page_size + 1, offset) if match else []
+        by_id = products.in_bulk(ids)
+        products = [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    next_cursor = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        next_cursor = encode_cursor('rank', query, offset + page_size)
+    return products, next_cursor, page_size
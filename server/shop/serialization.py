@@ -0,0 +1,46 @@
+"""
+Product JSON: serialization of (possibly sparse) products and the encoder.
+
+With ``?fields=id,name,price`` only those keys are written; the query is
+narrowed to the same columns by listing.only_fields. Responses are encoded
+with orjson when it is installed, which is several times faster than the
+stdlib encoder and writes non-ASCII text as UTF-8 instead of ``\\uXXXX``
+escapes; set PRODUCT_JSON['ORJSON'] = False to always use the stdlib.
+"""
+
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .listing import PRODUCT_FIELDS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def serialize_product(product, fields=PRODUCT_FIELDS):
+    return {
+        field: product.get_labels_list() if field == 'labels' else getattr(product, field)
+        for field in fields
+    }
+
+
+def use_orjson():
+    return orjson is not None and getattr(settings, 'PRODUCT_JSON', {}).get('ORJSON', True)
+
+
+def dumps(data):
+    """JSON bytes of data"""
+    if use_orjson():
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def json_response(data, status=200):
+    """JsonResponse, encoded with orjson when available"""
+    if use_orjson():
+        return HttpResponse(orjson.dumps(data), content_type='application/json', status=status)
+    return JsonResponse(data, status=status)
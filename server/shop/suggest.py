@@ -0,0 +1,176 @@
+"""
+Typeahead suggestions for the search box, served from memory.
+
+Product names and brands are folded (lower case, Vietnamese accents and
+"đ" removed) and kept in sorted arrays; the completions of a prefix are a
+contiguous range found with bisect. The k most popular entries of a range
+(by sold_count) are precomputed for every prefix of up to
+PRECOMPUTED_PREFIX_LENGTH characters, where the ranges are largest, and
+memoized for longer prefixes, so a lookup stays well under a millisecond.
+
+The server entry points (server/wsgi.py, server/asgi.py) start building the
+index in a background thread at startup (preload), so no request pays for
+it; a request that arrives before it is done waits for that build. The
+index is rebuilt in a background thread when the catalog version changes
+(see catalog_cache); requests keep being answered from the previous index
+until the new one is ready.
+"""
+
+import heapq
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .catalog_cache import current_version
+from .listing import ListingError, _number
+from .models import Product, ProductLabel
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 20
+DEFAULT_SUGGESTIONS = 8
+PRECOMPUTED_PREFIX_LENGTH = 3
+MEMOIZED_PREFIXES = 4096
+
+
+def fold(text):
+    """Lower case text without accents: "Điện Thoại" -> "dien thoai" """
+    text = unicodedata.normalize('NFD', text.replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted (key, popularity, payload) entries answering top-k prefix queries"""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self._keys = [key for key, _, _ in entries]
+        self._scores = [score for _, score, _ in entries]
+        self._payloads = [payload for _, _, payload in entries]
+        self._top = self._precompute()
+        self._memo = lru_cache(maxsize=MEMOIZED_PREFIXES)(self._top_in_range)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _best(self, positions):
+        return heapq.nlargest(MAX_SUGGESTIONS, positions, key=self._scores.__getitem__)
+
+    def _precompute(self):
+        positions = defaultdict(list)
+        for position, key in enumerate(self._keys):
+            for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                positions[key[:length]].append(position)
+        return {prefix: self._best(found) for prefix, found in positions.items()}
+
+    def _top_in_range(self, prefix):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+        return self._best(range(start, end))
+
+    def complete(self, prefix, k=DEFAULT_SUGGESTIONS):
+        """Payloads of the k most popular entries whose key starts with prefix"""
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            positions = self._top.get(prefix, [])
+        else:
+            positions = self._memo(prefix)
+        return [self._payloads[position] for position in positions[:k]]
+
+
+class Suggestions:
+    """Product and brand indexes for one catalog version"""
+
+    def __init__(self, version):
+        self.version = version
+        self.products = PrefixIndex(
+            (fold(name), sold_count or 0, {'id': product_id, 'name': name, 'sold_count': sold_count or 0})
+            for product_id, name, sold_count in Product.objects.values_list('id', 'name', 'sold_count').iterator()
+        )
+        brands = (
+            ProductLabel.objects.filter(position=0)
+            .values('label__name')
+            .annotate(products=Count('product_id'), sold_count=Sum('product__sold_count'))
+        )
+        self.brands = PrefixIndex(
+            (fold(row['label__name']), row['sold_count'] or 0,
+             {'name': row['label__name'], 'products': row['products'], 'sold_count': row['sold_count'] or 0})
+            for row in brands
+        )
+
+    def complete(self, prefix, k=DEFAULT_SUGGESTIONS):
+        prefix = fold(prefix)
+        return {
+            'products': self.products.complete(prefix, k),
+            'brands': self.brands.complete(prefix, k),
+        }
+
+
+_suggestions = None
+_build_lock = threading.Lock()
+_rebuilding = False
+_first_build = threading.Event()
+
+
+def _rebuild(version=None):
+    global _suggestions, _rebuilding
+    try:
+        _suggestions = Suggestions(current_version() if version is None else version)
+    except Exception:
+        logger.exception("Rebuilding the suggestion index failed")
+    finally:
+        _rebuilding = False
+        _first_build.set()
+        connection.close()
+
+
+def _start_rebuild(version=None):
+    global _rebuilding
+    _rebuilding = True
+    threading.Thread(target=_rebuild, args=(version,), name='suggest-rebuild', daemon=True).start()
+
+
+def preload():
+    """Start building the index in the background, if nothing has built it yet"""
+    with _build_lock:
+        if _suggestions is None and not _rebuilding:
+            _start_rebuild()
+
+
+def get_suggestions():
+    """Index for the current catalog.
+
+    Waits for the preload if it is still running, and builds the index
+    itself if there was none. After a catalog change the previous index
+    keeps answering while a background thread builds the new one.
+    """
+    global _suggestions
+    if _suggestions is None and _rebuilding:
+        _first_build.wait()
+    version = current_version()
+    with _build_lock:
+        if _suggestions is None:
+            _suggestions = Suggestions(version)
+        current = _suggestions
+        if current.version != version and not _rebuilding:
+            _start_rebuild(version)
+        return current
+
+
+def suggest(params):
+    """Completions for params['prefix']: {'products': [...], 'brands': [...]}"""
+    prefix = (params.get('prefix') or '').strip()
+    if not prefix:
+        raise ListingError("'prefix' is required")
+    k = _number(params, 'k', int) or DEFAULT_SUGGESTIONS
+    if k < 1:
+        raise ListingError("'k' must be positive")
+    return get_suggestions().complete(prefix, min(k, MAX_SUGGESTIONS))
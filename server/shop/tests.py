@@ -1,3 +1,853 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import catalog_cache, serialization, suggest
+from .catalog_feed import import_feed
+from .catalog_sync import apply_plan, assign_name_keys, sync_catalog
+from .chatbot_client import AsyncChatbotClient, ChatbotClient, CircuitBreaker
+from .importing import bulk_create_products
+from .listing import ORDERINGS, encode_cursor
+from .models import Product
+from .pricing import apply_discounts, discount_distribution, spread_discounts
+from .suggest import PrefixIndex
+
+
+def make_product(name, labels=(), **fields):
+    product = Product(name=name, **{'price': 0, **fields})
+    product.set_labels_list(list(labels))
+    product.save()
+    return product
+
+
+class CatalogTestCase(TestCase):
+    """Starts every test with an empty product response cache.
+
+    The catalog version lives in the database and is rolled back with it,
+    so entries cached by an earlier test could otherwise be served again.
+    """
+
+    def setUp(self):
+        caches[catalog_cache._options()['CACHE_ALIAS']].clear()
+        catalog_cache._version = None
+
+
+class CursorPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # Repeated values and NULLs, so ties are broken by id and the NULL
+        # segment is crossed in the middle of a page
+        for i in range(17):
+            make_product(
+                f"Product {i % 5}",
+                price=(i * 7) % 4 * 1000,
+                rating=None if i % 3 == 0 else (i % 4) + 0.5,
+                discount=None if i % 4 == 0 else i % 3 * 10,
+                sold_count=None if i % 5 == 0 else i % 2,
+            )
+
+    def expected_ids(self, ordering):
+        field, descending = ORDERINGS[ordering]
+        products = list(Product.objects.all())
+        if field == 'id':
+            return sorted((p.id for p in products), reverse=descending)
+        nulls = [p for p in products if getattr(p, field) is None]
+        values = [p for p in products if getattr(p, field) is not None]
+        if descending:
+            ordered = sorted(values, key=lambda p: (getattr(p, field), p.id), reverse=True)
+            ordered += sorted(nulls, key=lambda p: p.id, reverse=True)
+        else:
+            ordered = sorted(nulls, key=lambda p: p.id)
+            ordered += sorted(values, key=lambda p: (getattr(p, field), p.id))
+        return [p.id for p in ordered]
+
+    def walk(self, ordering, page_size, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = {'ordering': ordering, 'page_size': page_size, **params}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/products/', query)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['results']), page_size)
+            ids += [product['id'] for product in body['results']]
+            cursor = body['next_cursor']
+            pages += 1
+            if not cursor:
+                return ids, pages
+
+    def test_every_ordering_pages_through_all_rows_once(self):
+        for ordering in ORDERINGS:
+            for page_size in (1, 3, 17, 100):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    ids, _ = self.walk(ordering, page_size)
+                    self.assertEqual(ids, self.expected_ids(ordering))
+
+    def test_last_full_page_has_no_next_cursor(self):
+        ids, pages = self.walk('price', 17)
+        self.assertEqual(len(ids), 17)
+        self.assertEqual(pages, 1)
+
+    def test_filters_apply_to_every_page(self):
+        ids, _ = self.walk('-rating', 2, min_price=1000)
+        expected = [i for i in self.expected_ids('-rating') if Product.objects.get(id=i).price >= 1000]
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/products/', {'ordering': 'price', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        cursor = encode_cursor('rating', 2.5, 1)
+        response = self.client.get('/api/products/', {'ordering': 'price', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.json()['error'])
+
+
+def _fold(text):
+    return text.replace('đ', 'd').replace('Đ', 'D')
+
+
+class SearchAndFacetTriggerTests(CatalogTestCase):
+    """product_search and facet_counts are kept in sync by SQLite triggers
+    (migrations 0006 and 0007); they must match the tables after any write"""
+
+    def setUp(self):
+        super().setUp()
+        self.phone = make_product('Điện thoại Galaxy', ['Samsung', 'Phones', 'sale'], price=150000, rating=4.6)
+        self.tv = make_product('Smart TV', ['Sony', 'TVs'], price=12000000, rating=3.2)
+        self.cable = make_product('USB cable', ['Anker'], price=90000)
+
+    def assertInSync(self):
+        from .facets import LABEL_FACETS, PRICE_BUCKETS, RATING_BUCKETS, _live_bucket_counts, _live_label_counts, _stored_counts
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid, name, labels FROM product_search ORDER BY rowid")
+            indexed = [tuple(row) for row in cursor.fetchall()]
+        expected = [(p.id, _fold(p.name), _fold(' '.join(p.get_labels_list())))
+                    for p in Product.objects.order_by('id')]
+        self.assertEqual(indexed, expected)
+
+        products = Product.objects.all()
+        for facet, position in LABEL_FACETS.items():
+            self.assertEqual(_stored_counts(facet), _live_label_counts(products, position, 1000), facet)
+        self.assertEqual(_stored_counts('price'), _live_bucket_counts(products, 'price', PRICE_BUCKETS))
+        self.assertEqual(_stored_counts('rating'), _live_bucket_counts(products, 'rating', RATING_BUCKETS))
+
+    def search(self, q):
+        response = self.client.get('/api/products/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_insert(self):
+        self.assertInSync()
+        self.assertEqual(self.search('dien thoai'), [self.phone.id])
+
+    def test_bulk_insert(self):
+        bulk_create_products([{'name': f'Bulk {i}', 'price': i * 300000, 'rating': i % 5,
+                               'labels': ['Sony', f'Cat {i % 2}']} for i in range(20)])
+        self.assertInSync()
+
+    def test_update_of_indexed_and_bucketed_columns(self):
+        self.tv.name = 'OLED television'
+        self.tv.price = 600000
+        self.tv.rating = None
+        self.tv.save()
+        Product.objects.filter(id=self.cable.id).update(price=2500000, rating=1.5)
+        self.assertInSync()
+        self.assertEqual(self.search('oled'), [self.tv.id])
+        self.assertEqual(self.search('smart'), [])
+
+    def test_relabel_and_label_rename(self):
+        from .models import Label
+
+        self.phone.set_labels_list(['Apple', 'Phones'])
+        Label.objects.filter(name='Sony').update(name='Sony Group')
+        self.assertInSync()
+        self.assertEqual(self.search('apple'), [self.phone.id])
+        self.assertEqual(self.search('samsung'), [])
+
+    def test_delete(self):
+        self.phone.delete()
+        Product.objects.filter(id=self.cable.id).delete()
+        self.assertInSync()
+        self.assertEqual(self.search('galaxy'), [])
+
+    def test_facets_endpoint_uses_the_stored_counts(self):
+        self.tv.delete()
+        body = self.client.get('/api/products/facets/').json()
+        self.assertFalse(body['filtered'])
+        self.assertEqual({row['value']: row['count'] for row in body['brand']}, {'Samsung': 1, 'Anker': 1})
+        self.assertEqual(sum(bucket['count'] for bucket in body['price']), 2)
+
+
+def feed_item(i, suffix='', **fields):
+    """Payload i of a test feed; odd items carry an ASIN, even ones are matched on name and brand"""
+    item = {'name': f'Item {i}{suffix}', 'price': 1000 + i, 'labels': [f'Brand {i % 3}', 'amazon']}
+    if i % 2:
+        item['external_id'] = f'asin:{i:010d}'
+    return {**item, **fields}
+
+
+class SyncCatalogTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = [feed_item(i) for i in range(10)]
+        summary = sync_catalog(self.items)
+        self.assertEqual(summary['created'], 10)
+        self.ids = dict(Product.objects.values_list('name', 'id'))
+
+    def test_unchanged_feed_writes_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(2):
+            summary = sync_catalog(self.items)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(summary, {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 10, 'errors': []})
+
+    def test_changes_keep_the_ids_of_matched_products(self):
+        items = [feed_item(i, price=5000) if i < 3 else feed_item(i) for i in range(2, 12)]
+        items[5]['labels'] = ['Brand 1', 'phones']
+        with self.captureOnCommitCallbacks() as callbacks:
+            summary = sync_catalog(items)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual((summary['created'], summary['updated'], summary['deleted'], summary['unchanged']),
+                         (2, 2, 2, 6))
+        for i in range(2, 10):
+            self.assertEqual(Product.objects.get(name=f'Item {i}').id, self.ids[f'Item {i}'])
+        self.assertFalse(Product.objects.filter(name__in=['Item 0', 'Item 1']).exists())
+        self.assertEqual(Product.objects.get(name='Item 2').price, 5000)
+        self.assertEqual(Product.objects.get(name='Item 7').get_labels_list(), ['Brand 1', 'phones'])
+
+    def test_name_keyed_product_keeps_its_id_when_it_gets_an_asin(self):
+        self.items[4]['external_id'] = 'asin:B000000004'
+        summary = sync_catalog(self.items)
+        self.assertEqual((summary['created'], summary['updated'], summary['deleted']), (0, 1, 0))
+        product = Product.objects.get(external_id='asin:B000000004')
+        self.assertEqual(product.id, self.ids['Item 4'])
+
+    def test_legacy_rows_without_identity_are_matched_on_name_and_brand(self):
+        Product.objects.update(external_id=None)
+        summary = sync_catalog(self.items)
+        self.assertEqual((summary['created'], summary['deleted']), (0, 0))
+        self.assertEqual(dict(Product.objects.values_list('name', 'id')), self.ids)
+        self.assertFalse(Product.objects.filter(external_id=None).exists())
+
+    def test_duplicates_and_invalid_items_are_reported(self):
+        summary = sync_catalog(self.items + [self.items[3], {'price': 1}])
+        self.assertEqual([error['index'] for error in summary['errors']], [10, 11])
+        self.assertEqual(Product.objects.count(), 10)
+
+
+class ImportFeedTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'feed.ndjson')
+
+    def write_feed(self, items, extra=''):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(item) + '\n' for item in items)
+            f.write(extra)
+
+    def test_import_and_unchanged_reimport(self):
+        items = [feed_item(i) for i in range(25)]
+        self.write_feed(items, '\n{not json\n')
+        summary = import_feed(self.path, batch_size=10)
+        self.assertEqual((summary['created'], summary['updated'], summary['deleted'], summary['resumed']),
+                         (25, 0, 0, 0))
+        self.assertEqual([error['index'] for error in summary['errors']], [25])
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+        ids = dict(Product.objects.values_list('name', 'id'))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            summary = import_feed(self.path, batch_size=10)
+        self.assertEqual(callbacks, [])
+        self.assertEqual((summary['created'], summary['updated'], summary['deleted'], summary['unchanged']),
+                         (0, 0, 0, 25))
+        self.assertEqual(dict(Product.objects.values_list('name', 'id')), ids)
+
+    def test_interrupted_import_resumes_from_its_checkpoint(self):
+        sync_catalog([feed_item(i) for i in range(30)])
+        ids = dict(Product.objects.values_list('name', 'id'))
+        items = [feed_item(i, ' v2') if i % 5 == 0 else feed_item(i) for i in range(28)]
+        self.write_feed(items)
+
+        calls = []
+
+        def crash_on_third_batch(plan, *args, **kwargs):
+            calls.append(plan)
+            if len(calls) == 3:
+                raise RuntimeError('interrupted')
+            return apply_plan(plan, *args, **kwargs)
+
+        with mock.patch('shop.catalog_feed.apply_plan', crash_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                import_feed(self.path, batch_size=5)
+        with open(self.path + '.checkpoint', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['index'], 10)
+
+        summary = import_feed(self.path, batch_size=5)
+        self.assertEqual(summary['resumed'], 10)
+        # Odd renamed items keep their ASIN; even ones get a new name key
+        self.assertEqual((summary['created'], summary['updated'], summary['deleted']), (3, 3, 5))
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+        self.assertEqual(Product.objects.count(), 28)
+        self.assertEqual(Product.objects.get(name='Item 5 v2').id, ids['Item 5'])
+        self.assertEqual(Product.objects.get(name='Item 6').id, ids['Item 6'])
+
+    def test_checkpoint_of_another_file_is_ignored(self):
+        self.write_feed([feed_item(i) for i in range(10)])
+        with open(self.path + '.checkpoint', 'w', encoding='utf-8') as f:
+            json.dump({'feed': {'size': 1, 'mtime_ns': 1}, 'offset': 999, 'index': 8, 'ids': 0,
+                       'summary': {}}, f)
+        summary = import_feed(self.path, batch_size=4)
+        self.assertEqual((summary['created'], summary['resumed']), (10, 0))
+
+    def test_duplicate_in_a_later_batch_is_reported(self):
+        items = [feed_item(i) for i in range(6)]
+        self.write_feed(items + [items[1], items[2]])
+        summary = import_feed(self.path, batch_size=3)
+        self.assertEqual([error['index'] for error in summary['errors']], [6, 7])
+        self.assertEqual((summary['created'], summary['deleted']), (6, 0))
+
+    def test_legacy_rows_get_their_name_key_before_the_first_batch(self):
+        sync_catalog([feed_item(i) for i in range(6)])
+        ids = dict(Product.objects.values_list('name', 'id'))
+        Product.objects.update(external_id=None)
+        self.assertEqual(assign_name_keys(chunk_size=4), 6)
+        self.assertEqual(assign_name_keys(chunk_size=4), 0)
+
+        Product.objects.update(external_id=None)
+        self.write_feed([feed_item(i) for i in range(6)])
+        summary = import_feed(self.path, batch_size=2)
+        self.assertEqual((summary['created'], summary['deleted']), (0, 0))
+        self.assertEqual(dict(Product.objects.values_list('name', 'id')), ids)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('shop.chatbot_client.time.monotonic', return_value=100.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_a_single_trial_through(self):
+        self.open_breaker()
+        self.clock.return_value += 30
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self.open_breaker()
+        self.clock.return_value += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens_for_another_cool_down(self):
+        self.open_breaker()
+        self.clock.return_value += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.clock.return_value += 29
+        self.assertFalse(self.breaker.allow())
+        self.clock.return_value += 1
+        self.assertTrue(self.breaker.allow())
+
+    def test_cancelled_trial_lets_the_next_one_through(self):
+        self.open_breaker()
+        self.clock.return_value += 30
+        self.breaker.allow()
+        self.breaker.record_cancelled()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertTrue(self.breaker.allow())
+
+
+def sse_handler(request):
+    return httpx.Response(200, content=iter([b'data: a\n\n', b'data: b\n\n']))
+
+
+class ChatbotStreamTests(SimpleTestCase):
+    """A trial call that ends without an outcome must not leave the breaker stuck half-open"""
+
+    def setUp(self):
+        self.chatbot = ChatbotClient('http://chatbot', 1, 1, 2, 2, 2, 0.1, 1, 30)
+        self.chatbot._http = httpx.Client(base_url='http://chatbot', transport=httpx.MockTransport(sse_handler))
+        self.addCleanup(self.chatbot._http.close)
+        patcher = mock.patch('shop.chatbot_client.time.monotonic', return_value=100.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chatbot.breaker.record_failure()
+        self.clock.return_value += 30
+
+    def test_stream_read_to_the_end_closes_the_breaker(self):
+        self.assertEqual(b''.join(self.chatbot.stream('hi')), b'data: a\n\ndata: b\n\n')
+        self.assertEqual(self.chatbot.breaker.state, 'closed')
+
+    def test_stream_closed_early_allows_another_trial(self):
+        chunks = iter(self.chatbot.stream('hi'))
+        next(chunks)
+        chunks.close()
+        self.assertEqual(self.chatbot.breaker.state, 'half-open')
+        self.assertEqual(b''.join(self.chatbot.stream('hi')), b'data: a\n\ndata: b\n\n')
+        self.assertEqual(self.chatbot.breaker.state, 'closed')
+
+    def test_stream_closed_before_the_first_chunk_allows_another_trial(self):
+        self.chatbot.stream('hi').close()
+        self.assertTrue(self.chatbot.breaker.allow())
+
+
+class AsyncChatbotClientTests(SimpleTestCase):
+    """Cancelled calls and early-closed streams of the ASGI client during a half-open trial"""
+
+    def chatbot(self, handler):
+        # No cool-down: the event loop reads time.monotonic, so it cannot be patched here
+        client = AsyncChatbotClient('http://chatbot', 1, 1, 2, 0.1, 1, 0)
+        client._http = httpx.AsyncClient(base_url='http://chatbot', transport=httpx.MockTransport(handler))
+        client.breaker.record_failure()
+        return client
+
+    @staticmethod
+    async def sse(request):
+        async def body():
+            yield b'data: a\n\n'
+            yield b'data: b\n\n'
+        return httpx.Response(200, content=body())
+
+    def test_cancelled_chat_allows_another_trial(self):
+        async def hang(request):
+            await asyncio.sleep(10)
+
+        async def scenario():
+            client = self.chatbot(hang)
+            task = asyncio.create_task(client.chat('hi'))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(client.breaker.state, 'half-open')
+            self.assertTrue(client.breaker.allow())
+            await client._http.aclose()
+
+        asyncio.run(scenario())
+
+    def test_stream_closed_early_allows_another_trial(self):
+        async def scenario():
+            client = self.chatbot(self.sse)
+            chunks = (await client.stream('hi')).__aiter__()
+            await chunks.__anext__()
+            await chunks.aclose()
+            self.assertEqual(client.breaker.state, 'half-open')
+
+            relay = await client.stream('hi')
+            self.assertEqual(b''.join([chunk async for chunk in relay]), b'data: a\n\ndata: b\n\n')
+            self.assertEqual(client.breaker.state, 'closed')
+            await client._http.aclose()
+
+        asyncio.run(scenario())
+
+    def test_stream_closed_before_iteration_allows_another_trial(self):
+        async def scenario():
+            client = self.chatbot(self.sse)
+            (await client.stream('hi')).close()
+            await asyncio.sleep(0)
+            self.assertTrue(client.breaker.allow())
+            await client._http.aclose()
+
+        asyncio.run(scenario())
+
+
+class ProductCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_product('Cached phone', ['Samsung', 'Phones'], price=1000)
+
+    def get(self, path='/api/products/', **headers):
+        return self.client.get(path, {'ordering': 'price'}, headers=headers)
+
+    def test_miss_then_hit(self):
+        first = self.get()
+        second = self.get()
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get(if_none_match='"stale"').status_code, 200)
+
+    def assertInvalidatedBy(self, write):
+        detail = f'/api/products/{self.product.id}/'
+        self.get()
+        self.get(detail)
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertEqual(self.get(detail)['X-Cache'], 'MISS')
+
+    def test_writes_invalidate_the_cached_responses(self):
+        def save():
+            self.product.price = 2000
+            self.product.save()
+
+        writes = {
+            'save': save,
+            'set_labels_list': lambda: self.product.set_labels_list(['Apple', 'Phones']),
+            'apply_discounts': lambda: apply_discounts(spread_discounts()),
+            'bulk_create_products': lambda: bulk_create_products([{'name': 'New', 'price': 1}]),
+            'sync_catalog': lambda: sync_catalog([
+                {'name': 'Cached phone', 'price': 3000, 'labels': self.product.get_labels_list()},
+                {'name': 'New', 'price': 1},
+            ]),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                self.assertInvalidatedBy(write)
+
+    def test_new_response_reflects_the_write(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.set_labels_list(['Apple', 'Phones'])
+        self.assertEqual(self.get().json()['results'][0]['labels'], ['Apple', 'Phones'])
+
+    def test_cache_key_is_bounded_and_ignores_parameter_order(self):
+        factory = RequestFactory()
+        long_query = {'cursor': 'x' * 2000, 'brand': 'sony', 'ordering': '-price'}
+        key = catalog_cache._cache_key(7, factory.get('/api/products/', long_query))
+        self.assertLess(len(key), 64)
+        self.assertTrue(key.startswith('catalog:7:'))
+        reordered = factory.get('/api/products/?ordering=-price&brand=sony&cursor=' + 'x' * 2000)
+        self.assertEqual(catalog_cache._cache_key(7, reordered), key)
+        self.assertNotEqual(catalog_cache._cache_key(8, reordered), key)
+        self.assertNotEqual(catalog_cache._cache_key(7, factory.get('/api/products/', {'brand': 'lg'})), key)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            ('apple', 5, 'apple'), ('apricot', 9, 'apricot'), ('application', 1, 'application'),
+            ('banana', 7, 'banana'), ('applesauce', 3, 'applesauce'),
+        ])
+
+    def test_most_popular_completions_first(self):
+        self.assertEqual(self.index.complete('ap'), ['apricot', 'apple', 'applesauce', 'application'])
+        self.assertEqual(self.index.complete('ap', k=2), ['apricot', 'apple'])
+
+    def test_prefixes_longer_than_the_precomputed_ones(self):
+        self.assertEqual(self.index.complete('apple'), ['apple', 'applesauce'])
+        self.assertEqual(self.index.complete('applic'), ['application'])
+
+    def test_no_completion(self):
+        self.assertEqual(self.index.complete('cherry'), [])
+        self.assertEqual(self.index.complete('bananas'), [])
+        self.assertEqual(self.index.complete(''), [])
+
+
+def reset_suggestions():
+    suggest._suggestions = None
+    suggest._rebuilding = False
+    suggest._first_build = threading.Event()
+
+
+class SuggestTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_suggestions()
+        make_product('Điện thoại Galaxy', ['Samsung'], sold_count=50)
+        make_product('Dien may xanh', ['Điện Quang'], sold_count=80)
+        make_product('Đèn bàn', ['Sony'], sold_count=None)
+
+    def get(self, prefix, **params):
+        response = self.client.get('/api/products/suggest/', {'prefix': prefix, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_accents_are_optional(self):
+        for prefix in ('dien', 'ĐIỆN', 'điện'):
+            with self.subTest(prefix=prefix):
+                body = self.get(prefix)
+                self.assertEqual([p['name'] for p in body['products']], ['Dien may xanh', 'Điện thoại Galaxy'])
+                self.assertEqual([b['name'] for b in body['brands']], ['Điện Quang'])
+
+    def test_k_limits_the_completions(self):
+        self.assertEqual([p['name'] for p in self.get('d', k=1)['products']], ['Dien may xanh'])
+        self.assertEqual(len(self.get('d')['products']), 3)
+
+    def test_prefix_is_required(self):
+        self.assertEqual(self.client.get('/api/products/suggest/').status_code, 400)
+
+
+class SuggestRebuildTests(TransactionTestCase):
+    """The index is built in background threads, which only see committed rows"""
+
+    def setUp(self):
+        caches[catalog_cache._options()['CACHE_ALIAS']].clear()
+        catalog_cache._version = None
+        reset_suggestions()
+        make_product('Galaxy phone', ['Samsung'], sold_count=5)
+
+    def tearDown(self):
+        # The FTS table is not flushed with the models; its triggers empty it
+        Product.objects.all().delete()
+        reset_suggestions()
+
+    def wait_for_build(self):
+        for thread in threading.enumerate():
+            if thread.name == 'suggest-rebuild':
+                thread.join(5)
+
+    def names(self, prefix):
+        return [p['name'] for p in suggest.suggest({'prefix': prefix})['products']]
+
+    def test_preload_builds_the_index_in_the_background(self):
+        suggest.preload()
+        self.wait_for_build()
+        self.assertIsNotNone(suggest._suggestions)
+        with mock.patch.object(suggest, 'Suggestions') as build:
+            self.assertEqual(self.names('gal'), ['Galaxy phone'])
+        build.assert_not_called()
+
+    def test_catalog_change_rebuilds_the_index(self):
+        self.assertEqual(self.names('gal'), ['Galaxy phone'])
+        make_product('Galaxy tab', ['Samsung'], sold_count=9)
+        # The previous index answers while the new one is built
+        self.assertEqual(self.names('gal'), ['Galaxy phone'])
+        self.wait_for_build()
+        self.assertEqual(self.names('gal'), ['Galaxy tab', 'Galaxy phone'])
+
+
+class BulkCreateTests(CatalogTestCase):
+    def post(self, body, content_type='application/json'):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        return self.client.post('/api/products/bulk/', body, content_type=content_type)
+
+    def test_invalid_items_are_reported_by_index(self):
+        response = self.post([
+            {'name': 'Phone', 'price': 100, 'labels': ['Samsung']},
+            {'name': 'No price'},
+            'not an object',
+            {'name': 'x' * 500, 'price': 1},
+            {'name': 'x' * 501, 'price': 1},
+            {'name': 'Cable', 'price': -1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 2)
+        self.assertEqual([error['index'] for error in body['errors']], [1, 2, 4, 5])
+        self.assertEqual(Product.objects.get(id=body['ids'][0]).get_labels_list(), ['Samsung'])
+
+    def test_ndjson_lines_with_bad_json(self):
+        lines = '{"name": "A", "price": 1}\n\n{"name": "B", price: 2}\n{"name": "C", "price": 3}\n'
+        response = self.post(lines, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 2)
+        self.assertEqual([error['index'] for error in body['errors']], [1])
+        self.assertIn('invalid JSON', body['errors'][0]['error'])
+
+    def test_failing_row_falls_back_to_row_by_row_inserts(self):
+        make_product('Existing', external_id='asin:1')
+        response = self.post([
+            {'name': 'First', 'price': 1},
+            {'name': 'Duplicate', 'price': 2, 'external_id': 'asin:1'},
+            {'name': 'Third', 'price': 3, 'labels': ['Sony']},
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([error['index'] for error in body['errors']], [1])
+        self.assertEqual(sorted(Product.objects.filter(id__in=body['ids']).values_list('name', flat=True)),
+                         ['First', 'Third'])
+        self.assertEqual(Product.objects.get(name='Third').get_labels_list(), ['Sony'])
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_status(self):
+        self.assertEqual(self.post([]).status_code, 201)
+        response = self.post([{'name': 'No price'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertEqual(self.post('[{"name": ').status_code, 400)
+        self.assertEqual(self.post({'name': 'A', 'price': 1}).status_code, 400)
+        self.assertFalse(Product.objects.exists())
+
+
+class FieldsAndEncodingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            make_product(f'Điện thoại {i}', ['Samsung', 'Phones'], price=1000 * i, image='https://img/x.jpg')
+
+    def test_unknown_fields_are_rejected(self):
+        product = Product.objects.first()
+        for path in ('/api/products/', f'/api/products/{product.id}/', '/api/products/top/cheapest/',
+                     '/api/products/export/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, {'fields': 'id,secret,name'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('secret', response.json()['error'])
+
+    def test_only_the_requested_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get('/api/products/', {'fields': 'name,id', 'ordering': 'price'}).json()
+        self.assertEqual(list(body['results'][0]), ['id', 'name'])
+        self.assertFalse(any('FROM "product_labels"' in query['sql'] for query in queries))
+        [sql] = [query['sql'] for query in queries if 'FROM "products"' in query['sql']]
+        self.assertIn('"name"', sql)
+        self.assertNotIn('"image"', sql)
+        self.assertNotIn('"rating"', sql)
+
+    def test_labels_are_prefetched_only_when_requested(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get('/api/products/', {'fields': 'id,labels'}).json()
+        self.assertEqual(body['results'][0]['labels'], ['Samsung', 'Phones'])
+        self.assertTrue(any('FROM "product_labels"' in query['sql'] for query in queries))
+
+    @skipUnless(serialization.orjson, 'orjson is not installed')
+    def test_orjson_and_stdlib_encode_the_same_data(self):
+        with override_settings(PRODUCT_JSON={'ORJSON': True}):
+            fast = self.client.get('/api/products/').content
+        catalog_cache._version = None
+        caches[catalog_cache._options()['CACHE_ALIAS']].clear()
+        with override_settings(PRODUCT_JSON={'ORJSON': False}):
+            plain = self.client.get('/api/products/').content
+        self.assertEqual(json.loads(fast), json.loads(plain))
+        self.assertIn('Điện'.encode(), fast)
+        self.assertIn(b'\\u0110i\\u1ec7n', plain)
+
+    def get_compressed(self, min_size=10, **headers):
+        options = {**catalog_cache._options(), 'COMPRESS': True, 'COMPRESS_MIN_SIZE': min_size}
+        with override_settings(PRODUCT_CACHE=options):
+            return self.client.get('/api/products/', headers=headers)
+
+    def test_gzip_for_clients_that_accept_it(self):
+        plain = self.get_compressed()
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        encoded = self.get_compressed(accept_encoding='br;q=1.0, gzip;q=0.8')
+        self.assertEqual(encoded['Content-Encoding'], 'br' if catalog_cache.brotli else 'gzip')
+        self.assertIn('Accept-Encoding', encoded['Vary'])
+        self.assertNotEqual(encoded['ETag'], plain['ETag'])
+        if not catalog_cache.brotli:
+            self.assertEqual(gzip.decompress(encoded.content), plain.content)
+
+        self.assertEqual(self.get_compressed(if_none_match=encoded['ETag'], accept_encoding='gzip,br').status_code,
+                         304)
+
+    def test_no_encoding_when_refused_or_small(self):
+        self.assertFalse(self.get_compressed(accept_encoding='gzip;q=0, br;q=0').has_header('Content-Encoding'))
+        self.assertFalse(self.get_compressed(min_size=10 ** 6, accept_encoding='gzip').has_header('Content-Encoding'))
+
+
+class DiscountTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(30):
+            make_product(f'Product {i}', discount=None if i % 4 == 0 else 15)
+
+    def expected(self):
+        # The rule the update_discounts command applied row by row before
+        return {product_id: 10 + product_id % 21 for product_id in Product.objects.values_list('id', flat=True)}
+
+    def discounts(self):
+        return dict(Product.objects.values_list('id', 'discount'))
+
+    def test_apply_matches_the_row_by_row_rule(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            updated = apply_discounts(spread_discounts())
+        self.assertEqual(self.discounts(), self.expected())
+        self.assertGreater(updated, 0)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_only_changed_rows_are_written(self):
+        before = self.discounts()
+        expected = self.expected()
+        with self.captureOnCommitCallbacks():
+            updated = apply_discounts(spread_discounts())
+        self.assertEqual(updated, sum(before[product_id] != discount for product_id, discount in expected.items()))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(apply_discounts(spread_discounts()), 0)
+        self.assertEqual(callbacks, [])
+
+        Product.objects.filter(id=min(expected)).update(discount=99)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(apply_discounts(spread_discounts()), 1)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_distribution_is_computed_without_writing(self):
+        before = self.discounts()
+        distribution = discount_distribution(spread_discounts())
+        self.assertEqual(distribution, dict(sorted(Counter(self.expected().values()).items())))
+        self.assertEqual(self.discounts(), before)
+
+    def test_dry_run_writes_nothing(self):
+        before = self.discounts()
+        out = StringIO()
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('update_discounts', '--dry-run', stdout=out)
+        self.assertEqual(self.discounts(), before)
+        self.assertEqual(callbacks, [])
+        self.assertIn('Dry run: 30 products', out.getvalue())
+
+        call_command('update_discounts', stdout=StringIO())
+        self.assertEqual(self.discounts(), self.expected())
+
+    def test_invalid_range(self):
+        with self.assertRaises(CommandError):
+            call_command('update_discounts', '--min', '40', '--max', '20', stdout=StringIO())
+
+
+class QueryPlanTests(TestCase):
+    def test_list_queries_are_served_by_their_index(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
+
+    def test_a_missing_index_fails_the_check(self):
+        # DDL is transactional on SQLite; the test rollback restores the index
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX product_price_idx')
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_query_plans', stdout=out)
+        self.assertIn('FAIL list ordering=price first page', out.getvalue())
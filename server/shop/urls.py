@@ -4,6 +4,14 @@ from . import views
 urlpatterns = [
     path('products/', views.product_list, name='product_list'),
     path('products/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('products/search/', views.product_search, name='product_search'),
+    path('products/facets/', views.product_facets, name='product_facets'),
+    path('products/suggest/', views.product_suggest, name='product_suggest'),
+    path('products/top/<str:kind>/', views.product_top, name='product_top'),
+    path('products/export/', views.export_products, name='export_products'),
     path('products/create/', views.create_product, name='create_product'),
+    path('products/bulk/', views.bulk_create_products, name='bulk_create_products'),
+    path('products/cache/stats/', views.product_cache_stats, name='product_cache_stats'),
     path('chatbot/chat/', views.chatbot_chat, name='chatbot_chat'),
+    path('chatbot/chat/stream/', views.chatbot_chat_stream, name='chatbot_chat_stream'),
 ]
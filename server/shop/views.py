@@ -1,92 +1,239 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
 from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-import subprocess
-import sys
-import os
+from . import catalog_cache, facets, importing
+from .catalog_cache import cached_catalog_response
+from .chatbot_client import ChatbotError, ChatbotUnavailable, get_async_chatbot_client, get_chatbot_client
+from .importing import ProductDataError, product_from_data
+from .listing import ListingError, filter_products, only_fields, parse_fields, product_page, top_products
 from .models import Product
+from .search import search_products
+from .serialization import dumps, json_response, serialize_product
+from .suggest import suggest
 
+@require_http_methods(["GET"])
+@cached_catalog_response
 def product_list(request):
-    """Get all products"""
-    products = Product.objects.all()
-    data = []
+    """List products one page at a time, filtered and ordered by the database.
+
+    Query parameters: q, brand, category, label, min_price, max_price,
+    min_rating, min_discount, ordering, page_size, cursor (the next_cursor
+    of the previous page), fields (e.g. id,name,price; all by default).
+    """
+    try:
+        fields = parse_fields(request.GET)
+        products, next_cursor, ordering, page_size = product_page(request.GET, fields)
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    for product in products:
-        product_data = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'original_price': product.original_price,
-            'discount': product.discount,
-            'rating': product.rating,
-            'sold_count': product.sold_count,
-            'image': product.image,
-            'labels': product.get_labels_list()
-        }
-        data.append(product_data)
+    return json_response({
+        'results': [serialize_product(product, fields) for product in products],
+        'next_cursor': next_cursor,
+        'ordering': ordering,
+        'page_size': page_size,
+    })
+
+@require_http_methods(["GET"])
+@cached_catalog_response
+def product_search(request):
+    """Full-text search on product names and labels, best matches first.
+
+    Query parameters: q (required), the filters of product_list, page_size,
+    cursor (the next_cursor of the previous page), fields.
+    """
+    try:
+        fields = parse_fields(request.GET)
+        products, next_cursor, page_size = search_products(request.GET, fields)
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return json_response({
+        'results': [serialize_product(product, fields) for product in products],
+        'next_cursor': next_cursor,
+        'page_size': page_size,
+    })
+
+@require_http_methods(["GET"])
+@cached_catalog_response
+def product_facets(request):
+    """Counts per brand, category, price bucket and rating bucket.
+
+    Accepts the filters of product_list (counts of the matching products)
+    and limit (number of brands / categories, default 50).
+    """
+    try:
+        counts = facets.product_facets(request.GET)
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(counts)
+
+@require_http_methods(["GET"])
+def product_suggest(request):
+    """Typeahead completions: most popular product names and brands starting with prefix.
+
+    Query parameters: prefix (required, accents optional), k (default 8, max 20).
+    """
+    try:
+        suggestions = suggest(request.GET)
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'prefix': request.GET['prefix'].strip(), **suggestions})
+
+# Rows fetched per query (and per label prefetch) / rows encoded per write
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_WRITE_ROWS = 200
+
+def _export_rows(queryset, ndjson, fields):
+    """Encode products as they are read; only one chunk is ever in memory"""
+    if not ndjson:
+        yield b'['
+    separator = b'' if ndjson else b','
+    terminator = b'\n'
+    buffer = []
+    first = True
+    for product in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if not first:
+            buffer.append(separator)
+        first = False
+        buffer.append(dumps(serialize_product(product, fields)))
+        buffer.append(terminator)
+        if len(buffer) >= 3 * EXPORT_WRITE_ROWS:
+            yield b''.join(buffer)
+            buffer = []
+    if buffer:
+        yield b''.join(buffer)
+    if not ndjson:
+        yield b']\n'
+
+@require_http_methods(["GET"])
+def export_products(request):
+    """Stream the whole catalog (or the filtered part) as a JSON array or NDJSON.
+
+    format=json (default) or format=ndjson; accepts the filters of
+    product_list and fields.
+    """
+    export_format = request.GET.get('format', 'json')
+    if export_format not in ('json', 'ndjson'):
+        return JsonResponse({'error': "'format' must be json or ndjson"}, status=400)
+    try:
+        fields = parse_fields(request.GET)
+        queryset = only_fields(Product.objects.with_labels(), fields)
+        queryset = filter_products(queryset, request.GET).order_by('id')
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    ndjson = export_format == 'ndjson'
+    response = StreamingHttpResponse(
+        _export_rows(queryset, ndjson, fields),
+        content_type='application/x-ndjson' if ndjson else 'application/json',
+    )
+    response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+    return response
+
+@require_http_methods(["GET"])
+@cached_catalog_response
+def product_top(request, kind):
+    """Top-N products: cheapest, most_discounted, best_rated or best_selling.
+
+    Accepts n (default 10, max 100), the filters of product_list and fields.
+    """
+    try:
+        fields = parse_fields(request.GET)
+        products = top_products(kind, request.GET, fields)
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return JsonResponse(data, safe=False)
+    return json_response({
+        'list': kind,
+        'results': [serialize_product(product, fields) for product in products],
+    })
 
+@cached_catalog_response
 def product_detail(request, product_id):
-    """Get specific product by ID"""
+    """Get specific product by ID; accepts fields"""
     try:
-        product = Product.objects.get(id=product_id)
-        data = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'original_price': product.original_price,
-            'discount': product.discount,
-            'rating': product.rating,
-            'sold_count': product.sold_count,
-            'image': product.image,
-            'labels': product.get_labels_list()
-        }
-        return JsonResponse(data)
+        fields = parse_fields(request.GET)
+        product = only_fields(Product.objects.with_labels(), fields).get(id=product_id)
+        return json_response(serialize_product(product, fields))
+    except ListingError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Product.DoesNotExist:
         return JsonResponse({'error': 'Product not found'}, status=404)
 
+@require_http_methods(["GET"])
+def product_cache_stats(request):
+    """Hit/miss counters of the product response cache in this process"""
+    return JsonResponse({
+        'version': catalog_cache.current_version(),
+        **catalog_cache.stats.snapshot(),
+    })
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def create_product(request):
     """Create a new product"""
     try:
         data = json.loads(request.body)
-        product = Product.objects.create(
-            name=data['name'],
-            price=data['price'],
-            original_price=data.get('original_price'),
-            discount=data.get('discount'),
-            rating=data.get('rating'),
-            sold_count=data.get('sold_count'),
-            image=data.get('image')
-        )
-        
-        # Set labels if provided
-        if 'labels' in data:
-            product.set_labels_list(data['labels'])
-            product.save()
+        product = product_from_data(data)
+        product.save()
         
-        return JsonResponse({
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'original_price': product.original_price,
-            'discount': product.discount,
-            'rating': product.rating,
-            'sold_count': product.sold_count,
-            'image': product.image,
-            'labels': product.get_labels_list()
-        }, status=201)
+        return json_response(serialize_product(product), status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+def _ndjson_items(request):
+    """Yield one payload per non-empty line; bad lines yield their error"""
+    for line in request:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ProductDataError(f"invalid JSON: {e}")
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_create_products(request):
+    """Create many products from a JSON array or an NDJSON body.
+
+    Valid items are inserted in chunks inside one transaction; invalid ones
+    are reported by their index in the batch and skipped.
+    """
+    if request.content_type in ('application/x-ndjson', 'application/jsonl'):
+        items = _ndjson_items(request)
+    else:
+        try:
+            items = json.loads(request.body)
+        except json.JSONDecodeError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if not isinstance(items, list):
+            return JsonResponse({'error': 'Expected a JSON array of products'}, status=400)
+    
+    try:
+        ids, errors = importing.bulk_create_products(items)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({
+        'created': len(ids),
+        'ids': ids,
+        'errors': errors,
+    }, status=201 if ids or not errors else 400)
+
 @csrf_exempt
 @require_http_methods(["POST"])
-def chatbot_chat(request):
-    """Chat with the AI chatbot using streaming response"""
+async def chatbot_chat(request):
+    """Chat with the AI chatbot through the pooled chatbot server client.
+
+    Under ASGI the call is awaited on the event loop's AsyncChatbotClient, so
+    a chat that takes minutes holds no thread, and it is cancelled when the
+    browser disconnects. Under WSGI the sync client runs in the request thread.
+    """
     try:
         data = json.loads(request.body)
         message = data.get('message', '')
@@ -94,51 +241,78 @@ def chatbot_chat(request):
         if not message:
             return JsonResponse({'error': 'Message is required'}, status=400)
         
-        # Path to the chatbot script
-        chatbot_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'chatbot')
-        api_script_path = os.path.join(chatbot_path, 'call_chatbot_server.py')
-        
-        # Check if files exist
-        if not os.path.exists(api_script_path):
-            return JsonResponse({'error': f'Script not found: {api_script_path}'}, status=500)
-        
-        # Run the chatbot script
-        process = subprocess.Popen(
-            [sys.executable, api_script_path, message],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=chatbot_path
-        )
-        
-        # No timeout - let it run as long as needed
-        stdout, stderr = process.communicate()
-        
-        # Log for debugging
-        print(f"[DEBUG] Return code: {process.returncode}")
-        print(f"[DEBUG] Stdout: {stdout[:200] if stdout else 'None'}")
-        print(f"[DEBUG] Stderr: {stderr[:200] if stderr else 'None'}")
-        
-        if process.returncode == 0:
-            response_text = stdout.strip()
-            if response_text:
-                return JsonResponse({
-                    'response': response_text,
-                    'status': 'success'
-                })
+        args = (message, data.get('mode'), data.get('conversation_id'))
+        try:
+            if isinstance(request, ASGIRequest):
+                response_text = await get_async_chatbot_client().chat(*args)
             else:
-                return JsonResponse({
-                    'response': 'Không có phản hồi từ chatbot.',
-                    'status': 'error'
-                })
-        else:
-            error_msg = stderr.strip() if stderr else "Unknown error"
-            # Return first 500 chars of error for debugging
+                response_text = await sync_to_async(get_chatbot_client().chat)(*args)
+            response_text = response_text.strip()
+        except ChatbotUnavailable as e:
+            return JsonResponse({
+                'response': e.user_message,
+                'error_details': e.details,
+                'status': 'error'
+            }, status=503)
+        except ChatbotError as e:
             return JsonResponse({
-                'response': f'Xin lỗi, có lỗi xảy ra. Vui lòng thử lại.',
-                'error_details': error_msg[:500],
+                'response': e.user_message,
+                'error_details': e.details[:500],
                 'status': 'error'
             })
         
+        if response_text:
+            return JsonResponse({
+                'response': response_text,
+                'status': 'success'
+            })
+        return JsonResponse({
+            'response': 'Không có phản hồi từ chatbot.',
+            'status': 'error'
+        })
+        
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def chatbot_chat_stream(request):
+    """Chat with the AI chatbot, relaying Server-Sent Events as they arrive.
+
+    Under ASGI the events are relayed by a coroutine and the upstream stream
+    is closed when the browser disconnects. WSGI servers only stream sync
+    iterators, so there the sync client is used.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    message = data.get('message', '')
+    
+    if not message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+    
+    args = (message, data.get('mode'), data.get('conversation_id'))
+    try:
+        if isinstance(request, ASGIRequest):
+            events = await get_async_chatbot_client().stream(*args)
+        else:
+            events = await sync_to_async(get_chatbot_client().stream)(*args)
+    except ChatbotUnavailable as e:
+        return JsonResponse({
+            'response': e.user_message,
+            'error_details': e.details,
+            'status': 'error'
+        }, status=503)
+    except ChatbotError as e:
+        return JsonResponse({
+            'response': e.user_message,
+            'error_details': e.details[:500],
+            'status': 'error'
+        }, status=502)
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # Ask reverse proxies (nginx) not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response